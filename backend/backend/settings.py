@@ -115,7 +115,9 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'shop.middleware_security.IdentityMiddleware',  # <-- IP / Telegram / Session ID (один раз на запрос)
     'shop.middleware_security.BlacklistMiddleware', # <-- BLACKLIST CHECK
+    'shop.middleware_load.LoadSheddingMiddleware',  # <-- 503 для статей/каталога при перегрузке
     # WhiteNoise для эффективной раздачи статики
    # 'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -182,10 +184,36 @@ REDIS_URL = os.environ.get('REDIS_URL', 'redis://127.0.0.1:6379/1')
 
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        # RedisCache + сжатие больших значений и метрики по префиксам ключей (shop.cache_backend)
+        'BACKEND': 'shop.cache_backend.InstrumentedRedisCache',
         'LOCATION': REDIS_URL,
+        'OPTIONS': {'serializer': 'shop.cache_backend.CompressedSerializer'},
     }
 }
+CACHE_COMPRESS_MIN_BYTES = int(os.environ.get('CACHE_COMPRESS_MIN_BYTES', 1024))   # Меньше — не сжимаем (zlib не окупится)
+CACHE_COMPRESS_LEVEL = int(os.environ.get('CACHE_COMPRESS_LEVEL', 6))
+CACHE_METRICS_ENABLED = os.environ.get('CACHE_METRICS_ENABLED', 'True') == 'True'
+CACHE_METRICS_FLUSH_INTERVAL = float(os.environ.get('CACHE_METRICS_FLUSH_INTERVAL', 10))  # Сброс счетчиков процесса в Redis (сек)
+# Таймаут сокета для прямого клиента Redis (shop.redis_client): при падении Redis не висим
+REDIS_SOCKET_TIMEOUT = float(os.environ.get('REDIS_SOCKET_TIMEOUT', 0.5))
+
+# Кеш проверенных Telegram initData (shop.utils.validate_init_data)
+INIT_DATA_CACHE_SIZE = int(os.environ.get('INIT_DATA_CACHE_SIZE', 10000))                  # записей в LRU процесса
+INIT_DATA_CACHE_SHARED = os.environ.get('INIT_DATA_CACHE_SHARED', 'True') == 'True'       # дублировать в Redis
+
+
+# Сколько "обычных" запросов списывает поиск из лимита (shop.throttling.GCRARateThrottle)
+THROTTLE_COST_SEARCH = int(os.environ.get('THROTTLE_COST_SEARCH', 5))
+
+
+# --- Idempotency-Key (защита от двойного оформления заказа и повторов) ---
+# Сколько хранится ответ первого запроса для повтора (сек)
+IDEMPOTENCY_TTL = int(os.environ.get('IDEMPOTENCY_TTL', 24 * 60 * 60))
+# Страховочный TTL блокировки на случай падения воркера посреди запроса (сек)
+IDEMPOTENCY_LOCK_TIMEOUT = int(os.environ.get('IDEMPOTENCY_LOCK_TIMEOUT', 30))
+# Сколько параллельный дубль ждет завершения первого запроса, прежде чем вернуть 409 (сек)
+IDEMPOTENCY_WAIT_TIMEOUT = float(os.environ.get('IDEMPOTENCY_WAIT_TIMEOUT', 5))
+IDEMPOTENCY_POLL_INTERVAL = 0.05
 
 
 # --- Настройки для Django REST Framework и CORS ---
@@ -198,12 +226,13 @@ REST_FRAMEWORK = {
     'DEFAULT_THROTTLE_CLASSES': [
         'shop.throttling.SmartUserRateThrottle', # <-- VIP (Telegram/Session)
         'shop.throttling.SmartAnonRateThrottle', # <-- Fallback (IP)
-        'rest_framework.throttling.ScopedRateThrottle',
+        'shop.throttling.GCRAScopedRateThrottle', # <-- throttle_scope у view (заказы)
     ],
     'DEFAULT_THROTTLE_RATES': {
-        'anon': '60/min',       # Анонимы: 1 запрос в секунду
-        'user': '1000/day',     # Авторизованные: лояльнее
-        'orders': '5/min',      # Создание заказа: не чаще раз в 12 секунд
+        # Переопределяются из окружения только для нагрузочного теста (load_test.py)
+        'anon': os.environ.get('THROTTLE_RATE_ANON', '60/min'),       # Анонимы: 1 запрос в секунду
+        'user': os.environ.get('THROTTLE_RATE_USER', '1000/day'),     # Авторизованные: лояльнее
+        'orders': os.environ.get('THROTTLE_RATE_ORDERS', '5/min'),    # Создание заказа: не чаще раз в 12 секунд
         'uploads': '20/min',    # Загрузка файлов
         'auth': '10/min',       # Попытки входа (если будут)
     },
@@ -226,7 +255,9 @@ SPECTACULAR_SETTINGS = {
 
 CORS_ALLOW_HEADERS = list(default_headers) + [
     'x-session-id',
+    'idempotency-key',
 ]
+CORS_EXPOSE_HEADERS = ['idempotent-replayed']
 
 # Разрешенные источники для CORS. Читаются из .env файла.
 # Пример для .env: CORS_ALLOWED_ORIGINS_STR=https://bf55.ru,https://www.bf55.ru
@@ -289,6 +320,9 @@ else:
     MEDIA_URL = '/media/'
 
 MEDIA_ROOT = BASE_DIR / 'media'
+# Фото товаров, баннеров и магазина хранятся по хешу содержимого в MEDIA_ROOT/cas/ (shop/storage.py):
+# одинаковые файлы — один блоб, URL неизменяемы (nginx отдает их с Cache-Control: immutable).
+# Старые файлы переносятся туда командой manage.py dedupe_media
 
 
 # --- Прочие Настройки ---
@@ -382,12 +416,143 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 
+# Периодические задачи (запускаются сервисом celery-beat)
+from celery.schedules import crontab
+
+CELERY_BEAT_SCHEDULE = {
+    'cleanup-stale-carts': {
+        'task': 'shop.tasks.cleanup_stale_carts_task',
+        'schedule': crontab(hour=4, minute=0),  # Ночью, когда трафик минимальный
+    },
+    'rebuild-recent-sales-rollups': {
+        'task': 'shop.tasks.rebuild_recent_sales_rollups_task',
+        'schedule': crontab(hour=4, minute=30),
+    },
+    'maintain-security-log': {
+        'task': 'shop.tasks.maintain_security_log_task',
+        'schedule': crontab(hour=4, minute=15),
+    },
+    'flush-security-logs': {
+        'task': 'shop.tasks.flush_security_logs_task',
+        'schedule': crontab(),  # Каждую минуту; при заполнении пачки буфер сбрасывается сразу
+    },
+    'flush-article-views': {
+        'task': 'shop.tasks.flush_article_views_task',
+        'schedule': crontab(),  # Каждую минуту: на столько отстает сортировка статей по просмотрам
+    },
+}
+
+# --- Исходящие уведомления в Telegram ---
+# Лимиты Bot API: ~30 сообщений/сек на бота, 1 сообщение/сек в личный чат, 20 сообщений/мин в группу
+TELEGRAM_GLOBAL_RATE = float(os.environ.get('TELEGRAM_GLOBAL_RATE', 25))         # сообщений/сек (с запасом)
+TELEGRAM_PRIVATE_CHAT_RATE = float(os.environ.get('TELEGRAM_PRIVATE_CHAT_RATE', 1))
+TELEGRAM_GROUP_CHAT_RATE = float(os.environ.get('TELEGRAM_GROUP_CHAT_RATE', 20 / 60))
+TELEGRAM_MAX_RETRIES = int(os.environ.get('TELEGRAM_MAX_RETRIES', 4))           # Повторов на 429/5xx/сетевые ошибки
+TELEGRAM_MAX_INLINE_WAIT = float(os.environ.get('TELEGRAM_MAX_INLINE_WAIT', 15))  # Дольше ждать в воркере не будем — retry задачи
+# Дайджест: если за окно пришло больше N заказов, они уходят одним сообщением в конце окна
+TELEGRAM_DIGEST_ENABLED = os.environ.get('TELEGRAM_DIGEST_ENABLED', 'True') == 'True'
+TELEGRAM_DIGEST_THRESHOLD = int(os.environ.get('TELEGRAM_DIGEST_THRESHOLD', 5))
+TELEGRAM_DIGEST_WINDOW = int(os.environ.get('TELEGRAM_DIGEST_WINDOW', 60))      # сек
+
+# --- Экспорт заказов из админки ---
+# До этого количества заказов CSV отдается сразу потоком, больше — собирается в фоне (Celery) в media
+ORDER_EXPORT_STREAMING_LIMIT = int(os.environ.get('ORDER_EXPORT_STREAMING_LIMIT', 5000))
+ORDER_EXPORT_CHUNK_SIZE = int(os.environ.get('ORDER_EXPORT_CHUNK_SIZE', 500))  # Заказов на одну пачку чтения из БД
+
+# --- Роллапы продаж (дашборд админки) ---
+# Сколько последних дней пересобирать каждую ночь (страховка от расхождений инкрементальных обновлений)
+SALES_ROLLUP_REBUILD_DAYS = int(os.environ.get('SALES_ROLLUP_REBUILD_DAYS', 3))
+
+# --- Черный список (shop.services.blacklist) ---
+# Как часто воркер сверяет версию черного списка в Redis (сек). Новые баны применяются не позже чем через столько.
+BLACKLIST_VERSION_CHECK_INTERVAL = float(os.environ.get('BLACKLIST_VERSION_CHECK_INTERVAL', 1))
+
+# --- Учет нарушений лимитов (shop.services.violations) ---
+SECURITY_LOG_FLUSH_BATCH = int(os.environ.get('SECURITY_LOG_FLUSH_BATCH', 500))       # Строк журнала за один bulk_create
+SECURITY_LOG_BUFFER_MAX = int(os.environ.get('SECURITY_LOG_BUFFER_MAX', 50000))       # Потолок буфера в Redis
+SECURITY_LOG_FLUSH_GUARD_SECONDS = int(os.environ.get('SECURITY_LOG_FLUSH_GUARD_SECONDS', 10))  # Не чаще одной задачи сброса в очереди
+# Срок хранения журнала (shop.services.security_log_retention). Секции по дням включаются
+# командой `manage.py security_log_partitions --convert` (только PostgreSQL).
+SECURITY_LOG_RETENTION_DAYS = int(os.environ.get('SECURITY_LOG_RETENTION_DAYS', 90))
+SECURITY_LOG_PARTITION_DAYS_AHEAD = int(os.environ.get('SECURITY_LOG_PARTITION_DAYS_AHEAD', 7))
+SECURITY_LOG_ARCHIVE_PARTITIONS = os.environ.get('SECURITY_LOG_ARCHIVE_PARTITIONS', 'False') == 'True'  # DETACH вместо DROP
+
+# --- Просмотры статей (shop.services.article_views) ---
+ARTICLE_VIEWS_FLUSH_BATCH = int(os.environ.get('ARTICLE_VIEWS_FLUSH_BATCH', 500))          # Статей в одном UPDATE
+ARTICLE_VIEWS_SLUG_CACHE_TTL = int(os.environ.get('ARTICLE_VIEWS_SLUG_CACHE_TTL', 300))    # Карта slug -> id (сек)
+
+# --- Обработка статей при сохранении (shop.services.article_content) ---
+# Статьи длиннее лимита или с большим числом картинок обрабатываются в Celery
+ARTICLE_INLINE_PROCESSING_LIMIT = int(os.environ.get('ARTICLE_INLINE_PROCESSING_LIMIT', 20000))  # символов HTML
+ARTICLE_INLINE_MAX_IMAGES = int(os.environ.get('ARTICLE_INLINE_MAX_IMAGES', 2))
+ARTICLE_IMAGE_WIDTHS = [480, 800]  # Уменьшенные копии картинок для srcset (оригинал — до 1200px)
+ARTICLE_EXCERPT_LENGTH = 300       # символов
+ARTICLE_WORDS_PER_MINUTE = 200     # Скорость чтения для reading_time
+
+# --- Поиск по статьям и FAQ (shop.services.content_search, /api/search/content/) ---
+CONTENT_SEARCH_LIMIT = int(os.environ.get('CONTENT_SEARCH_LIMIT', 5))       # Результатов каждого типа по умолчанию
+CONTENT_SEARCH_MAX_LIMIT = int(os.environ.get('CONTENT_SEARCH_MAX_LIMIT', 20))
+
+# --- Двухуровневый кеш горячих объектов (shop.services.tiered_cache) ---
+# L1 — память процесса, L2 — Redis; сброс во всех процессах через версию в Redis.
+# В тестах выключен: L1 пережил бы откат транзакции между тестами
+TIERED_CACHE_ENABLED = os.environ.get('TIERED_CACHE_ENABLED', 'False' if 'test' in sys.argv else 'True') == 'True'
+TIERED_CACHE_L1_TTL = float(os.environ.get('TIERED_CACHE_L1_TTL', 60))                  # Страховка на случай без Redis (сек)
+TIERED_CACHE_L2_TTL = int(os.environ.get('TIERED_CACHE_L2_TTL', 3600))
+TIERED_CACHE_L1_MAX_ENTRIES = int(os.environ.get('TIERED_CACHE_L1_MAX_ENTRIES', 256))   # Записей на один кеш
+TIERED_CACHE_VERSION_CHECK_INTERVAL = float(os.environ.get('TIERED_CACHE_VERSION_CHECK_INTERVAL', 2))  # Задержка сброса (сек)
+
+# --- Оптимизация загруженных изображений (shop.image_processing) ---
+IMAGE_MAX_WIDTH = int(os.environ.get('IMAGE_MAX_WIDTH', 1920))
+IMAGE_QUALITY = int(os.environ.get('IMAGE_QUALITY', 85))
+IMAGE_WEBP_METHOD = int(os.environ.get('IMAGE_WEBP_METHOD', 4))                        # 0 — быстро, 6 — компактнее
+# Потолок пикселей после быстрого уменьшения при декодировании (~160 МБ в RGBA): больше — не обрабатываем
+IMAGE_MAX_DECODED_PIXELS = int(os.environ.get('IMAGE_MAX_DECODED_PIXELS', 40_000_000))
+IMAGE_BATCH_WORKERS = int(os.environ.get('IMAGE_BATCH_WORKERS', 0))                     # optimize_images: 0 — по числу ядер
+IMAGE_WORKER_MEMORY_LIMIT_MB = int(os.environ.get('IMAGE_WORKER_MEMORY_LIMIT_MB', 1024))  # Потолок памяти процесса пула
+
+# --- Картинки из редактора статей (shop.services.editor_images) ---
+TINYMCE_IMAGE_MAX_WIDTH = int(os.environ.get('TINYMCE_IMAGE_MAX_WIDTH', 1200))
+TINYMCE_INLINE_MAX_BYTES = int(os.environ.get('TINYMCE_INLINE_MAX_BYTES', 512 * 1024))  # Меньше — сразу в запросе
+TINYMCE_PREVIEW_QUALITY = int(os.environ.get('TINYMCE_PREVIEW_QUALITY', 60))            # Превью HEIC/HEIF до обработки в Celery
+# Свой потолок пикселей (~256 МБ в RGBA): PNG/HEIC с 48-мегапиксельной камеры не уменьшаются при декодировании
+TINYMCE_MAX_DECODED_PIXELS = int(os.environ.get('TINYMCE_MAX_DECODED_PIXELS', 64_000_000))
+
+# --- Стартовые данные мини-приложения (shop.services.bootstrap, /api/bootstrap/) ---
+# Сбрасывается сигналами при изменении моделей; TTL — страховка для изменений в обход save()
+BOOTSTRAP_CACHE_TTL = int(os.environ.get('BOOTSTRAP_CACHE_TTL', 300))
+
+# --- Сброс нагрузки (shop.services.load_shedding) ---
+# При очереди к воркерам отбрасываем (503 + Retry-After) сначала статьи и поиск, затем каталог,
+# затем карточки товаров. Корзина и заказы не отбрасываются. Очередь nginx сообщает в X-Request-Start.
+# В тестах выключено: монитор общий на процесс, медленный тест не должен ронять соседние.
+LOAD_SHEDDING_ENABLED = os.environ.get('LOAD_SHEDDING_ENABLED', 'False' if 'test' in sys.argv else 'True') == 'True'
+LOAD_SHEDDING_CAPACITY = int(os.environ.get('LOAD_SHEDDING_CAPACITY', 3))  # = числу воркеров gunicorn
+LOAD_SHEDDING_DELAY_THRESHOLDS = {  # Средняя задержка в очереди (сек), с которой класс отбрасывается
+    'low': float(os.environ.get('LOAD_SHEDDING_DELAY_LOW', 0.5)),
+    'normal': float(os.environ.get('LOAD_SHEDDING_DELAY_NORMAL', 1.0)),
+    'high': float(os.environ.get('LOAD_SHEDDING_DELAY_HIGH', 2.0)),
+}
+LOAD_SHEDDING_RETRY_AFTER = int(os.environ.get('LOAD_SHEDDING_RETRY_AFTER', 5))      # сек
+LOAD_SHEDDING_EWMA_ALPHA = float(os.environ.get('LOAD_SHEDDING_EWMA_ALPHA', 0.3))    # Вес нового замера
+LOAD_SHEDDING_DECAY = float(os.environ.get('LOAD_SHEDDING_DECAY', 10))               # Затухание средних без запросов (сек)
+LOAD_SHEDDING_STALE_AFTER = int(os.environ.get('LOAD_SHEDDING_STALE_AFTER', 60))     # > timeout gunicorn
+
+# --- Очистка корзин (Garbage Collection) ---
+# Корзины создаются для каждого гостя (X-Session-ID) и Telegram-пользователя и сами не удаляются.
+CART_RETENTION_DAYS = int(os.environ.get('CART_RETENTION_DAYS', 30))               # Брошенные корзины с товарами
+CART_EMPTY_RETENTION_HOURS = int(os.environ.get('CART_EMPTY_RETENTION_HOURS', 24))  # Пустые корзины
+CART_CLEANUP_BATCH_SIZE = int(os.environ.get('CART_CLEANUP_BATCH_SIZE', 500))       # Строк за одну транзакцию
+CART_CLEANUP_BATCH_PAUSE = float(os.environ.get('CART_CLEANUP_BATCH_PAUSE', 0.2))   # Пауза между пачками (сек)
+
 from django.utils.translation import gettext_lazy as _
 
 UNFOLD = {
     "SITE_TITLE": os.environ.get("ADMIN_SITE_TITLE", "BonaFide55 Admin"),
     "SITE_HEADER": os.environ.get("ADMIN_SITE_HEADER", "BonaFide55"),
     "SITE_URL": "/",
+    # Дашборд продаж на главной админки (читает только роллапы SalesDaily*)
+    "DASHBOARD_CALLBACK": "shop.admin_utils.dashboard_callback",
     "SITE_ICON": {
         "light": lambda request: static("admin/img/logo-light.svg"),  # light mode
         "dark": lambda request: static("admin/img/logo-dark.svg"),  # dark mode
@@ -473,6 +638,11 @@ UNFOLD = {
                         "icon": "shopping_basket",
                         "link": reverse_lazy("admin:shop_cart_changelist"),
                     },
+                    {
+                        "title": _("Экспорты заказов"),
+                        "icon": "download",
+                        "link": reverse_lazy("admin:shop_orderexport_changelist"),
+                    },
                     {
                         "title": _("Правила скидок"),
                         "icon": "local_offer",
@@ -0,0 +1,195 @@
+"""
+Нагрузочный тест сквозного сценария покупки: каталог -> поиск -> корзина -> расчет -> оформление.
+
+Виртуальные пользователи бывают двух видов:
+  - Telegram: получают валидную подпись initData для тестового токена бота (та же HMAC-схема,
+    что в shop.utils.validate_init_data) и ходят с заголовком "Authorization: tma <initData>";
+  - веб-гости: ходят с заголовком X-Session-ID.
+
+Запуск против локального сервера (runserver или gunicorn) с локальной БД:
+
+    TELEGRAM_BOT_TOKEN=123:test python manage.py runserver
+    python load_test.py --base-url http://127.0.0.1:8000 --bot-token 123:test --users 50 --duration 60
+
+Токен у сервера и у теста должен совпадать. Троттлинг DRF (по умолчанию anon 60/min, orders 5/min)
+на нагрузке быстро превращает все ответы в 429 — для замера пропускной способности поднимите лимиты
+через переменные окружения THROTTLE_RATE_ANON / THROTTLE_RATE_USER / THROTTLE_RATE_ORDERS.
+
+В каталоге должны быть активные товары с остатком (или разрешенным backorder), иначе оформление
+будет отвечать 409. Каждый заказ реально создается в БД — запускайте только на локальной базе.
+"""
+import argparse
+import hashlib
+import hmac
+import json
+import math
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+import requests
+
+SEARCH_TERMS = ['наушники', 'чехол', 'кабель', 'зарядка', 'apple', 'samsung', 'колонка']
+
+ORDER_FORM = {
+    'first_name': 'Нагрузка', 'last_name': 'Тестовая', 'phone': '+79990000000',
+    'delivery_method': 'СДЭК', 'cdek_office_address': 'ул. Тестовая, 1',
+}
+
+
+def mint_init_data(bot_token, user):
+    """Строка initData, которую shop.utils.validate_init_data примет для данного токена бота."""
+    fields = {
+        'auth_date': str(int(time.time())),
+        'query_id': uuid.uuid4().hex,
+        'user': json.dumps(user, separators=(',', ':'), ensure_ascii=False),
+    }
+    data_check_string = "\n".join(f"{key}={value}" for key, value in sorted(fields.items()))
+    secret_key = hmac.new(key=b"WebAppData", msg=bot_token.encode(), digestmod=hashlib.sha256).digest()
+    fields['hash'] = hmac.new(key=secret_key, msg=data_check_string.encode(), digestmod=hashlib.sha256).hexdigest()
+    return urlencode(fields)
+
+
+class Stats:
+    """Потокобезопасный сбор латентностей и статусов по эндпоинтам."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+        self.orders = 0
+
+    def record(self, endpoint, status_code, duration_ms):
+        with self._lock:
+            self.latencies[endpoint].append(duration_ms)
+            self.statuses[endpoint][status_code] += 1
+            if endpoint == 'POST /orders/create/' and status_code == 201:
+                self.orders += 1
+
+    @staticmethod
+    def percentile(sorted_values, p):
+        if not sorted_values:
+            return 0.0
+        # Метод ближайшего ранга
+        index = max(0, math.ceil(p / 100 * len(sorted_values)) - 1)
+        return sorted_values[index]
+
+    def report(self, elapsed):
+        header = f"{'Endpoint':<28}{'Reqs':>7}{'RPS':>8}{'p50':>9}{'p95':>9}{'p99':>9}{'Err%':>7}{'429':>6}{'409':>6}  Статусы"
+        print("\n" + header)
+        print("-" * len(header))
+        total = 0
+        for endpoint in sorted(self.latencies):
+            values = sorted(self.latencies[endpoint])
+            statuses = self.statuses[endpoint]
+            count = len(values)
+            total += count
+            # Ошибка — 5xx и сетевые сбои (status 0); 4xx показываем отдельно, это обычно троттлинг/остатки
+            errors = sum(n for code, n in statuses.items() if code == 0 or code >= 500)
+            print(
+                f"{endpoint:<28}{count:>7}{count / elapsed:>8.1f}"
+                f"{self.percentile(values, 50):>9.1f}{self.percentile(values, 95):>9.1f}{self.percentile(values, 99):>9.1f}"
+                f"{100 * errors / count:>7.1f}{statuses.get(429, 0):>6}{statuses.get(409, 0):>6}  "
+                + ", ".join(f"{code}:{n}" for code, n in sorted(statuses.items()))
+            )
+        print("-" * len(header))
+        print(f"Время: {elapsed:.1f} с, запросов: {total} ({total / elapsed:.1f} RPS), "
+              f"заказов: {self.orders} ({self.orders / elapsed:.2f} заказов/с). Латентность в мс.")
+
+
+class VirtualUser:
+    """Один покупатель со своим HTTP-соединением и своей личностью (Telegram или веб-гость)."""
+
+    def __init__(self, args, stats, number):
+        self.args = args
+        self.stats = stats
+        self.http = requests.Session()
+        if args.bot_token and random.random() < args.telegram_share:
+            user = {'id': 900_000_000 + number, 'first_name': 'Load', 'last_name': f'User{number}', 'username': f'load_{number}'}
+            self.http.headers['Authorization'] = f"tma {mint_init_data(args.bot_token, user)}"
+        else:
+            self.http.headers['X-Session-ID'] = f"load-{uuid.uuid4().hex}"
+
+    def call(self, method, label, path, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = self.http.request(method, self.args.base_url + path, timeout=self.args.timeout, **kwargs)
+            status_code = response.status_code
+        except requests.RequestException:
+            response, status_code = None, 0
+        self.stats.record(label, status_code, (time.perf_counter() - started) * 1000)
+        return response
+
+    def run_flow(self):
+        response = self.call('GET', 'GET /products/', '/api/products/', params={'page': random.randint(1, self.args.pages)})
+        products = response.json().get('results', []) if response is not None and response.ok else []
+        if not products:
+            return
+
+        product = random.choice(products)
+        self.call('GET', 'GET /products/<slug>/', f"/api/products/{product['slug']}/")
+        self.call('GET', 'GET /products/?search', '/api/products/', params={'search': random.choice(SEARCH_TERMS)})
+
+        quantity = random.randint(1, 2)
+        self.call('POST', 'POST /cart/', '/api/cart/', json={'product_id': product['id'], 'quantity': quantity})
+        selection = [{'product_id': product['id'], 'quantity': quantity}]
+        self.call('POST', 'POST /calculate-selection/', '/api/calculate-selection/', json={'selection': selection})
+
+        if random.random() < self.args.checkout_share:
+            self.call(
+                'POST', 'POST /orders/create/', '/api/orders/create/',
+                json={**ORDER_FORM, 'items': selection},
+                headers={'Idempotency-Key': uuid.uuid4().hex}
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест сценария покупки")
+    parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+    parser.add_argument('--bot-token', default=os.environ.get('TELEGRAM_BOT_TOKEN', ''),
+                        help="Токен бота, которым подписывается initData (как у сервера)")
+    parser.add_argument('--users', type=int, default=20, help="Одновременных виртуальных пользователей")
+    parser.add_argument('--duration', type=float, default=30, help="Длительность теста, сек")
+    parser.add_argument('--telegram-share', type=float, default=0.7, help="Доля пользователей из Telegram (0..1)")
+    parser.add_argument('--checkout-share', type=float, default=0.3, help="Доля сценариев, заканчивающихся заказом (0..1)")
+    parser.add_argument('--pages', type=int, default=1, help="Сколько первых страниц каталога просматривать")
+    parser.add_argument('--timeout', type=float, default=10)
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+    args.base_url = args.base_url.rstrip('/')
+
+    if args.seed is not None:
+        random.seed(args.seed)
+    if not args.bot_token:
+        print("⚠️  Токен бота не задан: все пользователи будут веб-гостями (X-Session-ID).")
+
+    stats = Stats()
+    deadline = time.monotonic() + args.duration
+
+    def worker(number):
+        # Новый покупатель на каждую итерацию: лимиты заказов считаются на пользователя
+        iteration = 0
+        while time.monotonic() < deadline:
+            VirtualUser(args, stats, number * 100_000 + iteration).run_flow()
+            iteration += 1
+
+    print(f"\n🚀 {args.users} пользователей, {args.duration:.0f} с -> {args.base_url}")
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=args.users) as pool:
+        list(pool.map(worker, range(args.users)))
+    elapsed = time.monotonic() - started
+
+    if not stats.latencies:
+        print("❌ Ни одного запроса не выполнено")
+        sys.exit(1)
+    stats.report(elapsed)
+
+
+if __name__ == '__main__':
+    main()
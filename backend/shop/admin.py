@@ -1,5 +1,4 @@
 # backend/shop/admin.py
-import csv
 import os
 import zipfile
 import json
@@ -10,7 +9,9 @@ from datetime import datetime
 from django.contrib import admin, messages
 from unfold.admin import ModelAdmin, TabularInline
 from unfold.contrib.filters.admin import RangeDateFilter, ChoicesDropdownFilter, ChoicesDropdownFilter, RelatedDropdownFilter, TextFilter, FieldTextFilter
-from django.http import HttpResponse, HttpResponseRedirect
+from django.http import HttpResponse, HttpResponseRedirect, StreamingHttpResponse, FileResponse
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
 from django.utils.html import format_html
 from django.utils.safestring import mark_safe
 from django.shortcuts import render # Добавлено
@@ -28,13 +29,18 @@ from .models import (
     Feature, CharacteristicSection, Characteristic, ProductCharacteristic, Cart,
 
     CartItem, Order, OrderItem, ArticleCategory, Article, Backup, CharacteristicGroup,
-    FeatureDefinition, SecurityBlockLog, BlacklistedItem
+    FeatureDefinition, SecurityBlockLog, BlacklistedItem, OrderExport
 )
+from .services.order_export import OrderExportService
 from .admin_forms import ProductAdminForm, CharacteristicsWidget
 from tinymce.models import HTMLField
 
 from tinymce.widgets import TinyMCE
 
+# Главная админки: дашборд продаж поверх стандартного списка приложений Unfold
+# (данные готовит shop.admin_utils.dashboard_callback)
+admin.site.index_template = "admin/shop/dashboard.html"
+
 class MultipleFileInput(forms.FileInput):
     """
     Кастомный виджет для загрузки нескольких файлов.
@@ -278,8 +284,8 @@ class ProductAdmin(ModelAdmin):
             )
             return
 
-        from django.core.files.base import ContentFile
-        
+        from .storage import clone_file
+
         duplicated_count = 0
         for original_product in queryset:
             try:
@@ -290,19 +296,14 @@ class ProductAdmin(ModelAdmin):
                 cards_to_copy = list(original_product.info_cards.all())
                 features_to_copy = list(original_product.features.all())
 
-                # Копируем главное изображение
+                # Файлы не копируем: в хранилище по содержимому копия — еще одна ссылка на тот же блоб
                 main_image_copy = None
                 if original_product.main_image:
-                    main_image_copy = ContentFile(original_product.main_image.read())
-                    main_image_copy.name = original_product.main_image.name.split('/')[-1]
-                    original_product.main_image.seek(0)  # Сброс указателя файла
-                
-                # Копируем аудио
+                    main_image_copy = clone_file(original_product.main_image.storage, original_product.main_image.name)
+
                 audio_copy = None
                 if original_product.audio_sample:
-                    audio_copy = ContentFile(original_product.audio_sample.read())
-                    audio_copy.name = original_product.audio_sample.name.split('/')[-1]
-                    original_product.audio_sample.seek(0)
+                    audio_copy = clone_file(original_product.audio_sample.storage, original_product.audio_sample.name)
 
                 # Создаём копию товара
                 new_product = Product(
@@ -332,26 +333,18 @@ class ProductAdmin(ModelAdmin):
                 # Копируем дополнительные изображения
                 for image in images_to_copy:
                     if image.image:
-                        image_copy = ContentFile(image.image.read())
-                        image_copy.name = image.image.name.split('/')[-1]
-                        image.image.seek(0)
-                        
                         ProductImage.objects.create(
                             product=new_product,
-                            image=image_copy
+                            image=clone_file(image.image.storage, image.image.name)
                         )
 
                 # Копируем инфо-карточки
                 for card in cards_to_copy:
                     if card.image:
-                        card_image_copy = ContentFile(card.image.read())
-                        card_image_copy.name = card.image.name.split('/')[-1]
-                        card.image.seek(0)
-                        
                         ProductInfoCard.objects.create(
                             product=new_product,
                             title=card.title,
-                            image=card_image_copy,
+                            image=clone_file(card.image.storage, card.image.name),
                             link_url=card.link_url
                         )
                     else:
@@ -748,7 +741,7 @@ class CartAdmin(ModelAdmin):
 class OrderItemInline(TabularInline):
     model = OrderItem
     extra = 0
-    readonly_fields = ('product', 'quantity', 'price_at_purchase')
+    readonly_fields = ('product', 'quantity', 'price_at_purchase', 'reserved_quantity')
     can_delete = False
     verbose_name = "Товар в заказе"
     verbose_name_plural = "Товары в заказе"
@@ -768,7 +761,7 @@ class OrderAdmin(ModelAdmin):
         'subtotal', 'discount_amount', 'final_total', 'applied_rule'
     )
     inlines = [OrderItemInline]
-    actions = ['export_as_csv']
+    actions = ['export_as_csv', 'export_in_background']
 
     fieldsets = (
         ('Основная информация', {'fields': ('id', 'status', 'created_at', 'telegram_id')}),
@@ -801,20 +794,70 @@ class OrderAdmin(ModelAdmin):
 
     @admin.action(description='Экспортировать выбранные заказы в CSV')
     def export_as_csv(self, request, queryset):
-        meta = self.model._meta
-        field_names = [
-            'id', 'status', 'last_name', 'first_name', 'patronymic', 'phone',
-            'delivery_method', 'city', 'district', 'street', 'house',
-            'apartment', 'postcode', 'cdek_office_address', 'final_total', 'created_at'
-        ]
-        response = HttpResponse(content_type='text/csv; charset=utf-8')
-        response['Content-Disposition'] = f'attachment; filename={meta.verbose_name_plural}.csv'
-        writer = csv.writer(response)
-        writer.writerow(field_names)
-        for obj in queryset:
-            writer.writerow([getattr(obj, field) for field in field_names])
+        # Большие выборки не держат gunicorn-воркер: собираем файл в фоне
+        if queryset.count() > settings.ORDER_EXPORT_STREAMING_LIMIT:
+            return self.export_in_background(request, queryset)
+
+        response = StreamingHttpResponse(
+            OrderExportService().stream_csv(queryset),
+            content_type='text/csv; charset=utf-8'
+        )
+        response['Content-Disposition'] = f'attachment; filename=orders_{timezone.localdate():%Y-%m-%d}.csv'
         return response
 
+    @admin.action(description='Экспортировать выбранные заказы в фоне (CSV.gz)')
+    def export_in_background(self, request, queryset):
+        from .tasks import export_orders_task
+
+        # В задачу уходят критерии, а не список id: «выбрать все» по фильтру — это сотни тысяч заказов
+        criteria = {'query': request.GET.urlencode()}
+        if request.POST.get('select_across') != '1':
+            # Отмечены заказы на странице списка — их не больше list_per_page
+            criteria['ids'] = list(queryset.order_by('id').values_list('id', flat=True))
+        orders_count = queryset.count()
+        export = OrderExport.objects.create(created_by=request.user, orders_count=orders_count, criteria=criteria)
+        transaction.on_commit(lambda: export_orders_task.delay(export.id))
+        self.message_user(
+            request,
+            f"Экспорт {orders_count} заказов поставлен в очередь. Файл появится в разделе «Экспорты заказов», "
+            f"менеджер получит уведомление в Telegram.",
+            messages.INFO
+        )
+
+
+@admin.register(OrderExport)
+class OrderExportAdmin(ModelAdmin):
+    list_display = ('__str__', 'status', 'orders_count', 'rows_count', 'created_by', 'download_link')
+    list_filter = (('status', ChoicesDropdownFilter),)
+    readonly_fields = ('created_by', 'created_at', 'status', 'orders_count', 'rows_count', 'log', 'download_link')
+    fields = readonly_fields
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_urls(self):
+        urls = super().get_urls()
+        custom_urls = [
+            path('<int:pk>/download/', self.admin_site.admin_view(self.download_view), name='shop_orderexport_download'),
+        ]
+        return custom_urls + urls
+
+    def download_link(self, obj):
+        if obj.file:
+            return format_html('<a href="{}">⬇️ Скачать</a>', reverse('admin:shop_orderexport_download', args=[obj.pk]))
+        return "-"
+    download_link.short_description = "Файл"
+
+    def download_view(self, request, pk):
+        """Отдает файл через админку (с проверкой прав), а не прямой ссылкой на media."""
+        export = get_object_or_404(OrderExport, pk=pk)
+        if not self.has_view_permission(request, export) or not export.file:
+            return HttpResponseRedirect(reverse('admin:shop_orderexport_changelist'))
+        return FileResponse(export.file.open('rb'), as_attachment=True, filename=os.path.basename(export.file.name))
+
 
 @admin.register(ArticleCategory)
 class ArticleCategoryAdmin(ModelAdmin):
@@ -829,7 +872,7 @@ class ArticleAdmin(ModelAdmin):
         HTMLField: {'widget': TinyMCE(attrs={'cols': 80, 'rows': 30})},
     }
     # 1. ИЗМЕНЕНИЕ: Добавляем 'is_featured' и 'views_count' в список для удобства
-    list_display = ('title', 'category', 'status', 'is_featured', 'views_count', 'published_at')
+    list_display = ('title', 'category', 'status', 'is_featured', 'views_count', 'unique_views_count', 'published_at')
     list_filter = (
         ('status', ChoicesDropdownFilter),
         ('category', RelatedDropdownFilter),
@@ -1,7 +1,84 @@
-from .models import Order
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db.models import Sum
+from django.utils import timezone
+
+from .models import Order, SalesDailyStatus, SalesDailyProduct, SalesDailyCategory, SalesDailyDiscount
 
 def order_badge_callback(request):
     """
     Возвращает количество новых заказов для отображения бэйджа в меню админки.
     """
     return Order.objects.filter(status=Order.OrderStatus.NEW).count()
+
+
+DASHBOARD_PERIOD_DAYS = 30
+DASHBOARD_TOP_LIMIT = 10
+
+
+def _money(value):
+    return f"{(value or Decimal('0')):,.0f} ₽".replace(',', ' ')
+
+
+def dashboard_callback(request, context):
+    """
+    Данные для главной страницы админки (Unfold DASHBOARD_CALLBACK).
+    Читает только дневные роллапы продаж — никаких агрегатов по Order/OrderItem на лету.
+    """
+    today = timezone.localdate()
+    period_start = today - timedelta(days=DASHBOARD_PERIOD_DAYS - 1)
+    active = SalesDailyStatus.objects.exclude(status=Order.OrderStatus.CANCELED)
+
+    def totals(queryset):
+        return queryset.aggregate(orders=Sum('orders_count'), revenue=Sum('revenue'), discount=Sum('discount_amount'))
+
+    today_totals = totals(active.filter(day=today))
+    period_totals = totals(active.filter(day__gte=period_start))
+    period_orders = period_totals['orders'] or 0
+    average_check = (period_totals['revenue'] or Decimal('0')) / period_orders if period_orders else Decimal('0')
+
+    by_status = dict(
+        SalesDailyStatus.objects.filter(day__gte=period_start).values('status')
+        .annotate(orders=Sum('orders_count')).values_list('status', 'orders')
+    )
+    top_products = (
+        SalesDailyProduct.objects.filter(day__gte=period_start).values('product__name')
+        .annotate(quantity=Sum('quantity'), revenue=Sum('revenue')).order_by('-revenue')[:DASHBOARD_TOP_LIMIT]
+    )
+    top_categories = (
+        SalesDailyCategory.objects.filter(day__gte=period_start).values('category__name')
+        .annotate(quantity=Sum('quantity'), revenue=Sum('revenue')).order_by('-revenue')[:DASHBOARD_TOP_LIMIT]
+    )
+    discounts = (
+        SalesDailyDiscount.objects.filter(day__gte=period_start).values('rule_name')
+        .annotate(orders=Sum('orders_count'), amount=Sum('discount_amount')).order_by('-amount')
+    )
+
+    context.update({
+        'sales_period_days': DASHBOARD_PERIOD_DAYS,
+        'sales_kpi': [
+            {'title': "Выручка сегодня", 'value': _money(today_totals['revenue'])},
+            {'title': "Заказов сегодня", 'value': today_totals['orders'] or 0},
+            {'title': f"Выручка за {DASHBOARD_PERIOD_DAYS} дн.", 'value': _money(period_totals['revenue'])},
+            {'title': "Средний чек", 'value': _money(average_check)},
+            {'title': f"Скидки за {DASHBOARD_PERIOD_DAYS} дн.", 'value': _money(period_totals['discount'])},
+        ],
+        'sales_by_status': {
+            'headers': ["Статус", "Заказов"],
+            'rows': [[label, by_status.get(value, 0)] for value, label in Order.OrderStatus.choices],
+        },
+        'sales_top_products': {
+            'headers': ["Товар", "Шт.", "Выручка"],
+            'rows': [[row['product__name'], row['quantity'], _money(row['revenue'])] for row in top_products],
+        },
+        'sales_top_categories': {
+            'headers': ["Категория", "Шт.", "Выручка"],
+            'rows': [[row['category__name'], row['quantity'], _money(row['revenue'])] for row in top_categories],
+        },
+        'sales_discounts': {
+            'headers': ["Правило скидки", "Заказов", "Сумма скидок"],
+            'rows': [[row['rule_name'], row['orders'], _money(row['amount'])] for row in discounts],
+        },
+    })
+    return context
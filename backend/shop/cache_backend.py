@@ -0,0 +1,184 @@
+"""
+Бэкенд кеша Django поверх встроенного RedisCache: сжатие больших значений и метрики по префиксам ключей.
+
+- CompressedSerializer: значения крупнее CACHE_COMPRESS_MIN_BYTES после pickle сжимаются zlib.
+  Целые числа, как и у Django, хранятся как есть (нужно для incr).
+- InstrumentedRedisCache: считает попадания/промахи и байты в/из Redis по первому сегменту ключа
+  ('tiered', 'bootstrap', 'articles', ...). Счетчики копятся в процессе и раз в
+  CACHE_METRICS_FLUSH_INTERVAL секунд уходят одним пайплайном в хеш Redis (см. cache_stats).
+"""
+import logging
+import pickle
+import threading
+import time
+import zlib
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache.backends.redis import RedisCache, RedisCacheClient, RedisSerializer
+from django.utils.functional import cached_property
+
+logger = logging.getLogger('shop')
+
+METRICS_KEY = 'cache:metrics'
+METRICS_FIELDS = ('hit', 'miss', 'set', 'bytes_in', 'bytes_out')
+
+# Первый байт сжатого значения. pickle (протокол 2+) всегда начинается с 0x80,
+# поэтому значения, записанные до включения сжатия, читаются как раньше
+ZLIB_MARKER = b'Z'
+
+
+class CompressedSerializer(RedisSerializer):
+    def dumps(self, obj):
+        if type(obj) is int:
+            return obj
+        data = pickle.dumps(obj, self.protocol)
+        if len(data) < settings.CACHE_COMPRESS_MIN_BYTES:
+            return data
+        compressed = ZLIB_MARKER + zlib.compress(data, settings.CACHE_COMPRESS_LEVEL)
+        # Уже сжатое (картинки, gzip) zlib только раздует
+        return compressed if len(compressed) < len(data) else data
+
+    def loads(self, data):
+        try:
+            return int(data)
+        except ValueError:
+            pass
+        if data[:1] == ZLIB_MARKER:
+            data = zlib.decompress(memoryview(data)[1:])
+        return pickle.loads(data)
+
+
+class CacheMetrics:
+    """Счетчики процесса по префиксам ключей с периодическим сбросом в Redis."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = Counter()
+        self._flushed_at = time.monotonic()
+
+    def add(self, prefix: str, **values):
+        if not settings.CACHE_METRICS_ENABLED:
+            return
+        with self._lock:
+            for field, value in values.items():
+                if value:
+                    self._counters[f'{prefix}:{field}'] += value
+            if time.monotonic() - self._flushed_at < settings.CACHE_METRICS_FLUSH_INTERVAL:
+                return
+        self.flush()
+
+    def flush(self):
+        with self._lock:
+            counters, self._counters = self._counters, Counter()
+            self._flushed_at = time.monotonic()
+        if not counters:
+            return
+        try:
+            from shop.redis_client import get_redis
+
+            pipe = get_redis().pipeline(transaction=False)
+            for field, value in counters.items():
+                pipe.hincrby(METRICS_KEY, field, value)
+            pipe.execute()
+        except Exception as e:
+            logger.debug(f"Cache metrics unavailable: {e}")
+
+    def stats(self):
+        """{префикс: {hit, miss, set, bytes_in, bytes_out}} по всем процессам (из Redis)."""
+        from shop.redis_client import get_redis
+
+        result = {}
+        for field, value in get_redis().hgetall(METRICS_KEY).items():
+            prefix, _, name = field.decode().rpartition(':')
+            result.setdefault(prefix, dict.fromkeys(METRICS_FIELDS, 0))[name] = int(value)
+        return result
+
+    def reset_stats(self):
+        from shop.redis_client import get_redis
+
+        with self._lock:
+            self._counters.clear()
+        get_redis().delete(METRICS_KEY)
+
+
+cache_metrics = CacheMetrics()
+
+
+class InstrumentedRedisCacheClient(RedisCacheClient):
+    def __init__(self, servers, key_prefix='', **options):
+        super().__init__(servers, **options)
+        # Ключ Django: '<KEY_PREFIX>:<версия>:<ключ>'
+        self._skip = len(key_prefix) + 1
+
+    def _prefix(self, key) -> str:
+        key = key[self._skip:].partition(':')[2]
+        prefix, sep, _ = key.partition(':')
+        # Ключи без сегментов (хеши initData и т.п.) в одну группу, чтобы не плодить счетчики
+        return prefix if sep else '-'
+
+    def get(self, key, default):
+        client = self.get_client(key)
+        value = client.get(key)
+        if value is None:
+            cache_metrics.add(self._prefix(key), miss=1)
+            return default
+        cache_metrics.add(self._prefix(key), hit=1, bytes_in=len(value))
+        return self._serializer.loads(value)
+
+    def get_many(self, keys):
+        keys = list(keys)
+        client = self.get_client(None)
+        result = {}
+        for key, value in zip(keys, client.mget(keys)):
+            if value is None:
+                cache_metrics.add(self._prefix(key), miss=1)
+                continue
+            cache_metrics.add(self._prefix(key), hit=1, bytes_in=len(value))
+            result[key] = self._serializer.loads(value)
+        return result
+
+    def add(self, key, value, timeout):
+        client = self.get_client(key, write=True)
+        value = self._dumps(key, value)
+        if timeout == 0:
+            if ret := bool(client.set(key, value, nx=True)):
+                client.delete(key)
+            return ret
+        return bool(client.set(key, value, ex=timeout, nx=True))
+
+    def set(self, key, value, timeout):
+        client = self.get_client(key, write=True)
+        value = self._dumps(key, value)
+        if timeout == 0:
+            client.delete(key)
+        else:
+            client.set(key, value, ex=timeout)
+
+    def set_many(self, data, timeout):
+        client = self.get_client(None, write=True)
+        pipeline = client.pipeline()
+        pipeline.mset({key: self._dumps(key, value) for key, value in data.items()})
+        if timeout is not None:
+            for key in data:
+                pipeline.expire(key, timeout)
+        pipeline.execute()
+
+    def _dumps(self, key, value):
+        data = self._serializer.dumps(value)
+        size = len(data) if isinstance(data, bytes) else len(str(data))
+        cache_metrics.add(self._prefix(key), set=1, bytes_out=size)
+        return data
+
+
+class InstrumentedRedisCache(RedisCache):
+    """RedisCache со сжатием (CompressedSerializer по умолчанию) и метриками по префиксам ключей."""
+
+    def __init__(self, server, params):
+        super().__init__(server, params)
+        self._class = InstrumentedRedisCacheClient
+        self._options = {'serializer': CompressedSerializer, **self._options}
+
+    @cached_property
+    def _cache(self):
+        return self._class(self._servers, key_prefix=self.key_prefix, **self._options)
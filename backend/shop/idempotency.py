@@ -0,0 +1,115 @@
+import functools
+import hashlib
+import json
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.response import Response
+
+logger = logging.getLogger('shop')
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+
+
+def _owner(request):
+    """Ключи изолированы по пользователю: чужой Idempotency-Key не дает доступа к чужому ответу."""
+    if getattr(request, 'telegram_user', None):
+        return f"tg_{request.telegram_user['id']}"
+    if getattr(request, 'session_key', None):
+        return f"sess_{request.session_key}"
+    return None
+
+
+def _fingerprint(request):
+    """Отпечаток тела запроса: тот же ключ с другим телом — ошибка клиента, а не повтор."""
+    payload = json.dumps(request.data, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def cache_keys(scope, method, owner, key):
+    """(ключ сохраненного ответа, ключ блокировки) в кеше."""
+    digest = hashlib.sha256(f"{scope}:{method}:{owner}:{key}".encode()).hexdigest()
+    return f"idem:result:{digest}", f"idem:lock:{digest}"
+
+
+def idempotent(scope):
+    """
+    Декоратор метода view (post/patch/delete) с поддержкой заголовка Idempotency-Key.
+
+    - Первый запрос с ключом выполняется, успешный (2xx) ответ сохраняется в Redis на IDEMPOTENCY_TTL
+      и отдается повторно на запросы с тем же ключом (заголовок Idempotent-Replayed: true).
+    - Параллельный дубль (двойной тап в WebView, ретрай по таймауту) не выполняет работу второй раз:
+      ждет короткую блокировку первого запроса и получает его ответ.
+    - Ошибки (4xx/5xx) не кешируются — клиент может исправить запрос и повторить с тем же ключом.
+    - Без заголовка или при недоступном Redis запрос выполняется как обычно.
+
+    Используется внутри SessionAuthMixin: к моменту вызова метода пользователь уже определен.
+    """
+    def decorator(handler):
+        @functools.wraps(handler)
+        def wrapper(self, request, *args, **kwargs):
+            key = request.headers.get(HEADER)
+            owner = _owner(request)
+            if not key or not owner:
+                return handler(self, request, *args, **kwargs)
+            if len(key) > MAX_KEY_LENGTH:
+                return Response({"error": f"{HEADER} is too long"}, status=status.HTTP_400_BAD_REQUEST)
+
+            result_key, lock_key = cache_keys(scope, request.method, owner, key)
+            fingerprint = _fingerprint(request)
+
+            try:
+                deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_TIMEOUT
+                while True:
+                    stored = cache.get(result_key)
+                    if stored is not None:
+                        return _replay(stored, fingerprint)
+                    if cache.add(lock_key, fingerprint, settings.IDEMPOTENCY_LOCK_TIMEOUT):
+                        break
+                    if time.monotonic() >= deadline:
+                        return Response(
+                            {"error": "A request with this Idempotency-Key is still in progress"},
+                            status=status.HTTP_409_CONFLICT
+                        )
+                    time.sleep(settings.IDEMPOTENCY_POLL_INTERVAL)
+            except Exception as e:
+                # Redis недоступен — лучше рискнуть дублем, чем отказать в оформлении
+                logger.warning(f"Idempotency storage unavailable, processing without it: {e}")
+                return handler(self, request, *args, **kwargs)
+
+            try:
+                response = handler(self, request, *args, **kwargs)
+                if status.is_success(response.status_code):
+                    try:
+                        cache.set(
+                            result_key,
+                            {'fingerprint': fingerprint, 'status': response.status_code, 'data': response.data},
+                            settings.IDEMPOTENCY_TTL
+                        )
+                    except Exception as e:
+                        # Работа уже сделана — ответ отдаем, даже если не удалось его сохранить
+                        logger.warning(f"Failed to store idempotent response: {e}")
+                return response
+            finally:
+                try:
+                    cache.delete(lock_key)
+                except Exception as e:
+                    logger.warning(f"Failed to release idempotency lock: {e}")
+
+        return wrapper
+    return decorator
+
+
+def _replay(stored, fingerprint):
+    if stored['fingerprint'] != fingerprint:
+        return Response(
+            {"error": f"{HEADER} was already used with a different request body"},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY
+        )
+    response = Response(stored['data'], status=stored['status'])
+    response['Idempotent-Replayed'] = 'true'
+    return response
@@ -0,0 +1,61 @@
+"""
+Кто делает запрос: IP, пользователь Telegram (проверенный initData) и X-Session-ID.
+
+Определяется один раз на запрос (IdentityMiddleware) и дальше переиспользуется
+черным списком, SessionAuthMixin, троттлингом и обработчиком исключений —
+никто больше не разбирает заголовки сам.
+"""
+from dataclasses import dataclass
+from typing import Optional
+
+from django.conf import settings
+
+from .utils import validate_init_data
+
+
+@dataclass
+class Identity:
+    ip: Optional[str] = None
+    telegram_user: Optional[dict] = None
+    session_key: Optional[str] = None
+    # Заголовок "Authorization: tma ..." был, но подпись не прошла проверку
+    init_data_invalid: bool = False
+
+    @property
+    def telegram_id(self) -> Optional[str]:
+        if self.telegram_user and self.telegram_user.get('id') is not None:
+            return str(self.telegram_user['id'])
+        return None
+
+
+def get_client_ip(request) -> Optional[str]:
+    x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
+    if x_forwarded_for:
+        return x_forwarded_for.split(',')[0].strip()
+    return request.META.get('REMOTE_ADDR')
+
+
+def resolve_identity(request) -> Identity:
+    identity = Identity(ip=get_client_ip(request))
+
+    auth_header = request.headers.get('Authorization')
+    if auth_header and auth_header.startswith('tma '):
+        init_data_str = auth_header.split(' ')[1]
+        # validate_init_data кеширует успешные проверки — повторные запросы сеанса почти бесплатны
+        identity.telegram_user = validate_init_data(init_data_str, settings.TELEGRAM_BOT_TOKEN)
+        identity.init_data_invalid = identity.telegram_user is None
+
+    if not identity.telegram_user:
+        identity.session_key = request.headers.get('X-Session-ID') or None
+    return identity
+
+
+def get_identity(request) -> Identity:
+    """Identity запроса; если middleware не отработал (тесты через RequestFactory), вычисляется здесь."""
+    # DRF Request проксирует атрибуты на исходный HttpRequest
+    request = getattr(request, '_request', request)
+    identity = getattr(request, 'identity', None)
+    if identity is None:
+        identity = resolve_identity(request)
+        request.identity = identity
+    return identity
@@ -1,51 +1,224 @@
+import logging
+import multiprocessing
 import os
-from PIL import Image
-from io import BytesIO
-from django.core.files.base import ContentFile
+import tempfile
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
 from django.conf import settings
-import logging
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import connections
+from PIL import ExifTags, Image
 
 logger = logging.getLogger(__name__)
 
-def optimize_image_file(image_field, output_format='WEBP', quality=85, max_width=1920):
+# EXIF Orientation -> поворот/отражение, которое приводит пиксели к виду "как на экране"
+EXIF_TRANSPOSE = {
+    2: Image.Transpose.FLIP_LEFT_RIGHT,
+    3: Image.Transpose.ROTATE_180,
+    4: Image.Transpose.FLIP_TOP_BOTTOM,
+    5: Image.Transpose.TRANSPOSE,
+    6: Image.Transpose.ROTATE_270,
+    7: Image.Transpose.TRANSVERSE,
+    8: Image.Transpose.ROTATE_90,
+}
+# Ориентации, при которых ширина и высота на экране меняются местами
+SWAPS_AXES = {5, 6, 7, 8}
+
+# Модели shop, чье поле image оптимизируется (process_image_task, optimize_images)
+OPTIMIZED_IMAGE_MODELS = ('ProductImage', 'PromoBanner')
+
+
+class ImageTooLarge(Exception):
+    """Картинка даже после быстрого уменьшения при декодировании больше допустимого числа пикселей."""
+
+
+def optimize_image_file(image_field, output_format='WEBP', quality=None, max_width=None):
     """
     Принимает поле модели (ImageField) и оптимизирует файл внутри него.
-    :param image_field: поле модели (например, product.image)
+    :param image_field: поле модели (например, product.image) или любой открываемый файл с .name
     :param output_format: формат (WEBP, JPEG)
-    :param quality: качество (1-100)
-    :param max_width: максимальная ширина (для ресайза огромных фото)
-    :return: ContentFile (оптимизированный) или None, если что-то пошло не так
+    :param quality: качество (1-100), по умолчанию IMAGE_QUALITY
+    :param max_width: максимальная ширина на экране, по умолчанию IMAGE_MAX_WIDTH
+    :return: (имя файла, File) или None, если что-то пошло не так.
+             File — временный файл на диске, вызывающий обязан его закрыть (закрытие удаляет файл).
     """
     if not image_field:
         return None
 
     try:
-        # Открываем изображение
-        img = Image.open(image_field)
-        
-        # Если есть альфа-канал и мы конвертируем в JPEG (который его не поддерживает),
-        # нужно заменить прозрачность на белый фон (или любой другой).
-        # Но для WEBP прозрачность поддерживается, так что RGBA оставляем.
-        if output_format.upper() == 'JPEG' and img.mode == 'RGBA':
-            img = img.convert('RGB')
-        
-        # Ресайз (если слишком огромное)
-        if img.width > max_width:
-            ratio = max_width / img.width
-            new_height = int(img.height * ratio)
-            img = img.resize((max_width, new_height), Image.Resampling.LANCZOS)
-
-        # Сохраняем в буфер памяти
-        output_io = BytesIO()
-        img.save(output_io, format=output_format, quality=quality, optimize=True)
-        
-        # Создаем имя нового файла
-        original_name = os.path.basename(image_field.name)
-        name_without_ext = os.path.splitext(original_name)[0]
-        new_filename = f"{name_without_ext}.{output_format.lower()}"
-
-        return new_filename, ContentFile(output_io.getvalue())
-
+        output = encode_optimized(image_field, output_format, quality, max_width)
     except Exception as e:
         logger.error(f"Error optimizing image {image_field.name}: {e}")
         return None
+
+    name_without_ext = os.path.splitext(os.path.basename(image_field.name))[0]
+    return f"{name_without_ext}.{output_format.lower()}", File(output)
+
+
+def encode_optimized(source, output_format='WEBP', quality=None, max_width=None, webp_method=None,
+                     max_pixels=None):
+    """
+    Открывает, уменьшает и перекодирует картинку во временный файл (NamedTemporaryFile, позиция в начале).
+
+    - JPEG декодируется сразу в уменьшенном масштабе (draft: 1/2, 1/4, 1/8 средствами libjpeg),
+      остальные форматы перед LANCZOS сжимаются целочисленно (reduce, через reducing_gap):
+      48-мегапиксельное фото не раскладывается в память целиком ради 1920 пикселей ширины.
+    - Поворот по EXIF Orientation применяется к уже уменьшенной картинке.
+    - EXIF/XMP (геометки, модель телефона) не сохраняются; ICC-профиль сохраняется ради цветов.
+    - Результат пишется сразу в файл на диске, а не в BytesIO.
+    - Больше max_pixels (по умолчанию IMAGE_MAX_DECODED_PIXELS) после draft — ImageTooLarge.
+    """
+    output_format = output_format.upper()
+    quality = quality or settings.IMAGE_QUALITY
+    max_width = max_width or settings.IMAGE_MAX_WIDTH
+    max_pixels = max_pixels or settings.IMAGE_MAX_DECODED_PIXELS
+
+    with Image.open(source) as img:
+        orientation = img.getexif().get(ExifTags.Base.Orientation, 1)
+        swapped = orientation in SWAPS_AXES
+        # Размеры "как на экране" и ограничение ширины в этих координатах
+        shown_width, shown_height = (img.height, img.width) if swapped else img.size
+        scale = min(1.0, max_width / shown_width)
+        target = (round(shown_width * scale) or 1, round(shown_height * scale) or 1)
+        stored_target = (target[1], target[0]) if swapped else target
+
+        if scale < 1:
+            # У форматов без быстрого декодирования draft() ничего не делает
+            img.draft('RGB', stored_target)
+        if img.width * img.height > max_pixels:
+            raise ImageTooLarge(f"{img.width}x{img.height}")
+
+        icc_profile = img.info.get('icc_profile')
+        mode = _target_mode(img, output_format)
+        frame = img if img.mode == mode else img.convert(mode)
+        if frame.size != stored_target:
+            frame = frame.resize(stored_target, Image.Resampling.LANCZOS, reducing_gap=3.0)
+        if orientation in EXIF_TRANSPOSE:
+            frame = frame.transpose(EXIF_TRANSPOSE[orientation])
+
+        output = tempfile.NamedTemporaryFile(suffix=f'.{output_format.lower()}')
+        try:
+            options = {'quality': quality}
+            if icc_profile:
+                options['icc_profile'] = icc_profile
+            if output_format == 'JPEG':
+                options.update(optimize=True, progressive=True)
+            elif output_format == 'WEBP':
+                options['method'] = settings.IMAGE_WEBP_METHOD if webp_method is None else webp_method
+            frame.save(output, format=output_format, **options)
+            output.seek(0)
+        except Exception:
+            output.close()
+            raise
+    return output
+
+
+def _target_mode(img, output_format) -> str:
+    # JPEG не умеет прозрачность; для WEBP сохраняем альфа-канал, если он есть
+    if output_format == 'JPEG':
+        return 'RGB'
+    has_alpha = img.mode in ('RGBA', 'LA', 'PA') or (img.mode == 'P' and 'transparency' in img.info)
+    return 'RGBA' if has_alpha else 'RGB'
+
+
+# --- Пакетная оптимизация (manage.py optimize_images) ---
+
+def optimize_stored_image(name: str, output_format='WEBP', storage=None):
+    """
+    Оптимизирует файл из хранилища (по умолчанию default_storage) и сохраняет результат рядом.
+    Возвращает имя нового файла или None (ошибка залогирована). Выполняется в процессе пула.
+    """
+    storage = storage or default_storage
+    try:
+        with storage.open(name) as source:
+            output = encode_optimized(source, output_format)
+        try:
+            base = os.path.splitext(name)[0]
+            return storage.save(f"{base}.{output_format.lower()}", File(output))
+        finally:
+            output.close()
+    except Exception as e:
+        logger.error(f"Error optimizing image {name}: {e}")
+        return None
+
+
+def _limit_worker_memory():
+    """Потолок памяти процесса пула: картинка-бомба уронит свою задачу (MemoryError), а не сервер."""
+    limit_mb = settings.IMAGE_WORKER_MEMORY_LIMIT_MB
+    if not limit_mb:
+        return
+    try:
+        import resource
+
+        _, hard = resource.getrlimit(resource.RLIMIT_AS)
+        resource.setrlimit(resource.RLIMIT_AS, (limit_mb * 1024 * 1024, hard))
+    except (ImportError, ValueError, OSError) as e:
+        logger.warning(f"Image worker memory limit not applied: {e}")
+
+
+def optimize_stored_images(names, workers=None, output_format='WEBP', storage=None):
+    """
+    Оптимизирует файлы пулом процессов (по умолчанию IMAGE_BATCH_WORKERS, 0 — по числу ядер).
+    Генератор пар (исходное имя, новое имя или None) в порядке готовности.
+    С workers=1 работает в текущем процессе (без пула и потолка памяти).
+
+    Процесс пула, убитый картинкой (потолок памяти, OOM killer), ломает весь ProcessPoolExecutor:
+    поэтому в работе держим не больше workers файлов, а после падения прогоняем по одному только их
+    (виновник падает снова и помечается ошибкой) и продолжаем остальные в новом пуле.
+    """
+    workers = workers or settings.IMAGE_BATCH_WORKERS or os.cpu_count() or 1
+    if workers == 1:
+        for name in names:
+            yield name, optimize_stored_image(name, output_format, storage)
+        return
+
+    # Дочерние процессы получают копию процесса через fork: соединения с БД им не отдаем
+    # (внутри транзакции, например в тестах, соединение не трогаем — пул к БД не обращается)
+    for connection in connections.all():
+        if not connection.in_atomic_block:
+            connection.close()
+
+    pending = deque(names)
+    while pending:
+        suspects = []
+        with _image_pool(workers) as pool:
+            in_flight = {}
+            while (pending or in_flight) and not suspects:
+                try:
+                    while pending and len(in_flight) < workers:
+                        in_flight[pool.submit(optimize_stored_image, pending[0], output_format, storage)] = pending[0]
+                        pending.popleft()
+                except BrokenProcessPool:
+                    pass  # пул уже сломан: ошибку покажут futures в работе
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = in_flight.pop(future)
+                    try:
+                        yield name, future.result()
+                    except BrokenProcessPool:
+                        suspects.append(name)
+                    except Exception as e:
+                        logger.error(f"Image worker failed on {name}: {e}")
+                        yield name, None
+            suspects.extend(in_flight.values())
+        for name in suspects:
+            yield name, _optimize_isolated(name, output_format, storage)
+
+
+def _image_pool(workers):
+    return ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context('fork'), initializer=_limit_worker_memory,
+    )
+
+
+def _optimize_isolated(name, output_format, storage):
+    """Один файл в отдельном процессе: если процесс снова упадет, виновник найден."""
+    with _image_pool(1) as pool:
+        try:
+            return pool.submit(optimize_stored_image, name, output_format, storage).result()
+        except Exception as e:
+            logger.error(f"Image worker crashed on {name}: {e}")
+            return None
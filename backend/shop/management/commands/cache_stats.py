@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from shop.cache_backend import cache_metrics
+
+
+class Command(BaseCommand):
+    help = (
+        "Метрики кеша по префиксам ключей (из Redis, по всем процессам): попадания, промахи, "
+        "записи и трафик — чтобы видеть, какие кеши стоят памяти и пропускной способности Redis."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help="Обнулить счетчики после вывода")
+
+    def handle(self, *args, **options):
+        cache_metrics.flush()
+        try:
+            stats = cache_metrics.stats()
+        except Exception as e:
+            raise CommandError(f"Redis недоступен: {e}")
+
+        if not stats:
+            self.stdout.write("Метрик пока нет.")
+        for prefix, data in sorted(stats.items(), key=lambda item: -(item[1]['bytes_in'] + item[1]['bytes_out'])):
+            reads = data['hit'] + data['miss']
+            hit_rate = f"{data['hit'] / reads:.1%}" if reads else "-"
+            self.stdout.write(
+                f"{prefix}: попаданий {data['hit']}, промахов {data['miss']} ({hit_rate}), записей {data['set']}, "
+                f"прочитано {data['bytes_in'] / 1024:.1f} КБ, записано {data['bytes_out'] / 1024:.1f} КБ"
+            )
+
+        if options['reset']:
+            cache_metrics.reset_stats()
+            self.stdout.write(self.style.SUCCESS("Счетчики обнулены."))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from shop.services.cart_cleanup import CartCleanupService
+
+
+class Command(BaseCommand):
+    help = "Удаляет пустые и брошенные корзины пачками (то же, что периодическая задача Celery)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retention-days', type=int, help="Удалять корзины, не менявшиеся N дней (по умолчанию CART_RETENTION_DAYS)")
+        parser.add_argument('--empty-hours', type=int, help="Удалять пустые корзины старше N часов (по умолчанию CART_EMPTY_RETENTION_HOURS)")
+        parser.add_argument('--batch-size', type=int, help="Размер пачки удаления (по умолчанию CART_CLEANUP_BATCH_SIZE)")
+        parser.add_argument('--pause', type=float, help="Пауза между пачками в секундах (по умолчанию CART_CLEANUP_BATCH_PAUSE)")
+        parser.add_argument('--dry-run', action='store_true', help="Только посчитать, ничего не удалять")
+
+    def handle(self, *args, **options):
+        service = CartCleanupService(
+            retention_days=options['retention_days'],
+            empty_retention_hours=options['empty_hours'],
+            batch_size=options['batch_size'],
+            pause=options['pause'],
+        )
+        stats = service.run(dry_run=options['dry_run'])
+
+        prefix = "[DRY RUN] Будет удалено" if options['dry_run'] else "Удалено"
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}: пустых корзин {stats.empty_carts_deleted}, "
+            f"брошенных корзин {stats.stale_carts_deleted}, товаров в корзинах {stats.items_deleted} "
+            f"({stats.batches} пачек, {stats.duration_seconds} сек)"
+        ))
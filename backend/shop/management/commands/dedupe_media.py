@@ -0,0 +1,78 @@
+import time
+from collections import Counter, defaultdict
+
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+from shop.storage import content_addressed_fields, media_storage
+
+
+class Command(BaseCommand):
+    help = (
+        "Переносит медиа каталога, загруженные до хранилища по содержимому, в cas/ (жесткими ссылками, "
+        "без копирования; одинаковые файлы становятся одним блобом) и сверяет счетчики ссылок блобов "
+        "с базой: лишние ссылки снимаются, блобы без ссылок удаляются."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Только показать, что будет сделано")
+        parser.add_argument(
+            '--grace', type=int, default=3600,
+            help="Не трогать счетчики, менявшиеся за последние N секунд (загрузки, еще не сохраненные в базе)",
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+
+        # Старые имена -> [(модель, поле, pk записей)]
+        legacy = defaultdict(list)
+        references = Counter()
+        for model in apps.get_app_config('shop').get_models():
+            for field in content_addressed_fields(model):
+                pks_by_name = defaultdict(list)
+                rows = model.objects.exclude(**{field.name: ''}).exclude(**{f'{field.name}__isnull': True})
+                for pk, name in rows.values_list('pk', field.name).iterator():
+                    if media_storage.is_blob(name):
+                        references[name] += 1
+                    else:
+                        pks_by_name[name].append(pk)
+                for name, pks in pks_by_name.items():
+                    legacy[name].append((model, field, pks))
+
+        adopted = missing = 0
+        for name, usages in legacy.items():
+            if not media_storage.exists(name):
+                missing += 1
+                self.stderr.write(f"Файл не найден: {name}")
+                continue
+            adopted += 1
+            if dry_run:
+                continue
+            blob = media_storage.clone(name)
+            total = sum(len(pks) for _, _, pks in usages)
+            for _ in range(total - 1):
+                media_storage.clone(blob)
+            for model, field, pks in usages:
+                # update(), а не save(): django-cleanup не должен трогать файлы, ссылки уже посчитаны
+                model.objects.filter(pk__in=pks).update(**{field.name: blob})
+            media_storage.delete(name)  # старый путь; содержимое остается у блоба
+            references[blob] += total
+
+        fixed = removed = 0
+        cutoff = time.time() - options['grace']
+        for blob in media_storage.blobs():
+            expected = references.get(blob, 0)
+            if media_storage.references(blob) == expected or media_storage.references_updated_at(blob) > cutoff:
+                continue
+            if expected:
+                fixed += 1
+            else:
+                removed += 1
+            if not dry_run:
+                media_storage.set_references(blob, expected)
+
+        prefix = "[dry-run] " if dry_run else ""
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}Перенесено в cas/: {adopted} (не найдено: {missing}), "
+            f"исправлено счетчиков: {fixed}, удалено блобов без ссылок: {removed}"
+        ))
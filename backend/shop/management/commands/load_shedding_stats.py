@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from shop.services.load_shedding import load_monitor
+
+
+class Command(BaseCommand):
+    help = (
+        "Счетчики сброса нагрузки по всем воркерам (из Redis): обслужено/отброшено по классам "
+        "приоритета, запросы в работе и средние задержки каждого воркера — для настройки порогов."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help="Обнулить счетчики после вывода")
+
+    def handle(self, *args, **options):
+        try:
+            stats = load_monitor.stats()
+        except Exception as e:
+            raise CommandError(f"Redis недоступен: {e}")
+
+        self.stdout.write(f"В работе: {stats['inflight']} из {stats['capacity']}")
+        for name in ('critical', 'high', 'normal', 'low'):
+            served = stats['counters'].get(f'served:{name}', 0)
+            shed = stats['counters'].get(f'shed:{name}', 0)
+            total = served + shed
+            share = f"{shed / total:.1%}" if total else "-"
+            self.stdout.write(f"{name:>8}: обслужено {served}, отброшено {shed} ({share})")
+        for pid, data in sorted(stats['workers'].items()):
+            self.stdout.write(
+                f"воркер {pid}: очередь {data.get('queue_delay')} с, ответ {data.get('latency')} с"
+            )
+
+        if options['reset']:
+            load_monitor.reset_stats()
+            self.stdout.write(self.style.SUCCESS("Счетчики обнулены."))
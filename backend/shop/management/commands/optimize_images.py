@@ -0,0 +1,40 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+from shop.image_processing import OPTIMIZED_IMAGE_MODELS, optimize_stored_images
+from shop.storage import clone_file
+
+
+class Command(BaseCommand):
+    help = (
+        "Оптимизирует уже загруженные фото товаров и баннеры пулом процессов (по числу ядер): "
+        "уменьшение до IMAGE_MAX_WIDTH, поворот по EXIF, WebP без метаданных. "
+        "По умолчанию — только файлы, которые еще не WebP (например, если задача в Celery не прошла)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help="Перекодировать и файлы, уже сохраненные в WebP")
+        parser.add_argument('--workers', type=int, default=None, help="Процессов в пуле (по умолчанию IMAGE_BATCH_WORKERS)")
+
+    def handle(self, *args, **options):
+        optimized = failed = 0
+        for model_name in OPTIMIZED_IMAGE_MODELS:
+            model = apps.get_model('shop', model_name)
+            storage = model._meta.get_field('image').storage
+            pks_by_name = {}
+            for pk, name in model.objects.exclude(image='').values_list('pk', 'image').iterator():
+                if options['force'] or not name.lower().endswith('.webp'):
+                    pks_by_name.setdefault(name, []).append(pk)
+
+            for name, new_name in optimize_stored_images(list(pks_by_name), workers=options['workers'], storage=storage):
+                if new_name is None:
+                    failed += 1
+                    continue
+                for i, instance in enumerate(model.objects.filter(pk__in=pks_by_name[name])):
+                    # save(), а не update(): django-cleanup удалит исходный файл (в CAS — снимет ссылку).
+                    # Сохранение дало одну ссылку на новый файл, остальным записям — свою
+                    instance.image.name = new_name if i == 0 else clone_file(storage, new_name)
+                    instance.save(update_fields=['image'])
+                optimized += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Оптимизировано файлов: {optimized}, с ошибкой: {failed}"))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from shop.models import Article
+from shop.services.article_content import ArticleContentProcessor, content_hash
+
+
+class Command(BaseCommand):
+    help = (
+        "Обрабатывает содержимое статей (время чтения, анонс, оглавление, размеры и srcset картинок). "
+        "Обычно это происходит при сохранении; команда нужна для существующих статей и после смены "
+        "ARTICLE_IMAGE_WIDTHS."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help="Обработать заново даже неизмененные статьи")
+
+    def handle(self, *args, **options):
+        processor = ArticleContentProcessor()
+        processed = 0
+        for article in Article.objects.iterator(chunk_size=100):
+            if not options['force'] and article.content_hash == content_hash(article):
+                continue
+            processor.apply(article)
+            processed += 1
+        self.stdout.write(self.style.SUCCESS(f"Обработано статей: {processed}"))
@@ -0,0 +1,30 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from shop.services.sales_rollup import SalesRollupService
+
+
+class Command(BaseCommand):
+    help = "Пересобирает дневные роллапы продаж (дашборд админки) из заказов. Без параметров — за всю историю."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='date_from', help="Начальная дата (YYYY-MM-DD), включительно")
+        parser.add_argument('--to', dest='date_to', help="Конечная дата (YYYY-MM-DD), включительно")
+        parser.add_argument('--days', type=int, help="Пересобрать последние N дней (включая сегодня)")
+
+    def handle(self, *args, **options):
+        try:
+            date_from = date.fromisoformat(options['date_from']) if options['date_from'] else None
+            date_to = date.fromisoformat(options['date_to']) if options['date_to'] else None
+        except ValueError as e:
+            raise CommandError(f"Неверный формат даты: {e}")
+        if options['days']:
+            date_from = timezone.localdate() - timedelta(days=options['days'] - 1)
+
+        counts = SalesRollupService().rebuild(date_from=date_from, date_to=date_to)
+        self.stdout.write(self.style.SUCCESS(
+            f"Роллапы пересобраны: статусы {counts['status']}, товары {counts['product']}, "
+            f"категории {counts['category']}, скидки {counts['discount']} строк"
+        ))
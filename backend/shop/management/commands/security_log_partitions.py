@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from shop.services.security_log_retention import SecurityLogRetentionService
+
+
+class Command(BaseCommand):
+    help = (
+        "Обслуживание журнала атак (SecurityBlockLog): срок хранения и дневные секции Postgres "
+        "(то же, что периодическая задача Celery). С --convert однократно секционирует таблицу."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--convert', action='store_true', help="Превратить таблицу в секционированную по дням (только PostgreSQL, блокирует таблицу на время копирования)")
+        parser.add_argument('--retention-days', type=int, help="Хранить N дней (по умолчанию SECURITY_LOG_RETENTION_DAYS)")
+        parser.add_argument('--days-ahead', type=int, help="Создавать секции на N дней вперед (по умолчанию SECURITY_LOG_PARTITION_DAYS_AHEAD)")
+        parser.add_argument('--archive', action='store_true', default=None, help="Старые секции отсоединять (DETACH), а не удалять")
+
+    def handle(self, *args, **options):
+        service = SecurityLogRetentionService(
+            retention_days=options['retention_days'],
+            days_ahead=options['days_ahead'],
+            archive=options['archive'],
+        )
+        if options['convert']:
+            try:
+                service.convert_to_partitioned()
+            except RuntimeError as e:
+                raise CommandError(str(e))
+            self.stdout.write(self.style.SUCCESS("Таблица журнала секционирована по дням."))
+
+        stats = service.run()
+        mode = "секционирована" if stats.partitioned else "обычная таблица"
+        self.stdout.write(self.style.SUCCESS(
+            f"Журнал атак ({mode}): создано секций {stats.partitions_created}, "
+            f"удалено секций {stats.partitions_dropped}, в архиве {stats.partitions_archived}, "
+            f"удалено строк {stats.rows_deleted}"
+        ))
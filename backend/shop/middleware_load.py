@@ -0,0 +1,47 @@
+import time
+
+from django.conf import settings
+from django.http import JsonResponse
+
+from .services.load_shedding import load_monitor, route_priority
+
+
+class LoadSheddingMiddleware:
+    """
+    При перегрузке отвечает 503 на менее важные запросы, чтобы воркеры остались корзине и заказам.
+    Вход и выход учитываются вокруг всей цепочки, решение — после роутинга (process_view),
+    но до любой работы во view. Логика и пороги — в shop.services.load_shedding.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.LOAD_SHEDDING_ENABLED:
+            return self.get_response(request)
+
+        started = time.monotonic()
+        admission = request._load_admission = load_monitor.enter(request)
+        try:
+            return self.get_response(request)
+        finally:
+            load_monitor.exit(admission, time.monotonic() - started)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        admission = getattr(request, '_load_admission', None)
+        if admission is None:
+            return None
+
+        admission.priority = route_priority(request)
+        if not load_monitor.should_shed(admission):
+            return None
+
+        admission.shed = True
+        response = JsonResponse(
+            {'detail': "Сервер перегружен, повторите запрос позже."},
+            status=503,
+        )
+        response['Retry-After'] = str(settings.LOAD_SHEDDING_RETRY_AFTER)
+        # Штатный ответ, а не ошибка: django.request иначе пишет ERROR на каждый отброшенный запрос
+        response._has_been_logged = True
+        return response
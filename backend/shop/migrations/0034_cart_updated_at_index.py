@@ -0,0 +1,17 @@
+# Generated by Django 4.2.23 on 2026-10-19 17:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0033_shopsettings_auto_ban_enabled_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cart',
+            index=models.Index(fields=['updated_at', 'id'], name='cart_updated_at_idx'),
+        ),
+    ]
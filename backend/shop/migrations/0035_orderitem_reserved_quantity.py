@@ -0,0 +1,18 @@
+# Generated by Django 4.2.23 on 2026-10-19 17:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0034_cart_updated_at_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitem',
+            name='reserved_quantity',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Сколько штук списано со склада при оформлении. 0 — позиция оформлена под заказ (backorder/предзаказ). Возвращается на склад при отмене заказа.', verbose_name='Зарезервировано со склада'),
+        ),
+    ]
@@ -0,0 +1,96 @@
+# Generated by Django 4.2.23 on 2026-10-19 17:54
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0035_orderitem_reserved_quantity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SalesDailyCategory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='День')),
+                ('quantity', models.IntegerField(default=0, verbose_name='Продано, шт.')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Выручка')),
+            ],
+            options={
+                'verbose_name': 'Продажи: день × категория',
+                'verbose_name_plural': 'Продажи: день × категория',
+            },
+        ),
+        migrations.CreateModel(
+            name='SalesDailyDiscount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='День')),
+                ('rule_name', models.CharField(max_length=255, verbose_name='Правило скидки')),
+                ('orders_count', models.IntegerField(default=0, verbose_name='Заказов')),
+                ('discount_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Сумма скидок')),
+            ],
+            options={
+                'verbose_name': 'Продажи: день × скидка',
+                'verbose_name_plural': 'Продажи: день × скидка',
+            },
+        ),
+        migrations.CreateModel(
+            name='SalesDailyProduct',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='День')),
+                ('quantity', models.IntegerField(default=0, verbose_name='Продано, шт.')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Выручка')),
+            ],
+            options={
+                'verbose_name': 'Продажи: день × товар',
+                'verbose_name_plural': 'Продажи: день × товар',
+            },
+        ),
+        migrations.CreateModel(
+            name='SalesDailyStatus',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='День')),
+                ('status', models.CharField(choices=[('new', 'Новый'), ('processing', 'В обработке'), ('shipped', 'Отправлен'), ('completed', 'Выполнен'), ('canceled', 'Отменен')], max_length=20, verbose_name='Статус заказа')),
+                ('orders_count', models.IntegerField(default=0, verbose_name='Заказов')),
+                ('subtotal', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Сумма (без скидки)')),
+                ('discount_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Скидки')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Выручка')),
+            ],
+            options={
+                'verbose_name': 'Продажи: день × статус',
+                'verbose_name_plural': 'Продажи: день × статус',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='salesdailystatus',
+            constraint=models.UniqueConstraint(fields=('day', 'status'), name='sales_daily_status_uniq'),
+        ),
+        migrations.AddField(
+            model_name='salesdailyproduct',
+            name='product',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='shop.product', verbose_name='Товар'),
+        ),
+        migrations.AddConstraint(
+            model_name='salesdailydiscount',
+            constraint=models.UniqueConstraint(fields=('day', 'rule_name'), name='sales_daily_discount_uniq'),
+        ),
+        migrations.AddField(
+            model_name='salesdailycategory',
+            name='category',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='shop.category', verbose_name='Категория'),
+        ),
+        migrations.AddConstraint(
+            model_name='salesdailyproduct',
+            constraint=models.UniqueConstraint(fields=('day', 'product'), name='sales_daily_product_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='salesdailycategory',
+            constraint=models.UniqueConstraint(fields=('day', 'category'), name='sales_daily_category_uniq'),
+        ),
+    ]
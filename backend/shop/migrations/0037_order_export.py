@@ -0,0 +1,34 @@
+# Generated by Django 4.2.23 on 2026-10-19 17:56
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('shop', '0036_sales_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderExport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата запроса')),
+                ('status', models.CharField(choices=[('pending', 'В очереди'), ('processing', 'Формируется...'), ('success', 'Готово'), ('failed', 'Ошибка')], default='pending', max_length=20, verbose_name='Статус')),
+                ('file', models.FileField(blank=True, null=True, upload_to='exports/orders/', verbose_name='Файл (.csv.gz)')),
+                ('orders_count', models.PositiveIntegerField(default=0, verbose_name='Заказов')),
+                ('rows_count', models.PositiveIntegerField(default=0, verbose_name='Строк')),
+                ('log', models.TextField(blank=True, verbose_name='Лог операций')),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL, verbose_name='Кто запросил')),
+            ],
+            options={
+                'verbose_name': 'Экспорт заказов',
+                'verbose_name_plural': 'Экспорты заказов',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.23 on 2026-10-19 18:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0037_order_export'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='blacklisteditem',
+            name='value',
+            field=models.CharField(help_text='IP адрес, подсеть (CIDR, например 203.0.113.0/24) или Telegram ID', max_length=255, verbose_name='Значение'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.23 on 2026-10-19 18:05
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0038_blacklist_cidr_help_text'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='securityblocklog',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Дата инцидента'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.23 on 2026-10-19 18:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0039_security_log_incident_time'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='securityblocklog',
+            index=models.Index(fields=['-created_at'], name='secblocklog_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='securityblocklog',
+            index=models.Index(fields=['ip_address', '-created_at'], name='secblocklog_ip_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='securityblocklog',
+            index=models.Index(fields=['telegram_id', '-created_at'], name='secblocklog_tg_created_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.23 on 2026-10-19 18:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0040_security_log_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='article',
+            name='unique_views_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Уникальных читателей (≈)'),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 4.2.23 on 2026-10-19 18:19
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+from django.db.models import F, Func, Value
+
+
+def fill_search_vectors(apps, schema_editor):
+    """Векторы для уже существующих статей и FAQ (дальше их обновляет post_save)."""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    def plain_text(field):
+        return Func(F(field), Value('<[^>]+>|&[a-zA-Z0-9#]+;'), Value(' '), Value('g'), function='regexp_replace')
+
+    apps.get_model('shop', 'Article').objects.update(search_vector=(
+        SearchVector('title', weight='A', config='russian')
+        + SearchVector('meta_description', weight='B', config='russian')
+        + SearchVector(plain_text('content'), weight='C', config='russian')
+    ))
+    apps.get_model('shop', 'FaqItem').objects.update(search_vector=(
+        SearchVector('question', weight='A', config='russian')
+        + SearchVector(plain_text('answer'), weight='B', config='russian')
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0042_article_content_pipeline'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='article',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='faqitem',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='article',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='article_search_vector_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='faqitem',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='faq_search_vector_idx'),
+        ),
+        migrations.RunPython(fill_search_vectors, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 4.2.23 on 2026-10-19 18:36
+
+from django.db import migrations, models
+import shop.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0043_content_search_vectors'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='product',
+            name='audio_sample',
+            field=models.FileField(blank=True, null=True, storage=shop.storage.ContentAddressedStorage(), upload_to='products/audio/', verbose_name='Пример аудио (MP3, WAV)'),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='main_image',
+            field=models.ImageField(storage=shop.storage.ContentAddressedStorage(), upload_to='products/main/original/', verbose_name='Главное фото (оригинал)'),
+        ),
+        migrations.AlterField(
+            model_name='productimage',
+            name='image',
+            field=models.ImageField(storage=shop.storage.ContentAddressedStorage(), upload_to='products/additional/original/', verbose_name='Фото (оригинал)'),
+        ),
+        migrations.AlterField(
+            model_name='productinfocard',
+            name='image',
+            field=models.ImageField(storage=shop.storage.ContentAddressedStorage(), upload_to='products/info_cards/original/', verbose_name='Фото для карточки (оригинал)'),
+        ),
+        migrations.AlterField(
+            model_name='promobanner',
+            name='image',
+            field=models.ImageField(storage=shop.storage.ContentAddressedStorage(), upload_to='banners/original/', verbose_name='Изображение (оригинал)'),
+        ),
+        migrations.AlterField(
+            model_name='shopimage',
+            name='image',
+            field=models.ImageField(storage=shop.storage.ContentAddressedStorage(), upload_to='shop_images/original/', verbose_name='Изображение (оригинал)'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.23 on 2026-10-19 18:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0044_content_addressed_media'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderexport',
+            name='criteria',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='Критерии выборки'),
+        ),
+    ]
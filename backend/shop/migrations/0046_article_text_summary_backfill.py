@@ -0,0 +1,29 @@
+from django.db import migrations
+
+
+def fill_text_summary(apps, schema_editor):
+    """
+    Время чтения, число слов и анонс для статей, созданных до 0042 (иначе до запуска
+    process_article_content везде 0 и пустой анонс). Картинки и оглавление (ему нужны id
+    у заголовков в rendered_content) доделает process_article_content или первое сохранение.
+    """
+    from shop.services.article_content import summarize_text
+
+    Article = apps.get_model('shop', 'Article')
+    articles = Article.objects.filter(content_type='INTERNAL', word_count=0).exclude(content='')
+    for article in articles.only('pk', 'content').iterator(chunk_size=100):
+        summary = summarize_text(article.content)
+        Article.objects.filter(pk=article.pk).update(
+            word_count=summary.word_count, reading_time=summary.reading_time, excerpt=summary.excerpt,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0045_orderexport_criteria'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_text_summary, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,10 @@
 # backend/shop/models.py
+import ipaddress
 import os
+from django.core.exceptions import ValidationError
 from django.db import models
 from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.utils import timezone
 from tinymce.models import HTMLField
 from django.db.models import Case, When, F, DecimalField
@@ -10,8 +13,7 @@ from imagekit.processors import ResizeToFit
 from colorfield.fields import ColorField
 from django.contrib.auth.models import User
 from pytils.translit import slugify
-from django.utils.html import strip_tags
-import math # Импортируем math для округления
+from .storage import media_storage
 
 # --- Модель InfoPanel (без изменений) ---
 class InfoPanel(models.Model):
@@ -282,12 +284,12 @@ class Product(models.Model):
     info_panels = models.ManyToManyField(InfoPanel, blank=True, verbose_name="Информационные панельки")
     is_active = models.BooleanField("Активен", default=True)
     created_at = models.DateTimeField("Дата создания", auto_now_add=True)
-    main_image = models.ImageField("Главное фото (оригинал)", upload_to='products/main/original/')
+    main_image = models.ImageField("Главное фото (оригинал)", upload_to='products/main/original/', storage=media_storage)
     main_image_thumbnail = ImageSpecField(source='main_image',
                                           processors=[ResizeToFit(width=600)],
                                           format='WEBP',
                                           options={'quality': 85})
-    audio_sample = models.FileField("Пример аудио (MP3, WAV)", upload_to='products/audio/', null=True, blank=True)
+    audio_sample = models.FileField("Пример аудио (MP3, WAV)", upload_to='products/audio/', storage=media_storage, null=True, blank=True)
 
     related_products = models.ManyToManyField('self', blank=True, symmetrical=False, verbose_name="Сопутствующие товары")
     color_group = models.ForeignKey(ColorGroup, on_delete=models.SET_NULL, related_name='products', null=True, blank=True, verbose_name="Группа цветов")
@@ -404,7 +406,7 @@ class Product(models.Model):
 # --- Модель ProductImage (без изменений) ---
 class ProductImage(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='images', verbose_name="Товар")
-    image = models.ImageField("Фото (оригинал)", upload_to='products/additional/original/')
+    image = models.ImageField("Фото (оригинал)", upload_to='products/additional/original/', storage=media_storage)
     image_thumbnail = ImageSpecField(source='image',
                                      processors=[ResizeToFit(width=800, height=800)],
                                      format='WEBP',
@@ -420,7 +422,7 @@ class ProductImage(models.Model):
 # --- Модель PromoBanner (без изменений) ---
 class PromoBanner(models.Model):
     title = models.CharField("Название (для админа)", max_length=100)
-    image = models.ImageField("Изображение (оригинал)", upload_to='banners/original/')
+    image = models.ImageField("Изображение (оригинал)", upload_to='banners/original/', storage=media_storage)
     image_thumbnail = ImageSpecField(source='image',
                                      processors=[ResizeToFit(width=280)],
                                      format='WEBP',
@@ -444,7 +446,7 @@ class PromoBanner(models.Model):
 class ProductInfoCard(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='info_cards', verbose_name="Товар")
     title = models.CharField("Заголовок (под фото)", max_length=100)
-    image = models.ImageField("Фото для карточки (оригинал)", upload_to='products/info_cards/original/')
+    image = models.ImageField("Фото для карточки (оригинал)", upload_to='products/info_cards/original/', storage=media_storage)
     image_thumbnail = ImageSpecField(source='image',
                                      processors=[ResizeToFit(width=240)],
                                      format='WEBP',
@@ -581,6 +583,8 @@ class FaqItem(models.Model):
     answer = HTMLField("Ответ")
     order = models.PositiveIntegerField("Порядок сортировки", default=0, help_text="Чем меньше число, тем выше будет вопрос")
     is_active = models.BooleanField("Активен", default=True)
+    # tsvector (russian) по вопросу и ответу, обновляется при сохранении (shop.services.content_search)
+    search_vector = SearchVectorField(null=True, editable=False)
 
     def __str__(self):
         return self.question
@@ -589,11 +593,14 @@ class FaqItem(models.Model):
         verbose_name = "Вопрос-Ответ (FAQ)"
         verbose_name_plural = "Вопросы-Ответы (FAQ)"
         ordering = ['order']
+        indexes = [
+            GinIndex(fields=['search_vector'], name='faq_search_vector_idx'),
+        ]
 
 # --- Модель ShopImage (без изменений) ---
 class ShopImage(models.Model):
     settings = models.ForeignKey(ShopSettings, on_delete=models.CASCADE, related_name='images')
-    image = models.ImageField("Изображение (оригинал)", upload_to='shop_images/original/')
+    image = models.ImageField("Изображение (оригинал)", upload_to='shop_images/original/', storage=media_storage)
     image_thumbnail = ImageSpecField(source='image',
                                      processors=[ResizeToFit(width=800)],
                                      format='WEBP',
@@ -621,9 +628,44 @@ class Cart(models.Model):
     def __str__(self):
         return f"Корзина пользователя {self.telegram_id}"
 
+    def touch(self):
+        """
+        Отмечает корзину как активную.
+        auto_now срабатывает только на save() самой корзины, а изменения CartItem
+        его не трогают — без этого живые корзины выглядели бы "брошенными" для очистки.
+        """
+        self.updated_at = timezone.now()
+        Cart.objects.filter(pk=self.pk).update(updated_at=self.updated_at)
+
+    @classmethod
+    def upsert_for(cls, telegram_id=None, session_key=None):
+        """
+        Возвращает корзину пользователя, создавая её одним INSERT ... ON CONFLICT DO UPDATE.
+        В отличие от get_or_create не упирается в IntegrityError, когда два параллельных
+        запроса одного пользователя создают корзину одновременно, и сразу обновляет updated_at.
+        """
+        if telegram_id is not None:
+            lookup = {'telegram_id': telegram_id}
+        elif session_key:
+            lookup = {'session_key': session_key}
+        else:
+            return None
+
+        cls.objects.bulk_create(
+            [cls(**lookup)],
+            update_conflicts=True,
+            unique_fields=list(lookup),
+            update_fields=['updated_at'],
+        )
+        return cls.objects.get(**lookup)
+
     class Meta:
         verbose_name = "Корзина пользователя"
         verbose_name_plural = "Корзины пользователей"
+        indexes = [
+            # Индекс для пакетной очистки брошенных корзин (см. CartCleanupService)
+            models.Index(fields=['updated_at', 'id'], name='cart_updated_at_idx'),
+        ]
 
 class CartItem(models.Model):
     """Модель товара в корзине."""
@@ -705,6 +747,12 @@ class OrderItem(models.Model):
     product = models.ForeignKey(Product, on_delete=models.PROTECT, verbose_name="Товар")
     quantity = models.PositiveIntegerField("Количество", default=1)
     price_at_purchase = models.DecimalField("Цена на момент покупки", max_digits=10, decimal_places=2)
+    reserved_quantity = models.PositiveIntegerField(
+        "Зарезервировано со склада",
+        default=0,
+        editable=False,
+        help_text="Сколько штук списано со склада при оформлении. 0 — позиция оформлена под заказ (backorder/предзаказ). Возвращается на склад при отмене заказа."
+    )
 
     def __str__(self):
         return f"{self.product.name} (x{self.quantity})"
@@ -714,6 +762,65 @@ class OrderItem(models.Model):
         verbose_name_plural = "Товары в заказе"
 
 
+# --- АНАЛИТИКА ПРОДАЖ (РОЛЛАПЫ) ---
+# Предагрегированные по дням таблицы для дашборда админки. Обновляются инкрементально
+# (SalesRollupService из сигналов заказа) и пересобираются командой rebuild_sales_rollups.
+# Позиционная аналитика (товары, категории, скидки) учитывает только неотмененные заказы.
+
+class SalesDailyStatus(models.Model):
+    """Продажи за день в разрезе статуса заказа."""
+    day = models.DateField("День")
+    status = models.CharField("Статус заказа", max_length=20, choices=Order.OrderStatus.choices)
+    orders_count = models.IntegerField("Заказов", default=0)
+    subtotal = models.DecimalField("Сумма (без скидки)", max_digits=14, decimal_places=2, default=0)
+    discount_amount = models.DecimalField("Скидки", max_digits=14, decimal_places=2, default=0)
+    revenue = models.DecimalField("Выручка", max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name = "Продажи: день × статус"
+        verbose_name_plural = "Продажи: день × статус"
+        constraints = [models.UniqueConstraint(fields=['day', 'status'], name='sales_daily_status_uniq')]
+
+
+class SalesDailyProduct(models.Model):
+    """Продажи за день в разрезе товара (по цене позиции, до скидки на заказ)."""
+    day = models.DateField("День")
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+', verbose_name="Товар")
+    quantity = models.IntegerField("Продано, шт.", default=0)
+    revenue = models.DecimalField("Выручка", max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name = "Продажи: день × товар"
+        verbose_name_plural = "Продажи: день × товар"
+        constraints = [models.UniqueConstraint(fields=['day', 'product'], name='sales_daily_product_uniq')]
+
+
+class SalesDailyCategory(models.Model):
+    """Продажи за день в разрезе категории товара (прямой, без родителей)."""
+    day = models.DateField("День")
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='+', verbose_name="Категория")
+    quantity = models.IntegerField("Продано, шт.", default=0)
+    revenue = models.DecimalField("Выручка", max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name = "Продажи: день × категория"
+        verbose_name_plural = "Продажи: день × категория"
+        constraints = [models.UniqueConstraint(fields=['day', 'category'], name='sales_daily_category_uniq')]
+
+
+class SalesDailyDiscount(models.Model):
+    """Расходы на скидки за день в разрезе примененного правила (Order.applied_rule)."""
+    day = models.DateField("День")
+    rule_name = models.CharField("Правило скидки", max_length=255)
+    orders_count = models.IntegerField("Заказов", default=0)
+    discount_amount = models.DecimalField("Сумма скидок", max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name = "Продажи: день × скидка"
+        verbose_name_plural = "Продажи: день × скидка"
+        constraints = [models.UniqueConstraint(fields=['day', 'rule_name'], name='sales_daily_discount_uniq')]
+
+
 class ArticleCategory(models.Model):
     """Категории для статей (например, Обзоры, Новости)."""
     name = models.CharField("Название категории", max_length=100, unique=True)
@@ -779,18 +886,20 @@ class Article(models.Model):
     meta_title = models.CharField("Meta Title (для SEO)", max_length=60, blank=True, help_text="Заголовок для вкладки браузера и поисковиков (до 60 символов). Если пусто, используется основной заголовок.")
     meta_description = models.TextField("Meta Description (для SEO)", max_length=160, blank=True, help_text="Краткое описание для Google и Яндекс (до 160 символов). Очень важно для привлечения пользователей.")
     views_count = models.PositiveIntegerField("Количество просмотров", default=0, editable=False) # editable=False, чтобы его нельзя было изменить вручную в админке
+    # Приблизительно (HyperLogLog в Redis), обновляется вместе с views_count задачей flush_article_views_task
+    unique_views_count = models.PositiveIntegerField("Уникальных читателей (≈)", default=0, editable=False)
+
+    # --- Результат обработки content при сохранении (shop.services.article_content) ---
+    # API отдает готовые значения, HTML при чтении не разбирается
+    rendered_content = models.TextField("Обработанное содержимое", blank=True, editable=False, help_text="content с id у заголовков и размерами/srcset у картинок")
+    word_count = models.PositiveIntegerField("Слов", default=0, editable=False)
+    reading_time = models.PositiveSmallIntegerField("Время чтения (мин)", default=0, editable=False)
+    excerpt = models.TextField("Анонс", blank=True, editable=False)
+    toc = models.JSONField("Оглавление", default=list, blank=True, editable=False)
+    content_hash = models.CharField(max_length=64, blank=True, editable=False)
+    # tsvector (russian) по заголовку, описанию и тексту, обновляется при сохранении (shop.services.content_search)
+    search_vector = SearchVectorField(null=True, editable=False)
 
-    @property
-    def reading_time(self):
-        """Вычисляет примерное время на чтение статьи в минутах."""
-        if self.content_type == self.ContentType.INTERNAL and self.content:
-            # Очищаем HTML-теги, чтобы посчитать только слова
-            plain_text = strip_tags(self.content)
-            word_count = len(plain_text.split())
-            # Средняя скорость чтения взрослого человека ~200 слов в минуту
-            time_in_minutes = math.ceil(word_count / 200)
-            return time_in_minutes
-        return 0 # Для внешних ссылок или пустых статей время чтения 0
 
     def __str__(self):
         return self.title
@@ -805,6 +914,9 @@ class Article(models.Model):
         verbose_name = "Статья"
         verbose_name_plural = "Статьи"
         ordering = ['-published_at']
+        indexes = [
+            GinIndex(fields=['search_vector'], name='article_search_vector_idx'),
+        ]
 
 
 # --- НОВАЯ МОДЕЛЬ ДЛЯ БЭКАПОВ ---
@@ -856,6 +968,35 @@ class Backup(models.Model):
         verbose_name_plural = "Резервные копии"
         ordering = ['-created_at']
 
+# --- ФОНОВЫЙ ЭКСПОРТ ЗАКАЗОВ ---
+class OrderExport(models.Model):
+    """Файл экспорта заказов (CSV.gz), который собирается Celery-задачей для больших выборок."""
+    STATUS_CHOICES = (
+        ('pending', 'В очереди'),
+        ('processing', 'Формируется...'),
+        ('success', 'Готово'),
+        ('failed', 'Ошибка'),
+    )
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, verbose_name="Кто запросил")
+    created_at = models.DateTimeField("Дата запроса", auto_now_add=True)
+    status = models.CharField("Статус", max_length=20, choices=STATUS_CHOICES, default='pending')
+    # Хранится в media под случайным именем; скачивать через админку (только для персонала)
+    file = models.FileField("Файл (.csv.gz)", upload_to='exports/orders/', null=True, blank=True)
+    orders_count = models.PositiveIntegerField("Заказов", default=0)
+    rows_count = models.PositiveIntegerField("Строк", default=0)
+    # Что выгружать: query string списка заказов в админке (фильтры, поиск) и, если отмечены
+    # отдельные заказы на странице, их id. Выборку заново собирает задача
+    criteria = models.JSONField("Критерии выборки", default=dict, blank=True, editable=False)
+    log = models.TextField("Лог операций", blank=True)
+
+    def __str__(self):
+        return f"Экспорт заказов от {self.created_at:%Y-%m-%d %H:%M}" if self.created_at else "Экспорт заказов"
+
+    class Meta:
+        verbose_name = "Экспорт заказов"
+        verbose_name_plural = "Экспорты заказов"
+        ordering = ['-created_at']
+
 # --- SECURITY MODELS ---
 # from django.db import models # Already imported at top
 
@@ -865,7 +1006,7 @@ class BlacklistedItem(models.Model):
         TELEGRAM_ID = 'TG', 'Telegram ID'
 
     item_type = models.CharField("Тип блокировки", max_length=2, choices=ItemType.choices, default=ItemType.IP)
-    value = models.CharField("Значение", max_length=255, help_text="IP адрес или Telegram ID")
+    value = models.CharField("Значение", max_length=255, help_text="IP адрес, подсеть (CIDR, например 203.0.113.0/24) или Telegram ID")
     reason = models.TextField("Причина блокировки", blank=True)
     created_at = models.DateTimeField("Дата блокировки", auto_now_add=True)
     is_active = models.BooleanField("Активна", default=True)
@@ -878,17 +1019,33 @@ class BlacklistedItem(models.Model):
     def __str__(self):
         return f"[{self.get_item_type_display()}] {self.value}"
 
+    def clean(self):
+        self.value = self.value.strip()
+        if self.item_type == self.ItemType.IP:
+            try:
+                ipaddress.ip_network(self.value, strict=False)
+            except ValueError:
+                raise ValidationError({'value': "Укажите IP адрес или подсеть в формате CIDR (например 203.0.113.0/24)."})
+
 class SecurityBlockLog(models.Model):
     ip_address = models.GenericIPAddressField("IP адрес")
     telegram_id = models.CharField("Telegram ID", max_length=100, null=True, blank=True)
     request_path = models.CharField("Путь запроса", max_length=255)
     limit_type = models.CharField("Сработал лимит", max_length=50, help_text="Какой throttle class сработал")
-    created_at = models.DateTimeField("Дата инцидента", auto_now_add=True)
+    # Не auto_now_add: строки пишутся пачками из буфера Redis и хранят время самого инцидента
+    created_at = models.DateTimeField("Дата инцидента", default=timezone.now)
 
     class Meta:
         verbose_name = "🛡 Журнал атак (429)"
         verbose_name_plural = "🛡 Журнал атак (429)"
         ordering = ['-created_at']
+        indexes = [
+            # Список в админке (ORDER BY created_at DESC) и отбор по периоду
+            models.Index(fields=['-created_at'], name='secblocklog_created_idx'),
+            # Подсчет нарушений субъекта за период (авто-бан, поиск в админке)
+            models.Index(fields=['ip_address', '-created_at'], name='secblocklog_ip_created_idx'),
+            models.Index(fields=['telegram_id', '-created_at'], name='secblocklog_tg_created_idx'),
+        ]
 
     def __str__(self):
         return f"{self.ip_address} -> {self.request_path} ({self.created_at})"
@@ -0,0 +1,28 @@
+"""
+Общий клиент Redis для счетчиков, лимитеров и очередей, которым мало API Django-кеша
+(Lua-скрипты, списки, атомарные INCR с TTL).
+
+Все вызывающие должны переживать недоступность Redis (fail-open): короткие таймауты
+ниже не дают запросу повиснуть, если Redis лежит.
+"""
+import logging
+
+import redis
+from django.conf import settings
+
+logger = logging.getLogger('shop')
+
+_client = None
+
+
+def get_redis() -> redis.Redis:
+    """Ленивый клиент на процесс (у redis-py внутри пул соединений, потокобезопасен)."""
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(
+            settings.REDIS_URL,
+            socket_connect_timeout=settings.REDIS_SOCKET_TIMEOUT,
+            socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+            health_check_interval=30,
+        )
+    return _client
@@ -1,4 +1,5 @@
 # backend/shop/serializers.py
+from collections import defaultdict
 from rest_framework import serializers
 from django.contrib.auth.models import User
 from .models import (
@@ -9,6 +10,8 @@ from .models import (
     Feature, CharacteristicSection, Characteristic,
     ProductCharacteristic, Cart, CartItem, Order, OrderItem, Article, ArticleCategory
 )
+from .services.cart_mutations import CartOperation
+from .services.stock import StockReservationService, InsufficientStockError
 
 
 # --- 1. НОВЫЙ БАЗОВЫЙ КЛАСС ДЛЯ РЕФАКТОРИНГА ---
@@ -399,6 +402,34 @@ class DetailedCartItemSerializer(serializers.Serializer):
     discounted_price = serializers.DecimalField(max_digits=10, decimal_places=2, required=False, allow_null=True)
 
 
+class CartOperationSerializer(serializers.Serializer):
+    """Одна операция пакетного изменения корзины (PATCH /api/cart/)."""
+    op = serializers.ChoiceField(choices=CartOperation.CHOICES)
+    product_id = serializers.IntegerField(min_value=1)
+    # Для 'increment' допускается отрицательное значение (уменьшение), для 'remove' игнорируется
+    quantity = serializers.IntegerField(required=False, default=1)
+
+    def validate(self, attrs):
+        if attrs['op'] == CartOperation.SET and attrs['quantity'] < 0:
+            raise serializers.ValidationError({'quantity': "Количество не может быть отрицательным."})
+        return attrs
+
+
+class CartBatchSerializer(serializers.Serializer):
+    """Пакет операций над корзиной, применяется целиком в одной транзакции."""
+    MAX_OPERATIONS = 100
+
+    operations = CartOperationSerializer(many=True, allow_empty=False)
+
+    def validate_operations(self, value):
+        if len(value) > self.MAX_OPERATIONS:
+            raise serializers.ValidationError(f"Не более {self.MAX_OPERATIONS} операций за один запрос.")
+        return value
+
+    def to_operations(self):
+        return [CartOperation(**operation) for operation in self.validated_data['operations']]
+
+
 class OrderItemSerializer(serializers.ModelSerializer):
     """Сериализатор для товаров ВНУТРИ заказа."""
     product_id = serializers.IntegerField()
@@ -454,20 +485,34 @@ class OrderCreateSerializer(serializers.ModelSerializer):
         )
         # -----------------------
 
-        for item_data in items_data:
-            product_info = next(
-                (item for item in calculation_results['items'] if item['product'].id == item_data['product_id']),
-                None
-            )
-            if not product_info:
-                continue
+        # Индекс рассчитанных позиций по товару: сопоставление строк заказа за O(n), а не next() по списку
+        priced_items = {item['product'].id: item for item in calculation_results['items']}
+        lines = [
+            (item_data, priced_items[item_data['product_id']])
+            for item_data in items_data
+            if item_data['product_id'] in priced_items
+        ]
 
-            OrderItem.objects.create(
+        # Резервируем остатки всех позиций одним условным UPDATE (в транзакции заказа).
+        # Если хоть одной позиции не хватает — исключение откатывает весь заказ.
+        requested = defaultdict(int)
+        for item_data, _ in lines:
+            requested[item_data['product_id']] += item_data['quantity']
+        reservation = StockReservationService().reserve(requested)
+        if not reservation.ok:
+            raise InsufficientStockError(reservation.failed)
+
+        # Все позиции — одним INSERT, независимо от размера заказа
+        OrderItem.objects.bulk_create([
+            OrderItem(
                 order=order,
                 product_id=item_data['product_id'],
                 quantity=item_data['quantity'],
-                price_at_purchase=product_info['discounted_price'] if product_info['discounted_price'] is not None else product_info['original_price']
+                price_at_purchase=product_info['discounted_price'] if product_info['discounted_price'] is not None else product_info['original_price'],
+                reserved_quantity=item_data['quantity'] if reservation.reserved.get(item_data['product_id']) else 0
             )
+            for item_data, product_info in lines
+        ])
 
         return order
 
@@ -496,7 +541,7 @@ class ArticleListSerializer(ImageUrlBuilderSerializer):
 
     class Meta:
         model = Article
-        fields = ('title', 'slug', 'published_at', 'category', 'cover_image_url', 'is_featured')
+        fields = ('title', 'slug', 'published_at', 'category', 'cover_image_url', 'is_featured', 'excerpt', 'reading_time')
 
     def get_cover_image_url(self, obj):
         return self._get_absolute_url(obj.cover_image_list_thumbnail)
@@ -509,8 +554,9 @@ class ArticleDetailSerializer(ImageUrlBuilderSerializer):
     cover_image_url = serializers.SerializerMethodField()
     og_image_url = serializers.SerializerMethodField()
 
-    # 1. ИЗМЕНЕНИЕ: Добавляем поле для времени чтения
-    reading_time = serializers.IntegerField(read_only=True)
+    # Тело статьи — уже обработанное при сохранении (id у заголовков, размеры и srcset у картинок);
+    # пока фоновая обработка большой статьи не закончилась, отдаем исходное
+    content = serializers.SerializerMethodField()
 
     class Meta:
         model = Article
@@ -520,9 +566,13 @@ class ArticleDetailSerializer(ImageUrlBuilderSerializer):
             'related_products', 'meta_description',
             'og_image_url', 'canonical_url',
             'views_count',      # <-- 2. ИЗМЕНЕНИЕ: Добавляем счётчик просмотров
-            'reading_time'      # <-- 2. ИЗМЕНЕНИЕ: Добавляем время чтения
+            'reading_time',     # <-- 2. ИЗМЕНЕНИЕ: Добавляем время чтения
+            'excerpt', 'toc',
         )
 
+    def get_content(self, obj):
+        return obj.rendered_content or obj.content
+
     def get_cover_image_url(self, obj):
         return self._get_absolute_url(obj.cover_image_detail_thumbnail)
 
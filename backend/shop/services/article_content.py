@@ -0,0 +1,322 @@
+import hashlib
+import logging
+import math
+import os
+import re
+from dataclasses import dataclass, field
+from html import escape, unescape
+from html.parser import HTMLParser
+from io import BytesIO
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image
+from pytils.translit import slugify
+
+from shop.services.editor_images import editor_image_service
+
+logger = logging.getLogger('shop')
+
+HEADING_TAGS = {'h2', 'h3'}
+SKIP_TEXT_TAGS = {'script', 'style'}
+# На границах блоков в тексте нужен пробел, иначе "<p>раз</p><p>два</p>" станет одним словом
+BLOCK_TAGS = {
+    'p', 'div', 'br', 'hr', 'li', 'ul', 'ol', 'blockquote', 'pre', 'table', 'tr', 'td', 'th',
+    'figure', 'figcaption', 'section', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6',
+}
+
+
+def content_hash(article) -> str:
+    """Отпечаток того, от чего зависит результат обработки (меняется — обрабатываем заново)."""
+    source = f"{article.content_type}\0{article.content or ''}\0{','.join(map(str, settings.ARTICLE_IMAGE_WIDTHS))}"
+    return hashlib.sha256(source.encode()).hexdigest()
+
+
+@dataclass
+class ProcessedContent:
+    html: str = ''
+    word_count: int = 0
+    reading_time: int = 0
+    excerpt: str = ''
+    toc: List[Dict[str, object]] = field(default_factory=list)
+
+    def as_fields(self) -> Dict[str, object]:
+        return {
+            'rendered_content': self.html,
+            'word_count': self.word_count,
+            'reading_time': self.reading_time,
+            'excerpt': self.excerpt,
+            'toc': self.toc,
+        }
+
+
+class ContentImageResizer:
+    """
+    Размеры и уменьшенные копии картинок из тела статьи (загруженных через TinyMCE в media).
+    Копии кладутся рядом с оригиналом: <имя>_<ширина>w.webp; существующие не пересоздаются.
+    """
+
+    def __init__(self, widths=None, storage=None):
+        self.widths = sorted(widths if widths is not None else settings.ARTICLE_IMAGE_WIDTHS)
+        self.storage = storage or default_storage
+        self.media_path = urlparse(settings.MEDIA_URL).path
+
+    def storage_name(self, src: str) -> Optional[str]:
+        """Имя файла в хранилище, если src указывает на наш media; чужие картинки не трогаем."""
+        path = urlparse(src).path
+        if not path.startswith(self.media_path):
+            return None
+        return path[len(self.media_path):] or None
+
+    def describe(self, name: str) -> Optional[Tuple[int, int, List[Tuple[str, int]]]]:
+        """(ширина, высота, [(имя копии, ширина копии), ...]) или None, если файл не читается."""
+        try:
+            with self.storage.open(name) as f, Image.open(f) as img:
+                width, height = img.size
+                variants = []
+                for target in self.widths:
+                    if target >= width:
+                        break
+                    variant = self.variant_name(name, target)
+                    if not self.storage.exists(variant):
+                        self._save_variant(img, variant, target)
+                    variants.append((variant, target))
+        except Exception as e:
+            logger.warning(f"Article content image {name} skipped: {e}")
+            return None
+        return width, height, variants
+
+    @staticmethod
+    def variant_name(name: str, width: int) -> str:
+        base, _ = os.path.splitext(name)
+        return f"{base}_{width}w.webp"
+
+    def _save_variant(self, img, variant: str, width: int):
+        height = round(img.height * width / img.width)
+        resized = img.convert('RGBA' if img.mode in ('RGBA', 'LA', 'P') else 'RGB').resize(
+            (width, height), Image.Resampling.LANCZOS
+        )
+        output = BytesIO()
+        resized.save(output, format='WEBP', quality=80)
+        self.storage.save(variant, ContentFile(output.getvalue()))
+
+
+class _ContentRewriter(HTMLParser):
+    """
+    Один проход по HTML: собирает текст (для слов и анонса), оглавление по h2/h3
+    и переписывает <img> и заголовки. Остальная разметка выводится как была.
+    """
+
+    def __init__(self, resizer: Optional[ContentImageResizer]):
+        super().__init__(convert_charrefs=False)
+        self.resizer = resizer
+        self.out: List[str] = []
+        self.text: List[str] = []
+        self.toc: List[Dict[str, object]] = []
+        self._skip_depth = 0
+        self._heading = None  # (tag, attrs, позиция в out, части заголовка)
+        self._used_ids = set()
+        self._images = 0
+
+    # --- Разметка ---
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIP_TEXT_TAGS:
+            self._skip_depth += 1
+        if tag in BLOCK_TAGS:
+            self.text.append(' ')
+        if tag == 'img':
+            self.out.append(self._image(attrs))
+            return
+        if tag in HEADING_TAGS and self._heading is None:
+            self._heading = (tag, attrs, len(self.out), [])
+            self.out.append('')  # место под открывающий тег, id станет известен после текста
+            return
+        self.out.append(self.get_starttag_text())
+
+    def handle_startendtag(self, tag, attrs):
+        if tag in BLOCK_TAGS:
+            self.text.append(' ')
+        if tag == 'img':
+            self.out.append(self._image(attrs))
+        else:
+            self.out.append(self.get_starttag_text())
+
+    def handle_endtag(self, tag):
+        if tag in SKIP_TEXT_TAGS and self._skip_depth:
+            self._skip_depth -= 1
+        if tag in BLOCK_TAGS:
+            self.text.append(' ')
+        if self._heading and tag == self._heading[0]:
+            self._close_heading()
+        self.out.append(f'</{tag}>')
+
+    def handle_data(self, data):
+        self.out.append(data)
+        self._add_text(data)
+
+    def handle_entityref(self, name):
+        self.out.append(f'&{name};')
+        self._add_text(unescape(f'&{name};'))
+
+    def handle_charref(self, name):
+        self.out.append(f'&#{name};')
+        self._add_text(unescape(f'&#{name};'))
+
+    def handle_comment(self, data):
+        self.out.append(f'<!--{data}-->')
+
+    def handle_decl(self, decl):
+        self.out.append(f'<!{decl}>')
+
+    def _add_text(self, data):
+        if self._skip_depth:
+            return
+        self.text.append(data)
+        if self._heading:
+            self._heading[3].append(data)
+
+    # --- Заголовки ---
+
+    def _close_heading(self):
+        tag, attrs, position, parts = self._heading
+        self._heading = None
+        title = re.sub(r'\s+', ' ', ''.join(parts)).strip()
+        attrs = dict(attrs)
+        anchor = attrs.get('id') or self._unique_id(slugify(title) or 'section')
+        attrs['id'] = anchor
+        self.out[position] = f'<{tag}{self._render_attrs(attrs)}>'
+        if title:
+            self.toc.append({'level': int(tag[1]), 'id': anchor, 'title': title})
+
+    def _unique_id(self, base):
+        anchor, n = base, 2
+        while anchor in self._used_ids:
+            anchor, n = f'{base}-{n}', n + 1
+        self._used_ids.add(anchor)
+        return anchor
+
+    # --- Картинки ---
+
+    def _image(self, attrs):
+        attrs = dict(attrs)
+        self._images += 1
+        src = attrs.get('src') or ''
+        # Без resizer (только текст) картинки не открываются
+        name = self.resizer.storage_name(src) if self.resizer else None
+        if name:
+            # Ссылка на загруженный в редактор файл, который уже обработан, — на итоговый файл
+            current = editor_image_service.current_name(name)
+            if current != name and src.endswith(name):
+                src = attrs['src'] = f"{src[:-len(name)]}{current}"
+                name = current
+        info = self.resizer.describe(name) if name else None
+        if info:
+            width, height, variants = info
+            attrs.setdefault('width', str(width))
+            attrs.setdefault('height', str(height))
+            if variants and src.endswith(name):
+                prefix = src[:-len(name)]
+                candidates = [f'{prefix}{variant} {w}w' for variant, w in variants] + [f'{src} {width}w']
+                attrs['srcset'] = ', '.join(candidates)
+                attrs.setdefault('sizes', f'(max-width: {width}px) 100vw, {width}px')
+        # Первая картинка обычно на первом экране — ее не откладываем
+        attrs.setdefault('loading', 'eager' if self._images == 1 else 'lazy')
+        attrs.setdefault('decoding', 'async')
+        return f'<img{self._render_attrs(attrs)}>'
+
+    @staticmethod
+    def _render_attrs(attrs):
+        return ''.join(f' {key}' if value is None else f' {key}="{escape(value, quote=True)}"' for key, value in attrs.items())
+
+
+class ArticleContentProcessor:
+    """
+    Обработка тела статьи при сохранении: число слов и время чтения, текстовый анонс,
+    оглавление по h2/h3 (с id у заголовков) и <img> с width/height, loading и srcset
+    по заранее нарезанным копиям. Результат хранится в полях статьи, чтение — просто поля.
+    """
+
+    def __init__(self, resizer: Optional[ContentImageResizer] = None):
+        self.resizer = resizer or ContentImageResizer()
+
+    def process(self, article) -> ProcessedContent:
+        if article.content_type != article.ContentType.INTERNAL or not article.content:
+            return ProcessedContent()
+
+        return _parse(article.content, self.resizer)
+
+    @staticmethod
+    def _excerpt(plain_text: str) -> str:
+        limit = settings.ARTICLE_EXCERPT_LENGTH
+        if len(plain_text) <= limit:
+            return plain_text
+        cut = plain_text[:limit].rsplit(' ', 1)[0]
+        return f"{cut.rstrip('.,;:!?—-')}…"
+
+    def apply(self, article) -> bool:
+        """
+        Обрабатывает и сохраняет результат через UPDATE (без сигналов и повторной обработки).
+        Возвращает False, если статья уже изменилась с момента чтения — ее обработает следующий запуск.
+        """
+        from shop.models import Article
+
+        digest = content_hash(article)
+        fields = self.process(article).as_fields()
+        updated = Article.objects.filter(pk=article.pk, content=article.content).update(content_hash=digest, **fields)
+        for name, value in fields.items():
+            setattr(article, name, value)
+        article.content_hash = digest
+        return bool(updated)
+
+
+def _parse(html: str, resizer: Optional[ContentImageResizer]) -> ProcessedContent:
+    parser = _ContentRewriter(resizer)
+    parser.feed(html)
+    parser.close()
+
+    plain_text = re.sub(r'\s+', ' ', ''.join(parser.text)).strip()
+    word_count = len(plain_text.split())
+    return ProcessedContent(
+        html=''.join(parser.out),
+        word_count=word_count,
+        reading_time=math.ceil(word_count / settings.ARTICLE_WORDS_PER_MINUTE),
+        excerpt=ArticleContentProcessor._excerpt(plain_text),
+        toc=parser.toc,
+    )
+
+
+def summarize_text(html: str) -> ProcessedContent:
+    """
+    Разбор без картинок и хранилища (заполнение полей в миграции): число слов, время чтения,
+    анонс и оглавление. id заголовков есть только в html результата.
+    """
+    return _parse(html or '', None)
+
+
+def schedule_article_processing(article):
+    """
+    После сохранения статьи: небольшие обрабатываются сразу, большие — в Celery
+    (нарезка картинок и разбор длинного HTML не держат админку).
+    """
+    if article.content_hash == content_hash(article):
+        return
+    content = article.content or ''
+    if len(content) <= settings.ARTICLE_INLINE_PROCESSING_LIMIT and content.count('<img') <= settings.ARTICLE_INLINE_MAX_IMAGES:
+        ArticleContentProcessor().apply(article)
+        return
+
+    from django.db import transaction
+    from shop.models import Article
+    from shop.tasks import process_article_content_task
+
+    # Результат обработки прежней версии больше не соответствует тексту: до окончания задачи
+    # (или если Celery недоступен) API отдает новый исходный HTML, а не старую статью
+    stale = {'rendered_content': '', 'toc': [], 'content_hash': ''}
+    Article.objects.filter(pk=article.pk).update(**stale)
+    for name, value in stale.items():
+        setattr(article, name, value)
+    transaction.on_commit(lambda: process_article_content_task.delay(article.pk))
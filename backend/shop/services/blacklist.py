@@ -0,0 +1,155 @@
+import ipaddress
+import logging
+import threading
+import time
+from typing import Iterable, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger('shop')
+
+VERSION_KEY = 'blacklist:version'
+
+
+class PrefixTrie:
+    """
+    Бинарное префиксное дерево сетей одной версии IP (v4 или v6).
+    Поиск идет по битам адреса и останавливается на первой заблокированной сети:
+    O(длина префикса) независимо от количества записей.
+    Узел — список [потомок по биту 0, потомок по биту 1, сеть заблокирована].
+    """
+
+    def __init__(self, max_bits: int):
+        self.max_bits = max_bits
+        self.root = [None, None, False]
+
+    def add(self, network):
+        node = self.root
+        addr = int(network.network_address)
+        for i in range(network.prefixlen):
+            bit = (addr >> (self.max_bits - 1 - i)) & 1
+            if node[bit] is None:
+                node[bit] = [None, None, False]
+            node = node[bit]
+        node[2] = True
+
+    def contains(self, address) -> bool:
+        node = self.root
+        addr = int(address)
+        for i in range(self.max_bits):
+            if node[2]:
+                return True
+            node = node[(addr >> (self.max_bits - 1 - i)) & 1]
+            if node is None:
+                return False
+        return node[2]
+
+
+class BlacklistSnapshot:
+    """Неизменяемый снимок активного черного списка в памяти воркера."""
+
+    def __init__(self, items: Iterable[dict] = ()):
+        self.ips = set()
+        self.telegram_ids = set()
+        self.networks = {4: PrefixTrie(32), 6: PrefixTrie(128)}
+        self.has_networks = False
+
+        for item in items:
+            value = item['value'].strip()
+            if item['item_type'] == 'TG':
+                self.telegram_ids.add(value)
+                continue
+            try:
+                network = ipaddress.ip_network(value, strict=False)
+            except ValueError:
+                logger.warning(f"Blacklist: skipping invalid IP/CIDR value {value!r}")
+                continue
+            if network.num_addresses == 1:
+                self.ips.add(str(network.network_address))
+            else:
+                self.networks[network.version].add(network)
+                self.has_networks = True
+
+    def is_ip_blocked(self, ip: Optional[str]) -> bool:
+        if not ip:
+            return False
+        if ip in self.ips:
+            return True
+        if not self.has_networks:
+            return False
+        try:
+            address = ipaddress.ip_address(ip)
+        except ValueError:
+            return False
+        if address.version == 6 and address.ipv4_mapped:
+            address = address.ipv4_mapped
+        return self.networks[address.version].contains(address)
+
+    def is_telegram_id_blocked(self, telegram_id: Optional[str]) -> bool:
+        return bool(telegram_id) and telegram_id in self.telegram_ids
+
+
+class BlacklistService:
+    """
+    Черный список в памяти каждого воркера.
+
+    Вместо загрузки всего списка из Redis на каждый запрос воркер держит снимок
+    и раз в BLACKLIST_VERSION_CHECK_INTERVAL секунд читает из кеша одно число — версию.
+    Снимок перечитывается из БД, только когда версия изменилась (bump_version вызывается
+    при любом изменении BlacklistedItem, см. signals_security).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._version = None
+        self._checked_at = 0.0
+
+    def snapshot(self) -> BlacklistSnapshot:
+        now = time.monotonic()
+        if self._snapshot is not None and now - self._checked_at < settings.BLACKLIST_VERSION_CHECK_INTERVAL:
+            return self._snapshot
+
+        with self._lock:
+            if self._snapshot is not None and now - self._checked_at < settings.BLACKLIST_VERSION_CHECK_INTERVAL:
+                return self._snapshot
+            try:
+                version = cache.get(VERSION_KEY)
+                if version is None:
+                    # Ключа еще нет (или его вытеснили): заводим, снимок перечитаем
+                    cache.add(VERSION_KEY, 0, timeout=None)
+                    version = cache.get(VERSION_KEY)
+            except Exception as e:
+                logger.warning(f"Blacklist version check failed: {e}")
+                # Без Redis живем на текущем снимке; если его нет — грузим из БД
+                version = self._version
+            if self._snapshot is None or version is None or version != self._version:
+                self._snapshot = self._load()
+                self._version = version
+            self._checked_at = now
+            return self._snapshot
+
+    def _load(self) -> BlacklistSnapshot:
+        from shop.models import BlacklistedItem
+
+        items = BlacklistedItem.objects.filter(is_active=True).values('item_type', 'value')
+        return BlacklistSnapshot(items)
+
+    def reset(self):
+        with self._lock:
+            self._snapshot = None
+            self._version = None
+            self._checked_at = 0.0
+
+    @staticmethod
+    def bump_version():
+        """Сообщает всем воркерам, что список изменился."""
+        try:
+            cache.add(VERSION_KEY, 0, timeout=None)
+            cache.incr(VERSION_KEY)
+        except Exception as e:
+            logger.warning(f"Blacklist version bump failed: {e}")
+
+
+blacklist_service = BlacklistService()
@@ -0,0 +1,122 @@
+import hashlib
+import json
+import logging
+import time
+from dataclasses import dataclass
+from typing import Dict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from rest_framework.utils.encoders import JSONEncoder
+
+logger = logging.getLogger('shop')
+
+GENERATION_KEY = 'bootstrap:gen:{part}'
+PAYLOAD_KEY = 'bootstrap:payload:{generations}:{origin}'
+
+# Части ответа и модели, изменение которых их сбрасывает (см. signals.bump_bootstrap_generation)
+PARTS = ('settings', 'categories', 'banners', 'faq', 'deal')
+
+
+def current_deal():
+    """Товар дня: активная акция с ближайшим окончанием (общая логика с DealOfTheDayView)."""
+    from shop.models import Product
+
+    return Product.objects.filter(
+        is_active=True,
+        deal_price__isnull=False,
+        deal_ends_at__gt=timezone.now(),
+    ).order_by('deal_ends_at').first()
+
+
+def bump_generation(part: str):
+    """Новое поколение части: все собранные с ней ответы больше не читаются (и истекут по TTL)."""
+    key = GENERATION_KEY.format(part=part)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, _fresh_generation(), timeout=None)
+
+
+def _fresh_generation() -> int:
+    # Если ключ поколения пропал (вытеснение Redis), новое значение не совпадет ни с одним старым
+    return int(time.time() * 1000)
+
+
+@dataclass
+class BootstrapPayload:
+    body: bytes
+    etag: str
+
+
+class BootstrapService:
+    """
+    Все, что мини-приложению нужно при запуске (настройки, категории, баннеры, FAQ, товар дня),
+    одним заранее собранным JSON.
+
+    Готовое тело и его ETag лежат в кеше под составным ключом из поколений частей: сигнал
+    на изменение модели увеличивает поколение своей части, и следующий запрос соберет ответ
+    заново — без явного удаления ключей и без гонок между сбросом и пересборкой.
+    TTL ответа не дольше, чем до окончания текущей акции дня.
+    """
+
+    def get(self, request) -> BootstrapPayload:
+        key = PAYLOAD_KEY.format(generations=self._generations(), origin=self._origin(request))
+        cached = cache.get(key)
+        if cached is not None:
+            return BootstrapPayload(*cached)
+
+        data, ttl = self.build(request)
+        body = json.dumps(data, cls=JSONEncoder, ensure_ascii=False, separators=(',', ':')).encode()
+        payload = BootstrapPayload(body=body, etag=f'"{hashlib.sha256(body).hexdigest()[:32]}"')
+        cache.set(key, (payload.body, payload.etag), ttl)
+        return payload
+
+    def build(self, request):
+        """(данные, TTL кеша в секундах). Формат частей совпадает с отдельными эндпоинтами."""
+        from shop.models import Category, FaqItem, PromoBanner
+        from shop.services.cached_models import shop_settings_with_images
+        from shop.serializers import (
+            CategorySerializer, DealOfTheDaySerializer, FaqItemSerializer,
+            PromoBannerSerializer, ShopSettingsSerializer,
+        )
+
+        context = {'request': request}
+        deal = current_deal()
+        data = {
+            'settings': ShopSettingsSerializer(shop_settings_with_images(), context=context).data,
+            'categories': CategorySerializer(
+                Category.objects.filter(parent__isnull=True).prefetch_related('subcategories__subcategories'),
+                many=True, context=context,
+            ).data,
+            'banners': PromoBannerSerializer(
+                PromoBanner.objects.filter(is_active=True).order_by('order'), many=True, context=context
+            ).data,
+            'faq': FaqItemSerializer(FaqItem.objects.filter(is_active=True).order_by('order'), many=True).data,
+            'deal_of_the_day': DealOfTheDaySerializer(deal, context=context).data if deal else None,
+        }
+
+        ttl = settings.BOOTSTRAP_CACHE_TTL
+        if deal:
+            ttl = max(1, min(ttl, int((deal.deal_ends_at - timezone.now()).total_seconds())))
+        return data, ttl
+
+    @staticmethod
+    def _generations() -> str:
+        keys = {part: GENERATION_KEY.format(part=part) for part in PARTS}
+        values: Dict[str, int] = cache.get_many(keys.values())
+        missing = [key for key in keys.values() if key not in values]
+        for key in missing:
+            cache.add(key, _fresh_generation(), timeout=None)
+        if missing:
+            values.update(cache.get_many(missing))
+        return '.'.join(str(values.get(keys[part], 0)) for part in PARTS)
+
+    @staticmethod
+    def _origin(request) -> str:
+        # URL картинок абсолютные (build_absolute_uri) — ответ зависит от схемы и хоста
+        return f"{request.scheme}://{request.get_host()}"
+
+
+bootstrap_service = BootstrapService()
@@ -0,0 +1,29 @@
+from django.db.models import prefetch_related_objects
+
+from shop.services.tiered_cache import cached_instance, cached_queryset
+
+
+@cached_instance('shop_settings', depends_on=('shop.ShopSettings',))
+def shop_settings():
+    """Настройки магазина (синглтон) — без запросов к БД на каждый вызов."""
+    from shop.models import ShopSettings
+
+    return ShopSettings.load()
+
+
+@cached_instance('shop_settings_with_images', depends_on=('shop.ShopSettings', 'shop.ShopImage'))
+def shop_settings_with_images():
+    """Настройки вместе с картинками — для ShopSettingsSerializer (/api/settings/, /api/bootstrap/)."""
+    from shop.models import ShopSettings
+
+    obj = ShopSettings.load()
+    prefetch_related_objects([obj], 'images')
+    return obj
+
+
+@cached_queryset('discount_rules', depends_on=('shop.DiscountRule',))
+def active_discount_rules():
+    """Активные правила скидок с целевыми товаром и категорией (для PricingService)."""
+    from shop.models import DiscountRule
+
+    return DiscountRule.objects.filter(is_active=True).select_related('product_target', 'category_target')
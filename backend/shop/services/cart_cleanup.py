@@ -0,0 +1,118 @@
+import logging
+import time
+from dataclasses import dataclass, asdict
+from datetime import timedelta
+from typing import Optional, Dict, Any
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from shop.models import Cart, CartItem
+
+logger = logging.getLogger('shop')
+
+
+@dataclass
+class CleanupStats:
+    """Метрики одного прогона очистки."""
+    empty_carts_deleted: int = 0
+    stale_carts_deleted: int = 0
+    items_deleted: int = 0
+    batches: int = 0
+    duration_seconds: float = 0.0
+
+    @property
+    def carts_deleted(self) -> int:
+        return self.empty_carts_deleted + self.stale_carts_deleted
+
+    def as_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data['carts_deleted'] = self.carts_deleted
+        return data
+
+
+class CartCleanupService:
+    """
+    Сборщик мусора для корзин.
+
+    Удаляет:
+    1. Пустые корзины, не менявшиеся дольше CART_EMPTY_RETENTION_HOURS.
+    2. Любые корзины, не менявшиеся дольше CART_RETENTION_DAYS.
+
+    Удаление идет пачками по индексу (updated_at, id): каждая пачка — отдельная
+    короткая транзакция, между пачками пауза, чтобы не держать долгие блокировки.
+    """
+
+    def __init__(
+        self,
+        retention_days: Optional[int] = None,
+        empty_retention_hours: Optional[int] = None,
+        batch_size: Optional[int] = None,
+        pause: Optional[float] = None,
+    ):
+        self.retention_days = retention_days if retention_days is not None else settings.CART_RETENTION_DAYS
+        self.empty_retention_hours = (
+            empty_retention_hours if empty_retention_hours is not None else settings.CART_EMPTY_RETENTION_HOURS
+        )
+        self.batch_size = batch_size or settings.CART_CLEANUP_BATCH_SIZE
+        self.pause = pause if pause is not None else settings.CART_CLEANUP_BATCH_PAUSE
+
+    def run(self, dry_run: bool = False) -> CleanupStats:
+        started = time.monotonic()
+        stats = CleanupStats()
+        now = timezone.now()
+
+        # 1. Пустые корзины (самая массовая категория: гости, открывшие приложение)
+        has_items = Exists(CartItem.objects.filter(cart_id=OuterRef('pk')))
+        empty_carts = Cart.objects.filter(
+            updated_at__lt=now - timedelta(hours=self.empty_retention_hours)
+        ).filter(~has_items)
+        stats.empty_carts_deleted = self._purge(empty_carts, stats, dry_run)
+
+        # 2. Брошенные корзины (с товарами, но давно не трогались)
+        stale_carts = Cart.objects.filter(updated_at__lt=now - timedelta(days=self.retention_days))
+        stats.stale_carts_deleted = self._purge(stale_carts, stats, dry_run)
+
+        stats.duration_seconds = round(time.monotonic() - started, 3)
+        logger.info(f"Cart cleanup{' (dry run)' if dry_run else ''} finished: {stats.as_dict()}")
+        return stats
+
+    def _purge(self, queryset, stats: CleanupStats, dry_run: bool) -> int:
+        """
+        Удаляет записи queryset пачками.
+        Используем курсор (updated_at, id), а не OFFSET: каждая пачка — это
+        range scan по индексу, уже просмотренные (но не подошедшие) строки не читаются повторно.
+        """
+        if dry_run:
+            return queryset.count()
+
+        deleted_carts = 0
+        cursor = None
+
+        while True:
+            page = queryset.order_by('updated_at', 'id')
+            if cursor is not None:
+                last_updated, last_id = cursor
+                page = page.filter(Q(updated_at__gt=last_updated) | Q(updated_at=last_updated, id__gt=last_id))
+
+            rows = list(page.values_list('updated_at', 'id')[:self.batch_size])
+            if not rows:
+                break
+            cursor = rows[-1]
+
+            with transaction.atomic():
+                # Повторно применяем условия queryset: корзина могла ожить между выборкой и удалением
+                _, per_model = queryset.filter(id__in=[pk for _, pk in rows]).delete()
+
+            deleted_carts += per_model.get(Cart._meta.label, 0)
+            stats.items_deleted += per_model.get(CartItem._meta.label, 0)
+            stats.batches += 1
+
+            if len(rows) < self.batch_size:
+                break
+            if self.pause:
+                time.sleep(self.pause)
+
+        return deleted_carts
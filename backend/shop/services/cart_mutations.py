@@ -0,0 +1,91 @@
+from dataclasses import dataclass
+from typing import Iterable, List, Dict
+
+from django.db import transaction
+
+from shop.models import Cart, CartItem, Product
+
+
+class UnknownProductsError(Exception):
+    """В операциях указаны товары, которых нет в каталоге."""
+
+    def __init__(self, product_ids):
+        self.product_ids = sorted(product_ids)
+        super().__init__(f"Products not found: {self.product_ids}")
+
+
+@dataclass
+class CartOperation:
+    """Одна операция над корзиной: set / increment / remove."""
+    SET = 'set'
+    INCREMENT = 'increment'
+    REMOVE = 'remove'
+    CHOICES = (SET, INCREMENT, REMOVE)
+
+    op: str
+    product_id: int
+    quantity: int = 0
+
+
+class CartMutationService:
+    """
+    Применяет набор операций к корзине за одну транзакцию.
+
+    Вместо цепочки get / update_or_create / delete на каждый товар:
+    1. Одним запросом проверяем существование товаров.
+    2. Одним запросом читаем текущие количества затронутых позиций.
+    3. Сворачиваем операции в итоговые количества в памяти.
+    4. Пишем результат одним INSERT ... ON CONFLICT (bulk upsert) и одним DELETE.
+    """
+
+    def apply(self, cart: Cart, operations: Iterable[CartOperation]) -> None:
+        operations = list(operations)
+        if not operations:
+            return
+
+        product_ids = {operation.product_id for operation in operations}
+        existing_ids = set(Product.objects.filter(id__in=product_ids).values_list('id', flat=True))
+        missing_ids = product_ids - existing_ids
+        if missing_ids:
+            raise UnknownProductsError(missing_ids)
+
+        with transaction.atomic():
+            # Блокируем только строку корзины: параллельные изменения ОДНОЙ корзины
+            # выстраиваются в очередь (важно для increment), разные корзины друг другу не мешают.
+            Cart.objects.select_for_update().filter(pk=cart.pk).exists()
+
+            quantities = dict(
+                CartItem.objects.filter(cart=cart, product_id__in=product_ids).values_list('product_id', 'quantity')
+            )
+            final_quantities = self._fold(quantities, operations)
+
+            to_upsert = [
+                CartItem(cart=cart, product_id=product_id, quantity=quantity)
+                for product_id, quantity in final_quantities.items() if quantity > 0
+            ]
+            to_delete = [product_id for product_id, quantity in final_quantities.items() if quantity <= 0]
+
+            if to_upsert:
+                CartItem.objects.bulk_create(
+                    to_upsert,
+                    update_conflicts=True,
+                    unique_fields=['cart', 'product'],
+                    update_fields=['quantity'],
+                )
+            if to_delete:
+                CartItem.objects.filter(cart=cart, product_id__in=to_delete).delete()
+
+    @staticmethod
+    def _fold(current: Dict[int, int], operations: List[CartOperation]) -> Dict[int, int]:
+        """Последовательно применяет операции к текущим количествам и возвращает итог по каждому товару."""
+        result = {}
+        for operation in operations:
+            quantity = result.get(operation.product_id, current.get(operation.product_id, 0))
+            if operation.op == CartOperation.SET:
+                quantity = operation.quantity
+            elif operation.op == CartOperation.INCREMENT:
+                quantity += operation.quantity
+            elif operation.op == CartOperation.REMOVE:
+                quantity = 0
+            result[operation.product_id] = max(quantity, 0)
+        return result
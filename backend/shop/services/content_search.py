@@ -0,0 +1,164 @@
+import logging
+from typing import Dict, List
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank, SearchVector
+from django.db import connection
+from django.db.models import F, Func, Q, Value
+from django.utils import timezone
+
+logger = logging.getLogger('shop')
+
+SEARCH_CONFIG = 'russian'
+# Теги и HTML-сущности (&nbsp; и т.п.) не должны попадать в словарь поиска и в сниппеты
+HTML_NOISE_RE = '<[^>]+>|&[a-zA-Z0-9#]+;'
+
+
+def is_supported() -> bool:
+    return connection.vendor == 'postgresql'
+
+
+def plain_text(expression):
+    """HTML -> текст средствами БД (regexp_replace), без выгрузки тела в Python."""
+    return Func(expression, Value(HTML_NOISE_RE), Value(' '), Value('g'), function='regexp_replace')
+
+
+def article_vector():
+    return (
+        SearchVector('title', weight='A', config=SEARCH_CONFIG)
+        + SearchVector('meta_description', weight='B', config=SEARCH_CONFIG)
+        + SearchVector(plain_text(F('content')), weight='C', config=SEARCH_CONFIG)
+    )
+
+
+def faq_vector():
+    return (
+        SearchVector('question', weight='A', config=SEARCH_CONFIG)
+        + SearchVector(plain_text(F('answer')), weight='B', config=SEARCH_CONFIG)
+    )
+
+
+def update_search_vector(instance):
+    """Пересчитывает search_vector одной строки (post_save). Вне PostgreSQL — ничего не делает."""
+    from shop.models import Article
+
+    if not is_supported():
+        return
+    vector = article_vector() if isinstance(instance, Article) else faq_vector()
+    type(instance).objects.filter(pk=instance.pk).update(search_vector=vector)
+
+
+class ContentSearchService:
+    """
+    Поиск по статьям и FAQ для справочного центра.
+
+    PostgreSQL: хранимый tsvector (конфигурация russian) с GIN-индексом — поиск и ранжирование
+    идут по индексу, без ILIKE по HTML. ts_headline дорогой (заново разбирает текст), поэтому
+    сначала выбираются id лучших N, и сниппеты строятся только для них.
+
+    Другие СУБД (SQLite в тестах/разработке): icontains по заголовку/анонсу и вопросу/ответу, сниппет — анонс.
+    """
+
+    HEADLINE_OPTIONS = 'MaxWords=35, MinWords=15, MaxFragments=2, FragmentDelimiter=" … "'
+
+    def __init__(self, limit: int = None):
+        self.limit = max(1, min(limit or settings.CONTENT_SEARCH_LIMIT, settings.CONTENT_SEARCH_MAX_LIMIT))
+
+    def search(self, text: str) -> Dict[str, List[dict]]:
+        text = text.strip()
+        if not text:
+            return {'articles': [], 'faq': []}
+        if is_supported():
+            query = SearchQuery(text, search_type='websearch', config=SEARCH_CONFIG)
+            return {'articles': self._articles(query), 'faq': self._faq(query)}
+        return {'articles': self._articles_fallback(text), 'faq': self._faq_fallback(text)}
+
+    # --- PostgreSQL ---
+
+    def _top_ids(self, queryset, query) -> List[int]:
+        return list(
+            queryset.filter(search_vector=query)
+            .annotate(rank=SearchRank(F('search_vector'), query))
+            .order_by('-rank', '-pk')
+            .values_list('pk', flat=True)[:self.limit]
+        )
+
+    def _articles(self, query) -> List[dict]:
+        ids = self._top_ids(self._published_articles(), query)
+        if not ids:
+            return []
+        rows = (
+            self._published_articles().filter(pk__in=ids)
+            .annotate(snippet=SearchHeadline(
+                plain_text(F('content')), query, config=SEARCH_CONFIG,
+                start_sel='<mark>', stop_sel='</mark>', options=self.HEADLINE_OPTIONS,
+            ))
+            .values('pk', 'title', 'slug', 'published_at', 'excerpt', 'snippet')
+        )
+        return self._in_order(ids, rows, self._article_result)
+
+    def _faq(self, query) -> List[dict]:
+        ids = self._top_ids(self._active_faq(), query)
+        if not ids:
+            return []
+        rows = (
+            self._active_faq().filter(pk__in=ids)
+            .annotate(snippet=SearchHeadline(
+                plain_text(F('answer')), query, config=SEARCH_CONFIG,
+                start_sel='<mark>', stop_sel='</mark>', options=self.HEADLINE_OPTIONS,
+            ))
+            .values('pk', 'question', 'snippet')
+        )
+        return self._in_order(ids, rows, self._faq_result)
+
+    @staticmethod
+    def _in_order(ids, rows, build):
+        by_id = {row['pk']: row for row in rows}
+        return [build(by_id[pk]) for pk in ids if pk in by_id]
+
+    # --- Без PostgreSQL ---
+
+    def _articles_fallback(self, text) -> List[dict]:
+        rows = (
+            self._published_articles()
+            .filter(Q(title__icontains=text) | Q(excerpt__icontains=text))
+            .order_by('-published_at')
+            .values('pk', 'title', 'slug', 'published_at', 'excerpt')[:self.limit]
+        )
+        return [self._article_result({**row, 'snippet': row['excerpt']}) for row in rows]
+
+    def _faq_fallback(self, text) -> List[dict]:
+        rows = (
+            self._active_faq()
+            .filter(Q(question__icontains=text) | Q(answer__icontains=text))
+            .values('pk', 'question')[:self.limit]
+        )
+        return [self._faq_result({**row, 'snippet': ''}) for row in rows]
+
+    # --- Общее ---
+
+    @staticmethod
+    def _published_articles():
+        from shop.models import Article
+
+        return Article.objects.filter(status=Article.Status.PUBLISHED, published_at__lte=timezone.now())
+
+    @staticmethod
+    def _active_faq():
+        from shop.models import FaqItem
+
+        return FaqItem.objects.filter(is_active=True)
+
+    @staticmethod
+    def _article_result(row) -> dict:
+        return {
+            'title': row['title'],
+            'slug': row['slug'],
+            'published_at': row['published_at'],
+            'excerpt': row['excerpt'],
+            'snippet': row['snippet'],
+        }
+
+    @staticmethod
+    def _faq_result(row) -> dict:
+        return {'id': row['pk'], 'question': row['question'], 'snippet': row['snippet']}
@@ -0,0 +1,205 @@
+import logging
+import os
+import uuid
+from dataclasses import dataclass
+from typing import Optional
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db.models import Value
+from django.db.models.functions import Replace
+from PIL import Image
+
+from shop.image_processing import ImageTooLarge, encode_optimized
+
+logger = logging.getLogger('shop')
+
+CONTENT_DIR = 'articles/content'
+RAW_DIR = 'articles/content/raw'
+# Форматы, которые браузер показывает сам: до обработки в Celery в редактор уходит загруженный файл
+BROWSER_FORMATS = {'JPEG', 'PNG', 'WEBP', 'GIF'}
+
+STATUS_PROCESSING = 'processing'
+STATUS_DONE = 'done'
+STATUS_FAILED = 'failed'
+
+
+@dataclass
+class EditorImage:
+    token: str
+    name: str  # файл в хранилище, чей URL уходит в редактор
+    status: str
+
+
+class EditorImageService:
+    """
+    Картинки, загружаемые в TinyMCE.
+
+    Запрос не держит воркер gunicorn на перекодировании: небольшие файлы (до TINYMCE_INLINE_MAX_BYTES)
+    обрабатываются сразу, остальные сохраняются как есть в RAW_DIR, и в редактор уходит URL
+    загруженного файла — JPEG/PNG/WebP/GIF браузер покажет сам, в запросе читается только заголовок.
+    HEIC/HEIF браузеры не показывают: для них под итоговым именем сразу кладется превью (декодируется
+    в полном размере — у HEIF нет уменьшения при декодировании). Перекодирование идет в Celery
+    (process_editor_image_task): итоговый файл — CONTENT_DIR/<token>.webp, ссылки на загруженный файл
+    в статьях заменяются на него, загруженный файл удаляется.
+
+    Состояние хранится в самих файлах (GET /api/tinymce/upload-image/<token>/): есть загруженный
+    файл — processing, есть отметка <token>.failed — failed, остался только итоговый — done.
+    """
+
+    def accept(self, uploaded_file, extension: str) -> EditorImage:
+        """
+        Сохраняет загрузку. Нечитаемая картинка — исключение PIL (как при обычной обработке),
+        больше TINYMCE_MAX_DECODED_PIXELS — ImageTooLarge.
+        """
+        token = uuid.uuid4().hex
+        name = self._final_name(token)
+
+        # Только заголовок: формат и размеры, пиксели не декодируются
+        with Image.open(uploaded_file) as img:
+            image_format, (width, height) = img.format, img.size
+        uploaded_file.seek(0)
+        # JPEG уменьшается при декодировании (draft), его потолок проверит encode_optimized
+        if image_format != 'JPEG' and width * height > settings.TINYMCE_MAX_DECODED_PIXELS:
+            raise ImageTooLarge(f"{width}x{height}")
+
+        if uploaded_file.size <= settings.TINYMCE_INLINE_MAX_BYTES:
+            self._write(name, self._encode(uploaded_file))
+            return EditorImage(token=token, name=name, status=STATUS_DONE)
+
+        previewed = image_format not in BROWSER_FORMATS
+        if previewed:
+            self._write(name, self._encode(uploaded_file, quality=settings.TINYMCE_PREVIEW_QUALITY, webp_method=0))
+            uploaded_file.seek(0)
+        raw_name = default_storage.save(f"{RAW_DIR}/{token}.{extension}", uploaded_file)
+
+        from django.db import transaction
+        from shop.tasks import process_editor_image_task
+
+        transaction.on_commit(lambda: process_editor_image_task.delay(token))
+        return EditorImage(token=token, name=name if previewed else raw_name, status=STATUS_PROCESSING)
+
+    def finalize(self, token: str) -> bool:
+        """Перекодирование (Celery). False — нечего делать или не вышло (статус failed)."""
+        raw_name = self._raw_name(token)
+        if raw_name is None or default_storage.exists(self._failed_name(token)):
+            return False
+
+        name = self._final_name(token)
+        try:
+            with default_storage.open(raw_name) as source:
+                self._write(name, self._encode(source))
+        except Exception as e:
+            if not default_storage.exists(raw_name):
+                return False  # файл уже обработал параллельный запуск
+            logger.error(f"Editor image {token}: processing failed, uploaded file kept: {e}")
+            default_storage.save(self._failed_name(token), ContentFile(b''))
+            return False
+
+        self._reprocess_articles(raw_name, name)
+        default_storage.delete(raw_name)
+        return True
+
+    def status(self, token: str) -> Optional[EditorImage]:
+        name = self._final_name(token)
+        raw_name = self._raw_name(token)
+        if default_storage.exists(self._failed_name(token)):
+            status = STATUS_FAILED
+        elif raw_name:
+            status = STATUS_PROCESSING
+        elif default_storage.exists(name):
+            return EditorImage(token=token, name=name, status=STATUS_DONE)
+        else:
+            return None
+        # До обработки в редакторе загруженный файл (или превью HEIC под итоговым именем)
+        return EditorImage(token=token, name=name if default_storage.exists(name) else raw_name, status=status)
+
+    def current_name(self, name: str) -> str:
+        """
+        Загруженный файл, который уже обработан и удален, -> итоговый файл (для статей, сохраненных
+        со ссылкой, выданной редактору до обработки). Остальные имена возвращаются как есть.
+        """
+        if os.path.dirname(name) != RAW_DIR or default_storage.exists(name):
+            return name
+        final_name = self._final_name(os.path.splitext(os.path.basename(name))[0])
+        return final_name if default_storage.exists(final_name) else name
+
+    # --- Внутреннее ---
+
+    @staticmethod
+    def _final_name(token: str) -> str:
+        return f"{CONTENT_DIR}/{token}.webp"
+
+    @staticmethod
+    def _failed_name(token: str) -> str:
+        return f"{RAW_DIR}/{token}.failed"
+
+    @staticmethod
+    def _raw_name(token: str) -> Optional[str]:
+        try:
+            _, files = default_storage.listdir(RAW_DIR)
+        except FileNotFoundError:
+            return None
+        for filename in files:
+            if filename.startswith(f"{token}.") and not filename.endswith('.failed'):
+                return f"{RAW_DIR}/{filename}"
+        return None
+
+    @staticmethod
+    def _encode(source, **options):
+        return encode_optimized(
+            source, max_width=settings.TINYMCE_IMAGE_MAX_WIDTH, max_pixels=settings.TINYMCE_MAX_DECODED_PIXELS,
+            **options,
+        )
+
+    @staticmethod
+    def _write(name: str, output):
+        """
+        Пишет файл под точным именем, заменяя существующий. Локальное хранилище — через временный
+        файл и os.replace: читатель видит либо старую картинку, либо новую, но не половину.
+        """
+        try:
+            try:
+                path = default_storage.path(name)
+            except NotImplementedError:
+                # Удаленное хранилище: запись объекта и так атомарна, save не должен переименовать файл
+                default_storage.delete(name)
+                default_storage.save(name, File(output))
+                return
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+            try:
+                with open(tmp_path, 'wb') as tmp:
+                    for chunk in File(output).chunks():
+                        tmp.write(chunk)
+                os.chmod(tmp_path, 0o644)
+                os.replace(tmp_path, path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+        finally:
+            output.close()
+
+    @staticmethod
+    def _reprocess_articles(raw_name: str, name: str):
+        """
+        Ссылки на загруженный файл в статьях -> итоговый файл; статьи, обработанные с загруженным
+        файлом или превью, получают размеры и srcset по итоговому.
+        """
+        from shop.models import Article
+        from shop.services.article_content import ArticleContentProcessor, ContentImageResizer
+
+        resizer = ContentImageResizer()
+        for width in resizer.widths:
+            default_storage.delete(resizer.variant_name(name, width))
+            default_storage.delete(resizer.variant_name(raw_name, width))
+        raw_url, url = default_storage.url(raw_name), default_storage.url(name)
+        Article.objects.filter(content__contains=raw_url).update(content=Replace('content', Value(raw_url), Value(url)))
+        processor = ArticleContentProcessor(resizer)
+        for article in Article.objects.filter(content__contains=os.path.basename(name)):
+            processor.apply(article)
+
+
+editor_image_service = EditorImageService()
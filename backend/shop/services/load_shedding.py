@@ -0,0 +1,235 @@
+import itertools
+import logging
+import math
+import os
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from django.conf import settings
+
+logger = logging.getLogger('shop')
+
+INFLIGHT_KEY = 'load:inflight'
+STATS_KEY = 'load:stats'
+WORKER_KEY = 'load:worker:{pid}'
+
+# Классы приоритета: чем больше число, тем раньше запрос отбрасывается при перегрузке
+PRIORITY_CRITICAL = 0  # корзина и оформление заказа — не отбрасываются никогда
+PRIORITY_HIGH = 1      # карточка товара
+PRIORITY_NORMAL = 2    # каталог, справочники
+PRIORITY_LOW = 3       # статьи и поиск
+
+PRIORITY_NAMES = {
+    PRIORITY_CRITICAL: 'critical',
+    PRIORITY_HIGH: 'high',
+    PRIORITY_NORMAL: 'normal',
+    PRIORITY_LOW: 'low',
+}
+
+# По имени маршрута (shop/urls.py). Все, чего здесь нет (админка, загрузки, ловушка), — critical.
+ROUTE_PRIORITIES = {
+    'order-create': PRIORITY_CRITICAL,
+    'order-detail': PRIORITY_CRITICAL,
+    'cart-detail': PRIORITY_CRITICAL,
+    'calculate-selection': PRIORITY_CRITICAL,
+    'product-detail': PRIORITY_HIGH,
+    'bootstrap': PRIORITY_HIGH,  # без него мини-приложение не запустится
+    'product-list': PRIORITY_NORMAL,
+    'category-list': PRIORITY_NORMAL,
+    'banner-list': PRIORITY_NORMAL,
+    'shop-settings': PRIORITY_NORMAL,
+    'deal-of-the-day': PRIORITY_NORMAL,
+    'faq-list': PRIORITY_NORMAL,
+    'article-list': PRIORITY_LOW,
+    'article-detail': PRIORITY_LOW,
+    'article-increment-view': PRIORITY_LOW,
+    'content-search': PRIORITY_LOW,
+}
+
+
+def route_priority(request) -> int:
+    """Класс приоритета запроса после роутинга (request.resolver_match)."""
+    match = getattr(request, 'resolver_match', None)
+    priority = ROUTE_PRIORITIES.get(match.url_name if match else None, PRIORITY_CRITICAL)
+    # Поиск по каталогу — самый дорогой запрос из "обычных", при нагрузке уходит первым
+    if priority == PRIORITY_NORMAL and request.GET.get('search', '').strip():
+        priority = PRIORITY_LOW
+    return priority
+
+
+class DecayingAverage:
+    """EWMA, которое без новых замеров затухает к нулю (простой воркера не держит старую оценку)."""
+
+    def __init__(self):
+        self.value = 0.0
+        self.updated_at = 0.0
+
+    def current(self, now: float) -> float:
+        if not self.updated_at:
+            return 0.0
+        return self.value * math.exp(-(now - self.updated_at) / settings.LOAD_SHEDDING_DECAY)
+
+    def add(self, sample: float, now: float):
+        value = self.current(now)
+        self.value = value + settings.LOAD_SHEDDING_EWMA_ALPHA * (sample - value)
+        self.updated_at = now
+
+
+@dataclass
+class Admission:
+    """Состояние одного запроса между входом в middleware и ответом."""
+    token: str
+    inflight: Optional[int]
+    priority: Optional[int] = None
+    shed: bool = False
+
+
+class LoadMonitor:
+    """
+    Адаптивный сброс нагрузки (load shedding) для API.
+
+    Сигналы перегрузки:
+    - Время в очереди: nginx ставит X-Request-Start (t=<сек>), разница с моментом входа в Django —
+      сколько запрос ждал свободного воркера. Пока очереди нет, отбрасывать нечего.
+      Без заголовка (запуск без nginx) вместо него берется задержка ответов этого воркера.
+    - Число запросов в работе по всем воркерам: sorted set в Redis (токен -> время входа).
+      Записи упавших посреди запроса воркеров вычищаются по возрасту, счетчик не "залипает".
+      Если свободные воркеры есть, медленный ответ — это медленный запрос, а не перегрузка.
+
+    Оба средних считаются в памяти воркера (sync-воркер gunicorn обслуживает по одному запросу).
+    Порог задержки задается на класс (LOAD_SHEDDING_DELAY_THRESHOLDS): статьи отбрасываются
+    первыми, карточка товара — последней, корзина и заказ — никогда. Отброшенный запрос получает
+    503 с Retry-After; для публичного API nginx в этом случае отдает устаревший кеш.
+
+    Redis недоступен — решаем только по задержке (fail-open для счетчика).
+    """
+
+    def __init__(self):
+        self._seq = itertools.count()
+        self.reset()
+
+    def reset(self):
+        self.queue_delay = DecayingAverage()
+        self.latency = DecayingAverage()
+        self.counters: Counter = Counter()
+
+    # --- Жизненный цикл запроса (LoadSheddingMiddleware) ---
+
+    def enter(self, request) -> Admission:
+        now = time.time()
+        delay = self._queue_delay(request, now)
+        if delay is not None:
+            self.queue_delay.add(delay, now)
+        # pid — на случай gunicorn --preload, где монитор создан еще в мастере
+        token = f"{os.getpid()}:{next(self._seq)}"
+        return Admission(token=token, inflight=self._register(token, now))
+
+    def should_shed(self, admission: Admission) -> bool:
+        if admission.priority is None or admission.priority == PRIORITY_CRITICAL:
+            return False
+        threshold = settings.LOAD_SHEDDING_DELAY_THRESHOLDS.get(PRIORITY_NAMES[admission.priority])
+        if threshold is None or self.pressure() < threshold:
+            return False
+        if admission.inflight is not None and admission.inflight < settings.LOAD_SHEDDING_CAPACITY:
+            return False
+        return True
+
+    def exit(self, admission: Admission, elapsed: float):
+        now = time.time()
+        # Отброшенные запросы отвечают мгновенно и занизили бы оценку задержки
+        if not admission.shed:
+            self.latency.add(elapsed, now)
+
+        field = None
+        if admission.priority is not None:
+            field = f"{'shed' if admission.shed else 'served'}:{PRIORITY_NAMES[admission.priority]}"
+            self.counters[field] += 1
+
+        try:
+            from shop.redis_client import get_redis
+
+            pipe = get_redis().pipeline(transaction=False)
+            pipe.zrem(INFLIGHT_KEY, admission.token)
+            if field:
+                pipe.hincrby(STATS_KEY, field, 1)
+            worker_key = WORKER_KEY.format(pid=os.getpid())
+            pipe.hset(worker_key, mapping={
+                'queue_delay': round(self.queue_delay.current(now), 4),
+                'latency': round(self.latency.current(now), 4),
+                'updated_at': int(now),
+            })
+            pipe.expire(worker_key, settings.LOAD_SHEDDING_STALE_AFTER)
+            pipe.execute()
+        except Exception as e:
+            logger.debug(f"Load shedding stats unavailable: {e}")
+
+    def pressure(self) -> float:
+        """Текущая оценка задержки (сек): время в очереди, если nginx его сообщает, иначе время ответа."""
+        now = time.time()
+        if self.queue_delay.updated_at:
+            return self.queue_delay.current(now)
+        return self.latency.current(now)
+
+    # --- Внутреннее ---
+
+    @staticmethod
+    def _queue_delay(request, now: float) -> Optional[float]:
+        raw = request.META.get('HTTP_X_REQUEST_START', '')
+        if raw.startswith('t='):
+            raw = raw[2:]
+        try:
+            started = float(raw)
+        except ValueError:
+            return None
+        # Бывает в секундах ($msec nginx), миллисекундах или микросекундах
+        while started > 1e11:
+            started /= 1000
+        delay = now - started
+        # Сильное расхождение часов между nginx и приложением — не сигнал
+        if delay < -1 or delay > settings.LOAD_SHEDDING_STALE_AFTER:
+            return None
+        return max(0.0, delay)
+
+    @staticmethod
+    def _register(token: str, now: float) -> Optional[int]:
+        try:
+            from shop.redis_client import get_redis
+
+            pipe = get_redis().pipeline(transaction=False)
+            pipe.zremrangebyscore(INFLIGHT_KEY, '-inf', now - settings.LOAD_SHEDDING_STALE_AFTER)
+            pipe.zadd(INFLIGHT_KEY, {token: now})
+            pipe.expire(INFLIGHT_KEY, settings.LOAD_SHEDDING_STALE_AFTER)
+            pipe.zcard(INFLIGHT_KEY)
+            return int(pipe.execute()[-1])
+        except Exception as e:
+            logger.debug(f"Load shedding in-flight counter unavailable: {e}")
+            return None
+
+    # --- Счетчики для настройки порогов ---
+
+    def stats(self) -> Dict[str, object]:
+        """Счетчики по всем воркерам из Redis: served/shed по классам и средние каждого воркера."""
+        from shop.redis_client import get_redis
+
+        r = get_redis()
+        counters = {key.decode(): int(value) for key, value in r.hgetall(STATS_KEY).items()}
+        workers = {}
+        for key in r.scan_iter(match=WORKER_KEY.format(pid='*')):
+            data = {k.decode(): v.decode() for k, v in r.hgetall(key).items()}
+            workers[key.decode().rsplit(':', 1)[-1]] = data
+        return {
+            'inflight': r.zcard(INFLIGHT_KEY),
+            'capacity': settings.LOAD_SHEDDING_CAPACITY,
+            'counters': counters,
+            'workers': workers,
+        }
+
+    def reset_stats(self):
+        from shop.redis_client import get_redis
+
+        get_redis().delete(STATS_KEY)
+
+
+load_monitor = LoadMonitor()
@@ -3,6 +3,7 @@ from typing import List, Optional, Dict, Any, Union
 from dataclasses import dataclass
 from django.db.models import Prefetch
 from shop.models import Product, DiscountRule, Category, CartItem
+from shop.services.cached_models import active_discount_rules
 
 @dataclass
 class PricingItem:
@@ -131,8 +132,8 @@ class CartPricingService:
         }
 
     def _get_active_rules(self):
-        """Получает активные правила из БД (можно добавить кеширование)."""
-        return DiscountRule.objects.filter(is_active=True).select_related('product_target', 'category_target')
+        """Активные правила (двухуровневый кеш, сбрасывается при изменении DiscountRule)."""
+        return active_discount_rules()
 
     def _find_best_rule(self, items: List[PricingItem], stats: Dict, rules) -> tuple[Optional[DiscountRule], Decimal]:
         """Перебирает все правила и находит самое выгодное для клиента."""
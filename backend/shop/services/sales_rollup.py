@@ -0,0 +1,185 @@
+import logging
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+from typing import Dict, Optional, Tuple
+
+from django.db import connection, transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from shop.models import (
+    Order, OrderItem,
+    SalesDailyStatus, SalesDailyProduct, SalesDailyCategory, SalesDailyDiscount,
+)
+
+logger = logging.getLogger('shop')
+
+# Описание таблиц роллапов: (модель, ключевые поля, суммируемые поля)
+TABLES = {
+    'status': (SalesDailyStatus, ('day', 'status'), ('orders_count', 'subtotal', 'discount_amount', 'revenue')),
+    'product': (SalesDailyProduct, ('day', 'product_id'), ('quantity', 'revenue')),
+    'category': (SalesDailyCategory, ('day', 'category_id'), ('quantity', 'revenue')),
+    'discount': (SalesDailyDiscount, ('day', 'rule_name'), ('orders_count', 'discount_amount')),
+}
+
+Deltas = Dict[str, Dict[Tuple, Dict[str, object]]]
+
+
+class SalesRollupService:
+    """
+    Инкрементальное ведение дневных роллапов продаж.
+
+    Каждое событие заказа (создание, смена статуса, удаление) превращается в набор дельт
+    "вклад заказа в статусе X": строка день × статус, и — для неотмененных заказов — строки
+    по товарам, категориям и правилу скидки. Смена статуса = вычесть старый вклад + добавить новый.
+    Дельты пишутся одним INSERT ... ON CONFLICT DO UPDATE SET col = col + excluded.col на таблицу.
+
+    Правки сумм и позиций существующего заказа в админке инкрементально не отслеживаются —
+    их подбирает пересборка (rebuild), которая по расписанию перестраивает последние дни.
+    """
+
+    # --- События заказа ---
+
+    def record_order(self, order: Order) -> None:
+        """Новый заказ (вызывается после фиксации транзакции, когда позиции уже сохранены)."""
+        self._apply(self._contribution(order, order.status, sign=1))
+
+    def remove_order(self, order: Order) -> None:
+        """Заказ удаляется (вызывать до удаления позиций)."""
+        self._apply(self._contribution(order, order.status, sign=-1))
+
+    def change_status(self, order: Order, old_status: str, new_status: str) -> None:
+        if old_status == new_status:
+            return
+        deltas = self._contribution(order, old_status, sign=-1)
+        self._merge(deltas, self._contribution(order, new_status, sign=1))
+        self._apply(deltas)
+
+    # --- Пересборка ---
+
+    @transaction.atomic
+    def rebuild(self, date_from: Optional[date] = None, date_to: Optional[date] = None) -> Dict[str, int]:
+        """
+        Полностью пересчитывает роллапы за период (включительно) из Order/OrderItem.
+        Без границ — за всю историю.
+        """
+        orders = Order.objects.annotate(day=TruncDate('created_at'))
+        items = OrderItem.objects.exclude(order__status=Order.OrderStatus.CANCELED).annotate(day=TruncDate('order__created_at'))
+        if date_from:
+            orders = orders.filter(day__gte=date_from)
+            items = items.filter(day__gte=date_from)
+        if date_to:
+            orders = orders.filter(day__lte=date_to)
+            items = items.filter(day__lte=date_to)
+
+        line_total = ExpressionWrapper(F('price_at_purchase') * F('quantity'), output_field=DecimalField(max_digits=14, decimal_places=2))
+        rows = {
+            'status': [
+                SalesDailyStatus(**row) for row in orders.values('day', 'status').annotate(
+                    orders_count=Count('id'), subtotal=Sum('subtotal'),
+                    discount_amount=Sum('discount_amount'), revenue=Sum('final_total'),
+                ).order_by()
+            ],
+            'product': [
+                SalesDailyProduct(day=row['day'], product_id=row['product_id'], quantity=row['units'], revenue=row['amount'])
+                for row in items.values('day', 'product_id').annotate(
+                    units=Sum('quantity'), amount=Sum(line_total),
+                ).order_by()
+            ],
+            'category': [
+                SalesDailyCategory(day=row['day'], category_id=row['product__category_id'], quantity=row['units'], revenue=row['amount'])
+                for row in items.values('day', 'product__category_id').annotate(
+                    units=Sum('quantity'), amount=Sum(line_total),
+                ).order_by()
+            ],
+            'discount': [
+                SalesDailyDiscount(day=row['day'], rule_name=row['applied_rule'], orders_count=row['orders_count'], discount_amount=row['discount_amount'])
+                for row in orders.exclude(status=Order.OrderStatus.CANCELED).exclude(applied_rule__isnull=True).exclude(applied_rule='')
+                .values('day', 'applied_rule').annotate(orders_count=Count('id'), discount_amount=Sum('discount_amount')).order_by()
+            ],
+        }
+
+        counts = {}
+        for name, (model, _, _) in TABLES.items():
+            existing = model.objects.all()
+            if date_from:
+                existing = existing.filter(day__gte=date_from)
+            if date_to:
+                existing = existing.filter(day__lte=date_to)
+            existing.delete()
+            model.objects.bulk_create(rows[name], batch_size=1000)
+            counts[name] = len(rows[name])
+
+        logger.info(f"Sales rollups rebuilt ({date_from or '...'} - {date_to or '...'}): {counts}")
+        return counts
+
+    # --- Внутреннее ---
+
+    @staticmethod
+    def _contribution(order: Order, status: str, sign: int) -> Deltas:
+        day = timezone.localdate(order.created_at)
+        deltas: Deltas = defaultdict(dict)
+        deltas['status'][(day, status)] = {
+            'orders_count': sign,
+            'subtotal': sign * order.subtotal,
+            'discount_amount': sign * order.discount_amount,
+            'revenue': sign * order.final_total,
+        }
+        if status == Order.OrderStatus.CANCELED:
+            return deltas
+
+        if order.applied_rule:
+            deltas['discount'][(day, order.applied_rule)] = {'orders_count': sign, 'discount_amount': sign * order.discount_amount}
+
+        items = order.items.values_list('product_id', 'product__category_id', 'quantity', 'price_at_purchase')
+        for product_id, category_id, quantity, price in items:
+            line = {'quantity': sign * quantity, 'revenue': sign * price * quantity}
+            SalesRollupService._add(deltas['product'], (day, product_id), line)
+            SalesRollupService._add(deltas['category'], (day, category_id), line)
+        return deltas
+
+    @staticmethod
+    def _add(rows: Dict[Tuple, Dict[str, object]], key: Tuple, values: Dict[str, object]) -> None:
+        row = rows.setdefault(key, {})
+        for field, value in values.items():
+            row[field] = row.get(field, 0) + value
+
+    @classmethod
+    def _merge(cls, target: Deltas, other: Deltas) -> None:
+        for name, rows in other.items():
+            for key, values in rows.items():
+                cls._add(target[name], key, values)
+
+    def _apply(self, deltas: Deltas) -> None:
+        for name, rows in deltas.items():
+            # Вклады, взаимно погасившиеся при смене статуса, не пишем вовсе
+            rows = {key: values for key, values in rows.items() if any(values.values())}
+            if rows:
+                self._upsert_increment(name, rows)
+
+    @staticmethod
+    def _upsert_increment(name: str, rows: Dict[Tuple, Dict[str, object]]) -> None:
+        model, key_fields, sum_fields = TABLES[name]
+        table = connection.ops.quote_name(model._meta.db_table)
+        columns = [model._meta.get_field(field).column for field in key_fields + sum_fields]
+        quoted = [connection.ops.quote_name(column) for column in columns]
+
+        params = []
+        for key, values in rows.items():
+            params.append(connection.ops.adapt_datefield_value(key[0]))
+            params.extend(key[1:])
+            for field in sum_fields:
+                value = values.get(field, 0)
+                params.append(connection.ops.adapt_decimalfield_value(value) if isinstance(value, Decimal) else value)
+
+        placeholders = ', '.join(['(' + ', '.join(['%s'] * len(columns)) + ')'] * len(rows))
+        conflict = ', '.join(quoted[:len(key_fields)])
+        updates = ', '.join(f"{column} = {table}.{column} + excluded.{column}" for column in quoted[len(key_fields):])
+        sql = (
+            f"INSERT INTO {table} ({', '.join(quoted)}) VALUES {placeholders} "
+            f"ON CONFLICT ({conflict}) DO UPDATE SET {updates}"
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
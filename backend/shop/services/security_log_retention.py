@@ -0,0 +1,215 @@
+import logging
+import re
+from dataclasses import dataclass, asdict
+from datetime import date, datetime, time as dt_time, timedelta, timezone as dt_timezone
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from shop.models import SecurityBlockLog
+
+logger = logging.getLogger('shop')
+
+
+@dataclass
+class RetentionStats:
+    """Итог одного прогона обслуживания журнала."""
+    partitioned: bool = False
+    partitions_created: int = 0
+    partitions_dropped: int = 0
+    partitions_archived: int = 0
+    rows_deleted: int = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class SecurityLogRetentionService:
+    """
+    Срок хранения журнала нарушений (SecurityBlockLog).
+
+    Два режима:
+    - Обычная таблица (по умолчанию, и всегда вне Postgres): старые строки удаляются
+      пачками по индексу created_at, каждая пачка — короткая транзакция.
+    - Postgres, таблица секционирована по дням (PARTITION BY RANGE (created_at), включается
+      командой `security_log_partitions --convert`): старые дни убираются целиком через
+      DROP TABLE секции (или DETACH, если SECURITY_LOG_ARCHIVE_PARTITIONS — секция остается
+      отдельной таблицей для pg_dump), новые секции создаются заранее.
+
+    Секция DEFAULT ловит строки вне созданных диапазонов, чтобы вставка никогда не падала.
+    """
+
+    PARTITION_RE = re.compile(r'_p(\d{8})$')
+
+    def __init__(
+        self,
+        retention_days: Optional[int] = None,
+        days_ahead: Optional[int] = None,
+        archive: Optional[bool] = None,
+        batch_size: Optional[int] = None,
+    ):
+        self.retention_days = retention_days if retention_days is not None else settings.SECURITY_LOG_RETENTION_DAYS
+        self.days_ahead = days_ahead if days_ahead is not None else settings.SECURITY_LOG_PARTITION_DAYS_AHEAD
+        self.archive = archive if archive is not None else settings.SECURITY_LOG_ARCHIVE_PARTITIONS
+        self.batch_size = batch_size or settings.SECURITY_LOG_FLUSH_BATCH
+        self.table = SecurityBlockLog._meta.db_table
+
+    # --- Обслуживание (Celery Beat / команда) ---
+
+    def run(self) -> RetentionStats:
+        stats = RetentionStats(partitioned=self.is_partitioned())
+        cutoff_day = timezone.now().astimezone(dt_timezone.utc).date() - timedelta(days=self.retention_days)
+
+        if stats.partitioned:
+            stats.partitions_created = self.ensure_partitions()
+            for name, day in self.partitions():
+                if day < cutoff_day:
+                    self._retire_partition(name)
+                    if self.archive:
+                        stats.partitions_archived += 1
+                    else:
+                        stats.partitions_dropped += 1
+            # Строки, попавшие в DEFAULT (например, до создания секций), чистим обычным способом
+            stats.rows_deleted = self._delete_rows_before(cutoff_day, table=f'{self.table}_default')
+        else:
+            stats.rows_deleted = self._delete_rows_before(cutoff_day)
+
+        logger.info(f"Security log retention finished: {stats.as_dict()}")
+        return stats
+
+    def _delete_rows_before(self, cutoff_day: date, table: Optional[str] = None) -> int:
+        cutoff = datetime.combine(cutoff_day, dt_time.min, tzinfo=dt_timezone.utc)
+        deleted = 0
+        if table is None:
+            while True:
+                ids = list(
+                    SecurityBlockLog.objects.filter(created_at__lt=cutoff)
+                    .order_by('created_at').values_list('id', flat=True)[:self.batch_size]
+                )
+                if not ids:
+                    break
+                with transaction.atomic():
+                    deleted += SecurityBlockLog.objects.filter(id__in=ids).delete()[0]
+                if len(ids) < self.batch_size:
+                    break
+            return deleted
+
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM "{table}" WHERE created_at < %s', [cutoff])
+            return cursor.rowcount
+
+    # --- Секции (только Postgres) ---
+
+    def is_partitioned(self) -> bool:
+        if connection.vendor != 'postgresql':
+            return False
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT 1 FROM pg_partitioned_table pt
+                JOIN pg_class c ON c.oid = pt.partrelid
+                WHERE c.relname = %s AND c.relnamespace = 'public'::regnamespace
+                """,
+                [self.table],
+            )
+            return cursor.fetchone() is not None
+
+    def partitions(self) -> List[tuple]:
+        """[(имя секции, день)] для дневных секций (DEFAULT не входит)."""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT child.relname FROM pg_inherits
+                JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+                JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+                WHERE parent.relname = %s
+                """,
+                [self.table],
+            )
+            names = [row[0] for row in cursor.fetchall()]
+        result = []
+        for name in names:
+            match = self.PARTITION_RE.search(name)
+            if match:
+                result.append((name, datetime.strptime(match.group(1), '%Y%m%d').date()))
+        return sorted(result, key=lambda item: item[1])
+
+    def ensure_partitions(self, start: Optional[date] = None) -> int:
+        """Создает дневные секции от start (по умолчанию сегодня, UTC) на days_ahead дней вперед."""
+        today = timezone.now().astimezone(dt_timezone.utc).date()
+        start = start or today
+        existing = {day for _, day in self.partitions()}
+        created = 0
+        with connection.cursor() as cursor:
+            cursor.execute(f'CREATE TABLE IF NOT EXISTS "{self.table}_default" PARTITION OF "{self.table}" DEFAULT')
+            day = start
+            while day <= today + timedelta(days=self.days_ahead):
+                if day not in existing:
+                    cursor.execute(
+                        f'CREATE TABLE IF NOT EXISTS "{self._partition_name(day)}" PARTITION OF "{self.table}" '
+                        f'FOR VALUES FROM (%s) TO (%s)',
+                        [self._day_start(day), self._day_start(day + timedelta(days=1))],
+                    )
+                    created += 1
+                day += timedelta(days=1)
+        return created
+
+    def _retire_partition(self, name: str):
+        with connection.cursor() as cursor:
+            if self.archive:
+                cursor.execute(f'ALTER TABLE "{self.table}" DETACH PARTITION "{name}"')
+                cursor.execute(f'ALTER TABLE "{name}" RENAME TO "{name}_archived"')
+            else:
+                cursor.execute(f'DROP TABLE "{name}"')
+        logger.info(f"Security log partition {name} {'archived' if self.archive else 'dropped'}")
+
+    def convert_to_partitioned(self):
+        """
+        Однократно превращает таблицу журнала в секционированную по дням (Postgres 11+).
+        Первичный ключ становится (id, created_at) — у секционированной таблицы ключ обязан
+        включать ключ секционирования; id по-прежнему выдается одной последовательностью.
+        Таблица блокируется на время копирования — запускать в тихое окно.
+        """
+        if connection.vendor != 'postgresql':
+            raise RuntimeError("Секционирование журнала поддерживается только на PostgreSQL")
+        if self.is_partitioned():
+            return
+
+        old = f'{self.table}_old'
+        seq = f'{self.table}_part_id_seq'
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f'LOCK TABLE "{self.table}" IN ACCESS EXCLUSIVE MODE')
+            cursor.execute(f'ALTER TABLE "{self.table}" RENAME TO "{old}"')
+            cursor.execute(f'CREATE TABLE "{self.table}" (LIKE "{old}" INCLUDING DEFAULTS) PARTITION BY RANGE (created_at)')
+            cursor.execute(f'CREATE SEQUENCE IF NOT EXISTS "{seq}" OWNED BY "{self.table}".id')
+            cursor.execute(f'SELECT setval(%s, COALESCE((SELECT MAX(id) FROM "{old}"), 0) + 1, false)', [seq])
+            cursor.execute(f'ALTER TABLE "{self.table}" ALTER COLUMN id SET DEFAULT nextval(%s)', [seq])
+
+            cursor.execute(f'SELECT MIN(created_at) FROM "{old}"')
+            oldest = cursor.fetchone()[0]
+            today = timezone.now().astimezone(dt_timezone.utc).date()
+            first_day = max(
+                oldest.astimezone(dt_timezone.utc).date() if oldest else today,
+                today - timedelta(days=self.retention_days),
+            )
+            self.ensure_partitions(start=first_day)
+
+            cursor.execute(f'INSERT INTO "{self.table}" SELECT * FROM "{old}" WHERE created_at >= %s', [self._day_start(first_day)])
+            cursor.execute(f'DROP TABLE "{old}"')
+
+            # Ключ и индексы — после удаления старой таблицы (имена освободились) и после копирования
+            cursor.execute(f'ALTER TABLE "{self.table}" ADD PRIMARY KEY (id, created_at)')
+            # Индексы из Meta создаются на родительской таблице и наследуются секциями
+            with connection.schema_editor() as editor:
+                for index in SecurityBlockLog._meta.indexes:
+                    editor.add_index(SecurityBlockLog, index)
+        logger.info(f"Security log table {self.table} converted to daily partitions from {first_day}")
+
+    def _partition_name(self, day: date) -> str:
+        return f'{self.table}_p{day:%Y%m%d}'
+
+    @staticmethod
+    def _day_start(day: date) -> datetime:
+        return datetime.combine(day, dt_time.min, tzinfo=dt_timezone.utc)
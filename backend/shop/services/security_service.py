@@ -1,7 +1,8 @@
 import logging
 from django.conf import settings
-from ..models import BlacklistedItem, ShopSettings
-from ..telegram_notifications import format_security_alert_message, send_telegram_message
+from django.db import transaction
+from ..models import BlacklistedItem
+from ..telegram_notifications import format_security_alert_message, get_shop_settings, send_telegram_message
 
 logger = logging.getLogger(__name__)
 
@@ -52,18 +53,52 @@ class SecurityService:
                 pass
 
         if was_banned_now:
-            from django.core.cache import cache
-            cache.delete('blacklist_set')
             SecurityService.notify_admin(obj, count=1 if not duration_hours else "MANY", duration_hours=duration_hours or 0)
 
         return obj, was_banned_now
 
+    @staticmethod
+    def auto_ban(ip=None, telegram_id=None, count=0, hours=1):
+        """
+        Авто-бан за частые нарушения (429). Telegram ID важнее IP (IP бывает общим).
+        Если админ разбанил, а нарушения продолжаются — запись включается снова.
+        Уведомление уходит через Celery после коммита, чтобы не держать запрос.
+        Возвращает tuple: (BlacklistedItem, was_banned_now: bool)
+        """
+        if telegram_id:
+            subject_type, subject_value = BlacklistedItem.ItemType.TELEGRAM_ID, str(telegram_id)
+        elif ip:
+            subject_type, subject_value = BlacklistedItem.ItemType.IP, ip
+        else:
+            return None, False
+
+        obj, created = BlacklistedItem.objects.get_or_create(
+            item_type=subject_type,
+            value=subject_value,
+            defaults={
+                'reason': f"Auto-Ban: {count} нарушений за {hours}ч.",
+                'is_active': True
+            }
+        )
+        was_banned_now = created
+        if not created and not obj.is_active:
+            obj.is_active = True
+            obj.reason = f"Auto-Ban (Reactivated): {count} нарушений за {hours}ч."
+            obj.save(update_fields=['is_active', 'reason'])
+            was_banned_now = True
+
+        if was_banned_now:
+            from ..tasks import notify_security_ban_task
+            logger.warning(f"AUTO-BAN ACTIVATED: {subject_value} ({count} attacks)")
+            transaction.on_commit(lambda: notify_security_ban_task.delay(obj.id, count, hours))
+        return obj, was_banned_now
+
     @staticmethod
     def notify_admin(obj, count=1, duration_hours=1):
         """
         Отправляет алерт админу.
         """
-        settings_obj = ShopSettings.objects.first()
+        settings_obj = get_shop_settings()
         if not settings_obj or not settings_obj.manager_telegram_chat_id:
             return
 
@@ -0,0 +1,147 @@
+import logging
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple
+
+from django.db import connection
+
+from shop.models import Product
+
+logger = logging.getLogger('shop')
+
+
+class InsufficientStockError(Exception):
+    """Часть позиций заказа не удалось зарезервировать."""
+
+    def __init__(self, failed_lines):
+        self.failed_lines = failed_lines
+        super().__init__(f"Insufficient stock for products: {[line['product_id'] for line in failed_lines]}")
+
+
+@dataclass
+class ReservationResult:
+    """Итог резервирования: сколько списано по каждому товару и какие строки не прошли."""
+    reserved: Dict[int, int] = field(default_factory=dict)  # product_id -> списано со склада
+    failed: List[Dict] = field(default_factory=list)        # [{'product_id', 'requested', 'available'}]
+
+    @property
+    def ok(self) -> bool:
+        return not self.failed
+
+
+class StockReservationService:
+    """
+    Резервирование остатков при оформлении заказа ("Товар дня" с 10 шт. нельзя продать 11 раз).
+
+    Все строки заказа списываются ОДНИМ условным UPDATE:
+        UPDATE product SET stock_quantity = stock_quantity - v.qty
+        FROM (VALUES ...) v WHERE id = v.id AND stock_quantity >= v.qty
+    Проверка и списание атомарны на уровне строки, поэтому без select_for_update
+    на каждый товар и без оверсела. Вызывать внутри transaction.atomic() заказа.
+    """
+
+    def reserve(self, lines: Dict[int, int]) -> ReservationResult:
+        """
+        :param lines: {product_id: количество}
+        """
+        lines = {product_id: quantity for product_id, quantity in lines.items() if quantity > 0}
+        if not lines:
+            return ReservationResult()
+
+        reserved_ids = self._decrement(sorted(lines.items()))
+        result = ReservationResult(reserved={product_id: lines[product_id] for product_id in reserved_ids})
+
+        not_reserved = set(lines) - reserved_ids
+        if not_reserved:
+            # Остатка не хватило. Строка все равно проходит, если товар можно купить "под заказ":
+            # разрешен backorder или это предзаказ (как в Product.can_be_purchased).
+            products = Product.objects.filter(id__in=not_reserved).values(
+                'id', 'stock_quantity', 'allow_backorder', 'availability_status'
+            )
+            found = set()
+            for product in products:
+                found.add(product['id'])
+                if product['allow_backorder'] or product['availability_status'] == Product.AvailabilityStatus.PRE_ORDER:
+                    result.reserved[product['id']] = 0
+                    continue
+                result.failed.append({
+                    'product_id': product['id'],
+                    'requested': lines[product['id']],
+                    'available': product['stock_quantity'],
+                })
+            for product_id in sorted(not_reserved - found):
+                result.failed.append({'product_id': product_id, 'requested': lines[product_id], 'available': 0})
+
+        return result
+
+    def release(self, order) -> int:
+        """
+        Возвращает на склад все, что было зарезервировано под заказ (при отмене).
+        Повторный вызов безопасен: после возврата reserved_quantity обнуляется.
+        """
+        items = order.items.filter(reserved_quantity__gt=0)
+        totals = defaultdict(int)
+        for product_id, reserved_quantity in items.values_list('product_id', 'reserved_quantity'):
+            totals[product_id] += reserved_quantity
+        if not totals:
+            return 0
+
+        self._increment(sorted(totals.items()))
+        items.update(reserved_quantity=0)
+        logger.info(f"Stock released for Order #{order.pk}: {dict(totals)}")
+        return sum(totals.values())
+
+    # --- SQL ---
+
+    @staticmethod
+    def _values_cte(lines: List[Tuple[int, int]]):
+        placeholders = ', '.join(['(%s, %s)'] * len(lines))
+        params = [value for line in lines for value in line]
+        return f"v(id, qty) AS (VALUES {placeholders})", params
+
+    def _decrement(self, lines: List[Tuple[int, int]]) -> set:
+        table = connection.ops.quote_name(Product._meta.db_table)
+        values_cte, params = self._values_cte(lines)
+
+        if connection.vendor == 'postgresql':
+            # Порядок захвата блокировок в UPDATE ... FROM зависит от плана. Чтобы два заказа
+            # с одинаковыми товарами не взаимоблокировались, сначала берем блокировки
+            # в порядке id в том же выражении (CTE), затем условно списываем.
+            sql = f"""
+                WITH {values_cte},
+                locked AS (
+                    SELECT p.id FROM {table} AS p JOIN v ON v.id = p.id
+                    ORDER BY p.id FOR UPDATE OF p
+                )
+                UPDATE {table}
+                SET stock_quantity = {table}.stock_quantity - v.qty
+                FROM v JOIN locked ON locked.id = v.id
+                WHERE {table}.id = v.id AND {table}.stock_quantity >= v.qty
+                RETURNING {table}.id
+            """
+        else:
+            sql = f"""
+                WITH {values_cte}
+                UPDATE {table}
+                SET stock_quantity = {table}.stock_quantity - v.qty
+                FROM v
+                WHERE {table}.id = v.id AND {table}.stock_quantity >= v.qty
+                RETURNING {table}.id
+            """
+
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return {row[0] for row in cursor.fetchall()}
+
+    def _increment(self, lines: List[Tuple[int, int]]) -> None:
+        table = connection.ops.quote_name(Product._meta.db_table)
+        values_cte, params = self._values_cte(lines)
+        sql = f"""
+            WITH {values_cte}
+            UPDATE {table}
+            SET stock_quantity = {table}.stock_quantity + v.qty
+            FROM v
+            WHERE {table}.id = v.id
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
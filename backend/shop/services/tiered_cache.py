@@ -0,0 +1,196 @@
+import functools
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+logger = logging.getLogger('shop')
+
+VERSION_KEY = 'tiered:{name}:version'
+VALUE_KEY = 'tiered:{name}:{version}:{key}'
+
+_MISSING = object()
+
+
+def _fresh_version() -> int:
+    # Если ключ версии пропал (вытеснение Redis), новое значение не совпадет ни с одним старым
+    return int(time.time() * 1000)
+
+
+class TieredCache:
+    """
+    Двухуровневый кеш для маленьких, горячих и редко меняющихся объектов
+    (настройки магазина, правила скидок): LRU с TTL в памяти процесса (L1) перед общим кешем Redis (L2).
+
+    Сброс во всех процессах (воркеры gunicorn, Celery) — через ключ версии в Redis, как у черного списка:
+    процесс читает одно число не чаще раза в TIERED_CACHE_VERSION_CHECK_INTERVAL секунд и при смене
+    версии очищает свой L1. Версия входит в ключи L2, поэтому старые значения в Redis не читаются
+    и просто истекают. invalidate() вызывается сигналами после коммита (см. cached_instance / cached_queryset).
+
+    Без Redis работает только L1: устаревание ограничено TIERED_CACHE_L1_TTL.
+    Значения отдаются общими для всех вызовов — изменять их нельзя.
+    """
+
+    def __init__(self, name: str, l1_ttl: float = None, l2_ttl: int = None):
+        self.name = name
+        self._l1_ttl = l1_ttl
+        self._l2_ttl = l2_ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (value, expires_at)
+        self._version = None
+        self._checked_at = 0.0
+
+    @property
+    def l1_ttl(self) -> float:
+        return self._l1_ttl if self._l1_ttl is not None else settings.TIERED_CACHE_L1_TTL
+
+    @property
+    def l2_ttl(self) -> int:
+        return self._l2_ttl if self._l2_ttl is not None else settings.TIERED_CACHE_L2_TTL
+
+    def get(self, key: str, loader):
+        """Значение из L1, затем из L2; при промахе — loader() с записью в оба уровня."""
+        if not settings.TIERED_CACHE_ENABLED:
+            return loader()
+
+        version = self._sync_version()
+        value = self._get_local(key)
+        if value is not _MISSING:
+            return value
+
+        if version is not None:
+            try:
+                stored = cache.get(self._value_key(version, key))
+            except Exception as e:
+                logger.warning(f"Tiered cache {self.name}: L2 unavailable: {e}")
+                stored = None
+            if stored is not None:
+                # Значение обернуто в кортеж, чтобы отличать закешированный None от промаха
+                value = stored[0]
+
+        if value is _MISSING:
+            value = loader()
+            if version is not None:
+                try:
+                    cache.set(self._value_key(version, key), (value,), self.l2_ttl)
+                except Exception as e:
+                    logger.warning(f"Tiered cache {self.name}: L2 unavailable: {e}")
+
+        self._set_local(key, value, version)
+        return value
+
+    def invalidate(self):
+        """Сбрасывает кеш во всех процессах: новая версия в Redis и очистка своего L1."""
+        try:
+            cache.add(self._version_key(), _fresh_version(), timeout=None)
+            cache.incr(self._version_key())
+        except Exception as e:
+            logger.warning(f"Tiered cache {self.name}: version bump failed: {e}")
+        self.clear_local()
+
+    def clear_local(self):
+        with self._lock:
+            self._entries.clear()
+            self._version = None
+            self._checked_at = 0.0
+
+    # --- L1 ---
+
+    def _get_local(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return _MISSING
+            if entry[1] <= time.monotonic():
+                del self._entries[key]
+                return _MISSING
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def _set_local(self, key, value, version):
+        with self._lock:
+            if version != self._version:
+                # Пока грузили, версия сменилась — значение может быть старым, в L1 его не кладем
+                return
+            self._entries[key] = (value, time.monotonic() + self.l1_ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > settings.TIERED_CACHE_L1_MAX_ENTRIES:
+                self._entries.popitem(last=False)
+
+    def _sync_version(self):
+        now = time.monotonic()
+        with self._lock:
+            if self._checked_at and now - self._checked_at < settings.TIERED_CACHE_VERSION_CHECK_INTERVAL:
+                return self._version
+
+        try:
+            version = cache.get(self._version_key())
+            if version is None:
+                cache.add(self._version_key(), _fresh_version(), timeout=None)
+                version = cache.get(self._version_key())
+        except Exception as e:
+            logger.warning(f"Tiered cache {self.name}: version check failed: {e}")
+            # Без Redis — только L1 (версия None), устаревание ограничено его TTL
+            version = None
+
+        with self._lock:
+            if version != self._version:
+                self._entries.clear()
+                self._version = version
+            self._checked_at = now
+            return version
+
+    # --- Ключи ---
+
+    def _version_key(self) -> str:
+        return VERSION_KEY.format(name=self.name)
+
+    def _value_key(self, version, key) -> str:
+        return VALUE_KEY.format(name=self.name, version=version, key=key)
+
+
+def _cached(name, depends_on, evaluate, l1_ttl, l2_ttl):
+    tiered = TieredCache(name, l1_ttl=l1_ttl, l2_ttl=l2_ttl)
+
+    def invalidate_on_commit(sender, **kwargs):
+        # После коммита: иначе другой процесс успеет закешировать еще не измененные данные
+        transaction.on_commit(tiered.invalidate)
+
+    for model in depends_on:
+        # model — класс или строка 'app_label.Model' (сигналы моделей подключаются лениво)
+        label = model if isinstance(model, str) else model._meta.label
+        post_save.connect(invalidate_on_commit, sender=model, weak=False, dispatch_uid=f'tiered_{name}_{label}_save')
+        post_delete.connect(invalidate_on_commit, sender=model, weak=False, dispatch_uid=f'tiered_{name}_{label}_delete')
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args):
+            key = ':'.join(map(str, args)) or '-'
+            return tiered.get(key, lambda: evaluate(func(*args)))
+
+        wrapper.cache = tiered
+        wrapper.invalidate = tiered.invalidate
+        return wrapper
+
+    return decorator
+
+
+def cached_instance(name: str, depends_on=(), l1_ttl: float = None, l2_ttl: int = None):
+    """
+    Кеширует объект модели (или None), который возвращает функция, — например синглтон настроек.
+    Аргументы функции (если есть) входят в ключ. Изменение моделей из depends_on сбрасывает кеш.
+    """
+    return _cached(name, depends_on, lambda obj: obj, l1_ttl, l2_ttl)
+
+
+def cached_queryset(name: str, depends_on=(), l1_ttl: float = None, l2_ttl: int = None):
+    """
+    Как cached_instance, но функция возвращает QuerySet: кешируется вычисленный список объектов
+    (вместе с select_related / prefetch_related).
+    """
+    return _cached(name, depends_on, list, l1_ttl, l2_ttl)
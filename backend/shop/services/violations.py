@@ -0,0 +1,163 @@
+import json
+import logging
+import time
+from datetime import datetime, timezone as dt_timezone
+from typing import Optional
+
+from django.conf import settings
+
+logger = logging.getLogger('shop')
+
+LOG_BUFFER_KEY = 'security:log_buffer'
+COUNTER_KEY = 'security:violations:{subject}:{bucket}'
+BAN_GUARD_KEY = 'security:autoban:{subject}'
+FLUSH_GUARD_KEY = 'security:log_flush_queued'
+
+
+class ViolationTracker:
+    """
+    Учет нарушений лимитов (429) без записи в БД на каждый запрос.
+
+    - Счетчик на IP / Telegram ID — скользящее окно из двух корзин в Redis
+      (текущая + взвешенная предыдущая): O(1) памяти на субъекта при любом потоке атак.
+    - Решение об авто-бане принимается сразу по счетчику, без Celery и COUNT(*) по журналу.
+    - Строки журнала копятся в списке Redis и пишутся в SecurityBlockLog пачками bulk_create
+      (flush_security_logs_task) — журнал для разбора инцидентов остается полным.
+
+    Если Redis недоступен — пишем одну строку журнала напрямую, авто-бан пропускаем.
+    """
+
+    # --- Запись нарушения (из обработчика исключений) ---
+
+    def record(self, ip: Optional[str], telegram_id: Optional[str], path: str, limit_type: str):
+        entry = {
+            'ip_address': ip,
+            'telegram_id': telegram_id,
+            'request_path': path[:255],
+            'limit_type': limit_type[:50],
+            'ts': time.time(),
+        }
+        try:
+            self._buffer(entry)
+        except Exception as e:
+            logger.warning(f"Violation buffer unavailable, writing log row directly: {e}")
+            self._write_rows([entry])
+            return
+        try:
+            self._check_autoban(ip, telegram_id)
+        except Exception as e:
+            logger.error(f"Auto-ban check failed: {e}")
+
+    def _buffer(self, entry):
+        from shop.redis_client import get_redis
+
+        r = get_redis()
+        pipe = r.pipeline()
+        pipe.rpush(LOG_BUFFER_KEY, json.dumps(entry))
+        # Под очень долгой атакой буфер не растет бесконечно: храним самые свежие записи
+        pipe.ltrim(LOG_BUFFER_KEY, -settings.SECURITY_LOG_BUFFER_MAX, -1)
+        length, _ = pipe.execute()
+        # Набралась пачка — сбрасываем, не дожидаясь beat. Порог, а не кратность: у полного буфера
+        # длина после RPUSH всегда MAX + 1. Одна задача в очереди за раз (флаг снимает flush)
+        if length >= settings.SECURITY_LOG_FLUSH_BATCH and r.set(
+            FLUSH_GUARD_KEY, 1, nx=True, ex=settings.SECURITY_LOG_FLUSH_GUARD_SECONDS,
+        ):
+            from shop.tasks import flush_security_logs_task
+            flush_security_logs_task.delay()
+
+    def _check_autoban(self, ip, telegram_id):
+        shop_settings = self._autoban_settings()
+        if not shop_settings or not shop_settings['enabled']:
+            return
+        # Telegram ID важнее IP (IP бывает общим у многих клиентов)
+        subject = f"tg:{telegram_id}" if telegram_id else f"ip:{ip}" if ip else None
+        if subject is None:
+            return
+
+        window = shop_settings['hours'] * 3600
+        count = self.increment(subject, window)
+        if count < shop_settings['threshold']:
+            return
+
+        from shop.redis_client import get_redis
+        from .security_service import SecurityService
+
+        # Конкурентные запросы того же субъекта банят один раз; дальше его остановит BlacklistMiddleware
+        if get_redis().set(BAN_GUARD_KEY.format(subject=subject), 1, nx=True, ex=60):
+            SecurityService.auto_ban(ip=ip, telegram_id=telegram_id, count=int(count), hours=shop_settings['hours'])
+
+    def increment(self, subject: str, window: int) -> float:
+        """+1 нарушение; возвращает оценку числа нарушений за последние window секунд."""
+        from shop.redis_client import get_redis
+
+        now = time.time()
+        bucket = int(now // window)
+        pipe = get_redis().pipeline()
+        current_key = COUNTER_KEY.format(subject=subject, bucket=bucket)
+        pipe.incr(current_key)
+        pipe.expire(current_key, window * 2)
+        pipe.get(COUNTER_KEY.format(subject=subject, bucket=bucket - 1))
+        current, _, previous = pipe.execute()
+        elapsed = (now % window) / window
+        return current + int(previous or 0) * (1 - elapsed)
+
+    @staticmethod
+    def _autoban_settings():
+        """Настройки авто-бана из ShopSettings (двухуровневый кеш, см. cached_models.shop_settings)."""
+        from shop.services.cached_models import shop_settings
+
+        obj = shop_settings()
+        return obj and {
+            'enabled': obj.auto_ban_enabled,
+            'threshold': obj.auto_ban_threshold,
+            'hours': max(1, obj.auto_ban_hours),
+        }
+
+    @staticmethod
+    def reset():
+        from shop.services.cached_models import shop_settings
+
+        shop_settings.cache.clear_local()
+
+    # --- Сброс буфера в БД (Celery) ---
+
+    def flush(self) -> int:
+        """Забирает буфер пачками и пишет через bulk_create. Возвращает число записанных строк."""
+        from shop.redis_client import get_redis
+
+        batch = settings.SECURITY_LOG_FLUSH_BATCH
+        r = get_redis()
+        total = 0
+        while True:
+            pipe = r.pipeline()  # MULTI/EXEC: забрать и удалить пачку атомарно
+            pipe.lrange(LOG_BUFFER_KEY, 0, batch - 1)
+            pipe.ltrim(LOG_BUFFER_KEY, batch, -1)
+            raw, _ = pipe.execute()
+            if not raw:
+                break
+            total += self._write_rows([json.loads(item) for item in raw])
+            if len(raw) < batch:
+                break
+        r.delete(FLUSH_GUARD_KEY)
+        return total
+
+    @staticmethod
+    def _write_rows(entries) -> int:
+        from shop.models import SecurityBlockLog
+
+        rows = [
+            SecurityBlockLog(
+                ip_address=entry['ip_address'],
+                telegram_id=entry['telegram_id'],
+                request_path=entry['request_path'],
+                limit_type=entry['limit_type'],
+                created_at=datetime.fromtimestamp(entry['ts'], tz=dt_timezone.utc),
+            )
+            for entry in entries
+            if entry.get('ip_address')
+        ]
+        SecurityBlockLog.objects.bulk_create(rows, batch_size=settings.SECURITY_LOG_FLUSH_BATCH)
+        return len(rows)
+
+
+violation_tracker = ViolationTracker()
@@ -1,12 +1,16 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, pre_save, pre_delete, post_delete
 from django.dispatch import receiver
+from django.apps import apps
 from django.db import transaction
 from django.conf import settings
 import requests
 import logging
 
-from .models import ProductImage, PromoBanner, Product
+from .models import ProductImage, PromoBanner, Product, Order, Article, FaqItem, ShopSettings, ShopImage, Category
+from .storage import content_addressed_fields
 from .tasks import process_image_task
+# Регистрирует сброс двухуровневого кеша (depends_on в декораторах) в каждом процессе
+from .services import cached_models  # noqa: F401
 
 logger = logging.getLogger('shop')
 
@@ -74,3 +78,162 @@ def trigger_product_revalidation(sender, instance, created, **kwargs):
     """
     # Используем on_commit, чтобы запрос ушел только после того, как данные реально записались в БД
     transaction.on_commit(lambda: revalidate_product(instance.slug))
+
+
+# --- ARTICLE VIEWS SIGNALS ---
+
+@receiver(post_save, sender=Article)
+@receiver(post_delete, sender=Article)
+def invalidate_published_article_ids(sender, instance, **kwargs):
+    """Сбрасывает карту slug -> id опубликованных статей для счетчика просмотров."""
+    from .services.article_views import article_view_counter
+    transaction.on_commit(article_view_counter.invalidate_published_ids)
+
+
+@receiver(post_save, sender=Article)
+def process_article_content(sender, instance, **kwargs):
+    """Пересчитывает время чтения, анонс, оглавление и картинки, если изменилось содержимое."""
+    from .services.article_content import schedule_article_processing
+    schedule_article_processing(instance)
+
+
+# --- CONTENT SEARCH SIGNALS ---
+
+@receiver(post_save, sender=Article)
+@receiver(post_save, sender=FaqItem)
+def update_content_search_vector(sender, instance, **kwargs):
+    """Пересчитывает tsvector для поиска по статьям и FAQ (одним UPDATE, только PostgreSQL)."""
+    from .services.content_search import update_search_vector
+    update_search_vector(instance)
+
+
+# --- BOOTSTRAP CACHE SIGNALS ---
+
+BOOTSTRAP_PARTS_BY_MODEL = {
+    ShopSettings: 'settings',
+    ShopImage: 'settings',
+    Category: 'categories',
+    PromoBanner: 'banners',
+    FaqItem: 'faq',
+    Product: 'deal',
+}
+
+
+def bump_bootstrap_generation(sender, **kwargs):
+    """Сбрасывает часть /api/bootstrap/, собранную из этой модели (после коммита, чтобы не пересобрать старое)."""
+    from .services.bootstrap import bump_generation
+    part = BOOTSTRAP_PARTS_BY_MODEL[sender]
+    transaction.on_commit(lambda: bump_generation(part))
+
+
+for _model in BOOTSTRAP_PARTS_BY_MODEL:
+    post_save.connect(bump_bootstrap_generation, sender=_model, dispatch_uid=f'bootstrap_{_model.__name__}_save')
+    post_delete.connect(bump_bootstrap_generation, sender=_model, dispatch_uid=f'bootstrap_{_model.__name__}_delete')
+
+
+# --- STOCK RESERVATION SIGNALS ---
+
+@receiver(pre_save, sender=Order)
+def remember_previous_order_status(sender, instance, **kwargs):
+    """
+    Запоминаем статус заказа до сохранения, чтобы в post_save отличить переход статуса
+    (например, в 'Отменен') от повторного сохранения.
+    """
+    if instance.pk:
+        instance._previous_status = Order.objects.filter(pk=instance.pk).values_list('status', flat=True).first()
+    else:
+        instance._previous_status = None
+
+
+@receiver(post_save, sender=Order)
+def release_stock_on_cancel(sender, instance, created, **kwargs):
+    """
+    При отмене заказа возвращаем зарезервированные остатки на склад.
+    Выполняется в той же транзакции, что и смена статуса.
+    """
+    if created or instance.status != Order.OrderStatus.CANCELED:
+        return
+    if getattr(instance, '_previous_status', None) == Order.OrderStatus.CANCELED:
+        return
+
+    from .services.stock import StockReservationService
+    StockReservationService().release(instance)
+
+
+# --- SALES ROLLUP SIGNALS ---
+
+@receiver(post_save, sender=Order)
+def update_sales_rollups(sender, instance, created, **kwargs):
+    """
+    Инкрементально обновляет дневные роллапы продаж (дашборд админки).
+    Новый заказ учитывается после фиксации транзакции — к этому моменту его позиции уже сохранены
+    (и из API, и из инлайнов админки). Смена статуса учитывается в той же транзакции.
+    """
+    from .services.sales_rollup import SalesRollupService
+
+    if created:
+        instance._rollup_pending = True
+        order_id = instance.pk
+
+        def record():
+            instance._rollup_pending = False
+            # Заказ уже зафиксирован: ошибка роллапа не должна превращать ответ в 500
+            # (клиент повторил бы запрос и создал дубль). Расхождение исправит ночной rebuild
+            try:
+                order = Order.objects.filter(pk=order_id).first()
+                if order:
+                    SalesRollupService().record_order(order)
+            except Exception:
+                logger.exception(f"Sales rollup: failed to record order #{order_id}")
+        transaction.on_commit(record)
+        return
+
+    previous_status = getattr(instance, '_previous_status', None)
+    # Пока первичная запись не выполнена, она сама учтет актуальный статус
+    if getattr(instance, '_rollup_pending', False) or previous_status is None:
+        return
+    SalesRollupService().change_status(instance, previous_status, instance.status)
+
+
+@receiver(pre_delete, sender=Order)
+def remove_order_from_sales_rollups(sender, instance, **kwargs):
+    """Удаление заказа вычитает его вклад, пока позиции еще на месте."""
+    from .services.sales_rollup import SalesRollupService
+    SalesRollupService().remove_order(instance)
+
+
+# --- CONTENT-ADDRESSED MEDIA SIGNALS ---
+
+def remember_replaced_blobs(sender, instance, raw=False, **kwargs):
+    """
+    В поле хранилища по содержимому загружается новый файл: запоминаем прежнее имя из базы
+    (см. release_reuploaded_blob_references).
+    """
+    if raw or instance._state.adding:
+        return
+    uploads = [field.attname for field in content_addressed_fields(sender)
+               if getattr(instance, field.attname) and not getattr(instance, field.attname)._committed]
+    if uploads:
+        instance._replaced_blobs = sender.objects.filter(pk=instance.pk).values(*uploads).first() or {}
+
+
+def release_reuploaded_blob_references(sender, instance, raw=False, **kwargs):
+    """
+    Загрузили те же байты, что уже лежат в поле: storage.save добавил ссылку на тот же блоб,
+    а django-cleanup не видит смены имени и прежнюю ссылку не снимает. Снимаем ее сами (после коммита).
+    """
+    replaced = instance.__dict__.pop('_replaced_blobs', None)
+    if raw or not replaced:
+        return
+    for attname, old_name in replaced.items():
+        file = getattr(instance, attname)
+        if old_name and file.name == old_name:
+            transaction.on_commit(lambda storage=file.storage, name=old_name: storage.delete(name))
+
+
+for _model in apps.get_app_config('shop').get_models():
+    if content_addressed_fields(_model):
+        pre_save.connect(remember_replaced_blobs, sender=_model, dispatch_uid=f'cas_{_model.__name__}_pre_save')
+        post_save.connect(
+            release_reuploaded_blob_references, sender=_model, dispatch_uid=f'cas_{_model.__name__}_post_save',
+        )
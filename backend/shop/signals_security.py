@@ -1,14 +1,14 @@
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
-from .models import SecurityBlockLog
-from .tasks import check_and_autoban_task
+from .models import BlacklistedItem
+from .services.blacklist import BlacklistService
 
-@receiver(post_save, sender=SecurityBlockLog)
-def trigger_security_check(sender, instance, created, **kwargs):
+@receiver(post_save, sender=BlacklistedItem)
+@receiver(post_delete, sender=BlacklistedItem)
+def bump_blacklist_version(sender, instance, **kwargs):
     """
-    При каждой записи о нарушении (429) запускаем асинхронную проверку.
+    Любое изменение черного списка (бан, разбан в админке, автобан) — новая версия.
+    После коммита, чтобы воркеры не перечитали список до того, как изменение видно в БД.
     """
-    if created:
-        # Запускаем Celery-задачу
-        # Используем delay() для асинхронности
-        check_and_autoban_task.delay(instance.ip_address, instance.telegram_id)
+    transaction.on_commit(BlacklistService.bump_version)
@@ -0,0 +1,193 @@
+import fcntl
+import hashlib
+import os
+import shutil
+import uuid
+from contextlib import contextmanager
+
+from django.core.files.storage import FileSystemStorage
+
+# Каталог блобов внутри MEDIA_ROOT. URL /media/cas/... неизменяемы: nginx отдает их с immutable
+BLOB_DIR = 'cas'
+# Счетчики ссылок и блокировки — рядом, но закрыты от раздачи (location /media/cas/.refs/ в nginx)
+REFS_DIR = f'{BLOB_DIR}/.refs'
+TMP_DIR = f'{BLOB_DIR}/.tmp'
+# 128 бит sha256 — столько же, сколько в токенах загрузок: коллизия на практике невозможна
+HASH_LENGTH = 32
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Медиа каталога, адресованные содержимым: файл хранится один раз под именем
+    cas/<2 символа хеша>/<sha256>.<расширение>, сколько бы записей на него ни ссылалось.
+
+    - save(): повторная загрузка тех же байт (то же фото в двух товарах, копия товара)
+      не пишет второй файл, а добавляет ссылку на существующий блоб.
+    - clone(): ссылка на уже сохраненный файл без чтения и записи байт (дублирование товара).
+      Файл из старого каталога (до перехода на CAS) переносится жесткой ссылкой — тоже без копирования.
+    - delete(): снимает одну ссылку, блоб удаляется вместе с последней. django-cleanup
+      вызывает delete при замене и удалении файла — общий блоб при этом не пропадает у соседей.
+      Повторную загрузку тех же байт в то же поле (имя не меняется, django-cleanup молчит)
+      отрабатывает release_reuploaded_blob_references в signals.py.
+
+    Имя файла однозначно определяет содержимое, поэтому URL можно кешировать навсегда.
+    Счетчики меняются под блокировкой (flock) на корзину блобов: save и delete из разных
+    процессов gunicorn/Celery не теряют ссылки.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # Итоговое имя выбирает _save по содержимому; подбирать свободное имя не нужно
+        return name
+
+    def _save(self, name, content):
+        extension = os.path.splitext(name)[1].lower()
+        tmp_path = self.path(f'{TMP_DIR}/{uuid.uuid4().hex}')
+        os.makedirs(os.path.dirname(tmp_path), exist_ok=True)
+        digest = hashlib.sha256()
+        try:
+            with open(tmp_path, 'wb') as tmp:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    tmp.write(chunk)
+            blob_name = self._blob_name(digest.hexdigest(), extension)
+            with self._locked(blob_name):
+                blob_path = self.path(blob_name)
+                if not os.path.exists(blob_path):
+                    os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+                    os.chmod(tmp_path, self.file_permissions_mode or 0o644)
+                    os.replace(tmp_path, blob_path)
+                self._change_references(blob_name, +1)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return blob_name
+
+    def delete(self, name):
+        if not self.is_blob(name):
+            return super().delete(name)
+        with self._locked(name):
+            if self._change_references(name, -1) == 0:
+                super().delete(name)
+
+    def clone(self, name: str) -> str:
+        """Еще одна ссылка на файл без копирования байт. Возвращает имя блоба."""
+        if not self.is_blob(name):
+            return self._adopt(name)
+        with self._locked(name):
+            if not os.path.exists(self.path(name)):
+                raise FileNotFoundError(name)
+            self._change_references(name, +1)
+        return name
+
+    def is_blob(self, name: str) -> bool:
+        return bool(name) and name.startswith(f'{BLOB_DIR}/') and not name.startswith(f'{REFS_DIR}/') \
+            and not name.startswith(f'{TMP_DIR}/')
+
+    def references(self, name: str) -> int:
+        try:
+            with open(self._refs_path(name)) as f:
+                return int(f.read() or 0)
+        except FileNotFoundError:
+            return 0
+
+    def references_updated_at(self, name: str) -> float:
+        """Время последнего изменения счетчика (или появления блоба) — timestamp."""
+        refs_path = self._refs_path(name)
+        return os.path.getmtime(refs_path if os.path.exists(refs_path) else self.path(name))
+
+    def set_references(self, name: str, count: int):
+        """Выставляет счетчик (сверка с базой, manage.py dedupe_media). 0 — блоб удаляется."""
+        with self._locked(name):
+            self._change_references(name, count - self.references(name))
+            if count == 0:
+                super().delete(name)
+
+    def blobs(self):
+        """Имена всех блобов (для сверки счетчиков)."""
+        root = self.path(BLOB_DIR)
+        if not os.path.isdir(root):
+            return
+        for bucket in sorted(os.listdir(root)):
+            if bucket.startswith('.'):
+                continue
+            for filename in sorted(os.listdir(os.path.join(root, bucket))):
+                yield f'{BLOB_DIR}/{bucket}/{filename}'
+
+    # --- Внутреннее ---
+
+    def _adopt(self, name: str) -> str:
+        """Файл вне CAS: хеш по содержимому, блоб — жесткая ссылка на тот же inode (fallback — копия)."""
+        path = self.path(name)
+        digest = hashlib.sha256()
+        with self.open(name) as f:
+            for chunk in f.chunks():
+                digest.update(chunk)
+        blob_name = self._blob_name(digest.hexdigest(), os.path.splitext(name)[1].lower())
+        with self._locked(blob_name):
+            blob_path = self.path(blob_name)
+            if not os.path.exists(blob_path):
+                os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+                try:
+                    os.link(path, blob_path)
+                except OSError:
+                    # Другая файловая система или запрет жестких ссылок
+                    shutil.copy2(path, blob_path)
+            self._change_references(blob_name, +1)
+        return blob_name
+
+    @staticmethod
+    def _blob_name(hexdigest: str, extension: str) -> str:
+        digest = hexdigest[:HASH_LENGTH]
+        return f'{BLOB_DIR}/{digest[:2]}/{digest}{extension}'
+
+    def _refs_path(self, name: str) -> str:
+        return self.path(f'{REFS_DIR}/{name[len(BLOB_DIR) + 1:]}')
+
+    def _change_references(self, name: str, delta: int) -> int:
+        """Только под _locked. Возвращает новое значение; 0 — счетчик удален."""
+        count = max(0, self.references(name) + delta)
+        refs_path = self._refs_path(name)
+        if count == 0:
+            if os.path.exists(refs_path):
+                os.remove(refs_path)
+            return 0
+        with open(refs_path, 'w') as f:
+            f.write(str(count))
+        return count
+
+    @contextmanager
+    def _locked(self, name: str):
+        # Одна блокировка на корзину (первые 2 символа хеша); файлы блокировок не удаляются,
+        # иначе процесс мог бы дождаться блокировки уже удаленного файла
+        bucket_dir = os.path.dirname(self._refs_path(name))
+        os.makedirs(bucket_dir, exist_ok=True)
+        with open(os.path.join(bucket_dir, '.lock'), 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def content_addressed_fields(model):
+    """Файловые поля модели, хранящиеся в ContentAddressedStorage."""
+    from django.db.models import FileField
+
+    return [
+        field for field in model._meta.get_fields()
+        if isinstance(field, FileField) and isinstance(field.storage, ContentAddressedStorage)
+    ]
+
+
+def clone_file(storage, name: str) -> str:
+    """
+    Имя для еще одной записи, ссылающейся на тот же файл: в CAS — ссылка без копирования,
+    в обычном хранилище — копия (иначе django-cleanup удалит файл у обеих записей).
+    """
+    if isinstance(storage, ContentAddressedStorage):
+        return storage.clone(name)
+    with storage.open(name) as f:
+        return storage.save(name, f)
+
+
+media_storage = ContentAddressedStorage()
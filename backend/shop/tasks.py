@@ -1,30 +1,78 @@
 from celery import shared_task
 from .models import Order
-from .telegram_notifications import send_order_notification, send_telegram_message, format_security_alert_message
+from .telegram_client import TelegramRetryLater
+from .telegram_notifications import (
+    format_orders_digest_message,
+    format_security_alert_message,
+    get_shop_settings,
+    pop_digest_order_ids,
+    queue_order_for_digest,
+    send_order_notification,
+    send_telegram_message,
+)
 import logging
 
 logger = logging.getLogger(__name__)
 
-@shared_task
-def send_order_notification_task(order_id):
+@shared_task(bind=True, max_retries=5)
+def send_order_notification_task(self, order_id):
     """
     Асинхронная задача для отправки уведомления о заказе.
+    Под нагрузкой заказ может уйти в дайджест (см. queue_order_for_digest).
+    Если Telegram просит подождать дольше разумного — задача перезапускается с countdown.
     :param order_id: ID заказа
     """
     try:
-        order = Order.objects.get(id=order_id)
-        result = send_order_notification(order)
+        if queue_order_for_digest(order_id):
+            logger.info(f"Order #{order_id} queued for Telegram digest.")
+            return True
+        order = Order.objects.prefetch_related('items__product').get(id=order_id)
+        result = send_order_notification(order, get_shop_settings(), raise_on_retry_later=True)
         if result:
             logger.info(f"Notification for Order #{order_id} sent successfully via Celery.")
         else:
             logger.warning(f"Notification for Order #{order_id} failed via Celery.")
         return result
+    except TelegramRetryLater as e:
+        raise self.retry(countdown=e.retry_after)
     except Order.DoesNotExist:
         logger.error(f"Order #{order_id} not found in send_order_notification_task.")
         return False
     except Exception as e:
         logger.error(f"Error in send_order_notification_task for Order #{order_id}: {e}")
         return False
+
+
+@shared_task(bind=True, max_retries=5)
+def flush_order_digest_task(self, order_ids=None):
+    """
+    Отправляет накопленные за окно заказы одним сообщением.
+    order_ids передаются только при повторе (уже забраны из Redis).
+    """
+    if order_ids is None:
+        order_ids = pop_digest_order_ids()
+    if not order_ids:
+        return 0
+
+    shop_settings = get_shop_settings()
+    if not shop_settings or not shop_settings.manager_telegram_chat_id:
+        logger.warning("manager_telegram_chat_id не указан. Дайджест заказов не отправлен.")
+        return 0
+
+    orders = list(Order.objects.filter(id__in=order_ids).prefetch_related('items').order_by('id'))
+    if not orders:
+        return 0
+    try:
+        send_telegram_message(
+            shop_settings.manager_telegram_chat_id,
+            format_orders_digest_message(orders),
+            raise_on_retry_later=True,
+        )
+    except TelegramRetryLater as e:
+        raise self.retry(args=[order_ids], countdown=e.retry_after)
+    return len(orders)
+
+
 @shared_task
 def process_image_task(model_name, instance_id):
     """
@@ -32,17 +80,10 @@ def process_image_task(model_name, instance_id):
     :param model_name: Имя модели ('ProductImage' или 'PromoBanner')
     :param instance_id: ID записи
     """
-    from .models import ProductImage, PromoBanner
-    from .image_processing import optimize_image_file
-    from django.core.files.base import ContentFile
+    from .image_processing import OPTIMIZED_IMAGE_MODELS, optimize_image_file
+    from django.apps import apps
 
-    # Словарь поддерживаемых моделей
-    model_map = {
-        'ProductImage': ProductImage,
-        'PromoBanner': PromoBanner
-    }
-    
-    ModelClass = model_map.get(model_name)
+    ModelClass = apps.get_model('shop', model_name) if model_name in OPTIMIZED_IMAGE_MODELS else None
     if not ModelClass:
         logger.error(f"Unknown model for image processing: {model_name}")
         return
@@ -59,9 +100,12 @@ def process_image_task(model_name, instance_id):
         if result:
             new_filename, content = result
             # Сохраняем новый файл поверх старого (или создаем новый, Django разрулит имя)
-            instance.image.save(new_filename, content, save=False)
+            try:
+                instance.image.save(new_filename, content, save=False)
+            finally:
+                content.close()  # временный файл на диске
             instance.save(update_fields=['image'])
-            
+
             logger.info(f"Image for {model_name} #{instance_id} optimized successfully.")
         
     except ModelClass.DoesNotExist:
@@ -198,82 +242,171 @@ logger = logging.getLogger(__name__)
 @shared_task
 def check_and_autoban_task(ip_address, telegram_id):
     """
-    Проверяет, не пора ли забанить пользователя за частые нарушения (429).
+    Проверяет, не пора ли забанить пользователя за частые нарушения (429), по журналу в БД.
+    Штатно решение принимается сразу в запросе по счетчикам Redis (services.violations);
+    задача осталась для уже поставленных в очередь сообщений.
     """
-    from .models import SecurityBlockLog, BlacklistedItem, ShopSettings
+    from .models import SecurityBlockLog
+    from .services.security_service import SecurityService
     from django.utils import timezone
     from datetime import timedelta
-    from django.db.models import Count
 
     try:
-        settings = ShopSettings.objects.first()
+        settings = get_shop_settings()
         if not settings or not settings.auto_ban_enabled:
             return
 
-        threshold = settings.auto_ban_threshold
         hours = settings.auto_ban_hours
-        time_threshold = timezone.now() - timedelta(hours=hours)
-
-        # 1. Формируем QuerySet
-        logs = SecurityBlockLog.objects.filter(created_at__gte=time_threshold)
-        
-        count = 0
-        subject_type = None
-        subject_value = None
-
+        logs = SecurityBlockLog.objects.filter(created_at__gte=timezone.now() - timedelta(hours=hours))
         if telegram_id:
             count = logs.filter(telegram_id=telegram_id).count()
-            subject_type = BlacklistedItem.ItemType.TELEGRAM_ID
-            subject_value = telegram_id
         elif ip_address:
             count = logs.filter(ip_address=ip_address).count()
-            subject_type = BlacklistedItem.ItemType.IP
-            subject_value = ip_address
-            
-        # 2. Проверяем порог
-        if count >= threshold:
-            # 3. Баним (если еще не забанен)
-            obj, created = BlacklistedItem.objects.get_or_create(
-                item_type=subject_type,
-                value=subject_value,
-                defaults={
-                    'reason': f"Auto-Ban: {count} нарушений за {hours}ч.",
-                    'is_active': True
-                }
-            )
-
-            # 4. Уведомляем (только если только что забанили)
-            if created:
-                logger.warning(f"AUTO-BAN ACTIVATED: {subject_value} ({count} attacks)")
-                
-                if settings.manager_telegram_chat_id:
-                    msg = format_security_alert_message(
-                        ip=ip_address if subject_type == 'IP' else None,
-                        telegram_id=telegram_id if subject_type == 'TG' else None,
-                        count=count,
-                        reason=obj.reason,
-                        duration_hours=hours,
-                        blacklist_id=obj.id
-                    )
-                    send_telegram_message(settings.manager_telegram_chat_id, msg)
-            else:
-                # Если уже был в базе, но был неактивен - включаем обратно?
-                # Логика: если админ разбанил, а он опять атакует - баним снова.
-                if not obj.is_active:
-                    obj.is_active = True
-                    obj.reason = f"Auto-Ban (Reactivated): {count} нарушений за {hours}ч."
-                    obj.save()
-                    
-                    if settings.manager_telegram_chat_id:
-                        msg = format_security_alert_message(
-                            ip=ip_address if subject_type == 'IP' else None,
-                            telegram_id=telegram_id if subject_type == 'TG' else None,
-                            count=count,
-                            reason=obj.reason,
-                            duration_hours=hours,
-                            blacklist_id=obj.id
-                        )
-                        send_telegram_message(settings.manager_telegram_chat_id, msg)
+        else:
+            return
+
+        if count >= settings.auto_ban_threshold:
+            SecurityService.auto_ban(ip=ip_address, telegram_id=telegram_id, count=count, hours=hours)
 
     except Exception as e:
         logger.error(f"Error in check_and_autoban_task: {e}")
+
+
+@shared_task
+def notify_security_ban_task(blacklist_id, count, hours):
+    """Алерт админу в Telegram об авто-бане (вынесен из запроса, который принял решение о бане)."""
+    from .models import BlacklistedItem
+    from .services.security_service import SecurityService
+
+    obj = BlacklistedItem.objects.filter(id=blacklist_id).first()
+    if obj:
+        SecurityService.notify_admin(obj, count=count, duration_hours=hours)
+
+
+@shared_task
+def flush_security_logs_task():
+    """Переносит буфер нарушений из Redis в SecurityBlockLog пачками bulk_create (Celery Beat + по заполнению)."""
+    from .services.violations import violation_tracker
+    return violation_tracker.flush()
+
+
+@shared_task
+def flush_article_views_task():
+    """Переносит просмотры статей из Redis в Article.views_count одним пакетным UPDATE (Celery Beat)."""
+    from .services.article_views import article_view_counter
+    return article_view_counter.flush()
+
+
+@shared_task
+def process_article_content_task(article_id):
+    """Обработка содержимого большой статьи (время чтения, анонс, оглавление, картинки) после сохранения."""
+    from .models import Article
+    from .services.article_content import ArticleContentProcessor, content_hash
+
+    article = Article.objects.filter(id=article_id).first()
+    if article is None or article.content_hash == content_hash(article):
+        return False
+    return ArticleContentProcessor().apply(article)
+
+
+@shared_task
+def process_editor_image_task(token):
+    """Полное перекодирование картинки из TinyMCE и подмена превью (см. EditorImageService)."""
+    from .services.editor_images import editor_image_service
+
+    return editor_image_service.finalize(token)
+
+
+@shared_task
+def maintain_security_log_task():
+    """
+    Срок хранения журнала атак (запускается Celery Beat): старые дневные секции — DROP/DETACH,
+    новые создаются заранее; для несекционированной таблицы — удаление пачками.
+    """
+    from .services.security_log_retention import SecurityLogRetentionService
+    return SecurityLogRetentionService().run().as_dict()
+
+
+@shared_task
+def cleanup_stale_carts_task():
+    """
+    Периодическая очистка пустых и брошенных корзин (запускается Celery Beat).
+    Возвращает метрики прогона (сколько корзин и товаров удалено).
+    """
+    from .services.cart_cleanup import CartCleanupService
+
+    stats = CartCleanupService().run()
+    return stats.as_dict()
+
+
+@shared_task
+def rebuild_recent_sales_rollups_task():
+    """
+    Ночная пересборка роллапов продаж за последние SALES_ROLLUP_REBUILD_DAYS дней.
+    Подбирает то, что инкрементальные обновления не видят (правки позиций и сумм заказа в админке).
+    """
+    from datetime import timedelta
+    from django.conf import settings
+    from django.utils import timezone
+    from .services.sales_rollup import SalesRollupService
+
+    date_from = timezone.localdate() - timedelta(days=settings.SALES_ROLLUP_REBUILD_DAYS - 1)
+    return SalesRollupService().rebuild(date_from=date_from)
+
+
+@shared_task
+def export_orders_task(export_id):
+    """
+    Фоновый экспорт большой выборки заказов в CSV.gz (media/exports/orders/).
+    Выборка собирается заново по критериям, сохраненным в OrderExport, и читается потоково.
+    Файл пишется потоково во временный файл, затем сохраняется в хранилище;
+    по готовности менеджеру уходит уведомление в Telegram со ссылкой на скачивание в админке.
+    """
+    import tempfile
+    import uuid
+    from datetime import datetime
+    from django.conf import settings
+    from django.core.files import File
+    from django.urls import reverse
+    from .models import OrderExport
+    from .services.order_export import OrderExportService
+
+    try:
+        export = OrderExport.objects.get(id=export_id)
+    except OrderExport.DoesNotExist:
+        logger.warning(f"OrderExport #{export_id} not found.")
+        return
+
+    try:
+        export.status = 'processing'
+        export.save(update_fields=['status'])
+
+        queryset = OrderExportService.queryset_for(export)
+        orders_count = queryset.count()
+        with tempfile.TemporaryFile() as tmp:
+            rows_count = OrderExportService().write_gzip_csv(queryset, tmp)
+            tmp.seek(0)
+            # Случайная часть имени: media раздается напрямую, ссылку нельзя угадать
+            filename = f"orders_{datetime.now():%Y-%m-%d_%H-%M}_{uuid.uuid4().hex}.csv.gz"
+            export.file.save(filename, File(tmp), save=False)
+
+        export.status = 'success'
+        export.orders_count = orders_count
+        export.rows_count = rows_count
+        export.log = f"Готово {datetime.now():%Y-%m-%d %H:%M}: заказов {orders_count}, строк {rows_count}"
+        export.save()
+        logger.info(f"OrderExport #{export_id} completed: {rows_count} rows.")
+    except Exception as e:
+        logger.error(f"OrderExport #{export_id} failed: {e}", exc_info=True)
+        export.status = 'failed'
+        export.log = str(e)
+        export.save(update_fields=['status', 'log'])
+        return
+
+    shop_settings = get_shop_settings()
+    if shop_settings and shop_settings.manager_telegram_chat_id:
+        download_url = settings.SITE_URL + reverse('admin:shop_orderexport_download', args=[export.pk])
+        send_telegram_message(
+            shop_settings.manager_telegram_chat_id,
+            f"📦 <b>Экспорт заказов готов</b>\nЗаказов: {export.orders_count}, строк: {export.rows_count}\n{download_url}"
+        )
@@ -0,0 +1,199 @@
+# shop/telegram_client.py
+"""
+Исходящий клиент Telegram Bot API для уведомлений.
+
+- Постоянная HTTP-сессия с пулом соединений (keep-alive) на процесс.
+- Token bucket в Redis (общий для всех воркеров Celery): глобальный лимит бота и лимит на чат.
+  Без Redis — локальный bucket в процессе.
+- Повторы с экспоненциальной задержкой на 429 (с учетом retry_after) и 5xx/сетевые ошибки.
+  Если ждать нужно дольше TELEGRAM_MAX_INLINE_WAIT, бросается TelegramRetryLater —
+  задача Celery перезапускает себя с countdown вместо того, чтобы держать воркер.
+"""
+import logging
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+API_URL = "https://api.telegram.org/bot{token}/{method}"
+REQUEST_TIMEOUT = 10  # секунды
+
+# Атомарный token bucket: пополнение по времени Redis (TIME), списание одного токена.
+# Возвращает, сколько секунд подождать (0 — токен выдан).
+TOKEN_BUCKET_LUA = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return tostring(wait)
+"""
+
+
+class TelegramRetryLater(Exception):
+    """Telegram просит подождать дольше, чем разумно ждать внутри воркера."""
+
+    def __init__(self, retry_after):
+        self.retry_after = retry_after
+        super().__init__(f"Telegram is rate limiting, retry after {retry_after}s")
+
+
+class LocalTokenBucket:
+    """Запасной bucket в памяти процесса (когда Redis недоступен)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state = {}
+
+    def take(self, key, rate, capacity):
+        with self._lock:
+            now = time.monotonic()
+            tokens, ts = self._state.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - ts) * rate)
+            if tokens >= 1:
+                self._state[key] = (tokens - 1, now)
+                return 0.0
+            self._state[key] = (tokens, now)
+            return (1 - tokens) / rate
+
+
+class TelegramClient:
+    def __init__(self, token=None):
+        self.token = token if token is not None else getattr(settings, 'TELEGRAM_BOT_TOKEN', None)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=10)
+        self.session.mount('https://', adapter)
+        self._local_bucket = LocalTokenBucket()
+        self._redis_script = None
+
+    # --- Публичный API ---
+
+    def send_message(self, chat_id, text, parse_mode="HTML", raise_on_retry_later=False):
+        """
+        Отправляет сообщение с учетом лимитов и повторами.
+        :return: True если доставлено, False если ошибка (ошибки логируются, не пробрасываются)
+        :raises TelegramRetryLater: только при raise_on_retry_later=True
+        """
+        if not self.token:
+            logger.warning("TELEGRAM_BOT_TOKEN не настроен. Уведомление не отправлено.")
+            return False
+
+        payload = {
+            "chat_id": chat_id,
+            "text": text,
+            "parse_mode": parse_mode,
+            "disable_web_page_preview": True,
+        }
+        try:
+            return self._call('sendMessage', payload, chat_id)
+        except TelegramRetryLater:
+            if raise_on_retry_later:
+                raise
+            logger.error(f"Telegram rate limit: сообщение в чат {chat_id} не отправлено")
+            return False
+
+    # --- Внутреннее ---
+
+    def _call(self, method, payload, chat_id):
+        url = API_URL.format(token=self.token, method=method)
+        max_retries = settings.TELEGRAM_MAX_RETRIES
+
+        for attempt in range(max_retries + 1):
+            self._acquire(chat_id)
+            retry_after = None
+            try:
+                response = self.session.post(url, json=payload, timeout=REQUEST_TIMEOUT)
+            except requests.exceptions.RequestException as e:
+                logger.warning(f"Ошибка сети Telegram (попытка {attempt + 1}, chat_id={chat_id}): {e}")
+            else:
+                if response.status_code == 200:
+                    logger.info(f"Telegram уведомление успешно отправлено в чат {chat_id}")
+                    return True
+                if response.status_code == 429:
+                    retry_after = self._retry_after(response)
+                elif response.status_code < 500:
+                    # 400/403: неверный chat_id, бот заблокирован — повтор не поможет
+                    logger.error(f"Ошибка Telegram API: {response.status_code} - {response.text}")
+                    return False
+                logger.warning(f"Telegram API {response.status_code} (попытка {attempt + 1}, chat_id={chat_id})")
+
+            if attempt == max_retries:
+                break
+            delay = retry_after if retry_after is not None else self._backoff(attempt)
+            if delay > settings.TELEGRAM_MAX_INLINE_WAIT:
+                raise TelegramRetryLater(delay)
+            time.sleep(delay)
+
+        logger.error(f"Telegram: сообщение в чат {chat_id} не доставлено после {max_retries + 1} попыток")
+        return False
+
+    @staticmethod
+    def _retry_after(response):
+        try:
+            return float(response.json().get('parameters', {}).get('retry_after', 1))
+        except ValueError:
+            return 1.0
+
+    @staticmethod
+    def _backoff(attempt):
+        # 0.5, 1, 2, 4... секунд + джиттер, чтобы воркеры не повторяли синхронно
+        return 0.5 * (2 ** attempt) + random.uniform(0, 0.25)
+
+    def _acquire(self, chat_id):
+        """Ждет токен в обоих bucket'ах: глобальном (бот) и чата."""
+        # Группы/каналы: отрицательный id или @username — у них лимит жестче
+        is_group = str(chat_id).startswith(('-', '@'))
+        chat_rate = settings.TELEGRAM_GROUP_CHAT_RATE if is_group else settings.TELEGRAM_PRIVATE_CHAT_RATE
+        buckets = (
+            ('tg:bucket:global', settings.TELEGRAM_GLOBAL_RATE, settings.TELEGRAM_GLOBAL_RATE),
+            (f'tg:bucket:chat:{chat_id}', chat_rate, 1),
+        )
+        deadline = time.monotonic() + settings.TELEGRAM_MAX_INLINE_WAIT
+        for key, rate, capacity in buckets:
+            while True:
+                wait = self._take(key, rate, capacity)
+                if wait <= 0:
+                    break
+                if time.monotonic() + wait > deadline:
+                    raise TelegramRetryLater(wait)
+                time.sleep(wait)
+
+    def _take(self, key, rate, capacity):
+        try:
+            if self._redis_script is None:
+                from .redis_client import get_redis
+                self._redis_script = get_redis().register_script(TOKEN_BUCKET_LUA)
+            return float(self._redis_script(keys=[key], args=[rate, capacity]))
+        except Exception as e:
+            logger.debug(f"Redis token bucket unavailable, using local: {e}")
+            return self._local_bucket.take(key, rate, capacity)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_telegram_client():
+    """Один клиент (и одна HTTP-сессия) на процесс."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = TelegramClient()
+    return _client
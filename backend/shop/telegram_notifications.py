@@ -3,25 +3,29 @@
 Модуль для отправки уведомлений о заказах в Telegram.
 """
 import logging
-import requests
+import time
 from django.conf import settings
 
+from .telegram_client import TelegramRetryLater, get_telegram_client
+
 logger = logging.getLogger(__name__)
 
-TELEGRAM_API_URL = "https://api.telegram.org/bot{token}/sendMessage"
-REQUEST_TIMEOUT = 10  # секунды
+_SETTINGS_NOT_LOADED = object()
 
 
 def get_shop_settings():
-    """Получает настройки магазина (синглтон)."""
-    from .models import ShopSettings
-    return ShopSettings.objects.first()
+    """Получает настройки магазина (синглтон, из двухуровневого кеша)."""
+    from .services.cached_models import shop_settings
+    return shop_settings()
 
 
-def format_order_message(order):
+def format_order_message(order, shop_settings=_SETTINGS_NOT_LOADED):
     """
     Форматирует сообщение о заказе для отправки в Telegram.
     Использует HTML-разметку для красивого отображения.
+
+    shop_settings можно передать уже загруженными, чтобы не запрашивать их повторно;
+    позиции лучше загрузить заранее через prefetch_related('items__product').
     """
     # Собираем список товаров
     items_text = ""
@@ -45,7 +49,7 @@ def format_order_message(order):
 
     # Определяем статус бесплатной доставки
     delivery_status_suffix = ""
-    settings_obj = get_shop_settings()
+    settings_obj = get_shop_settings() if shop_settings is _SETTINGS_NOT_LOADED else shop_settings
     if settings_obj and settings_obj.free_shipping_threshold:
         threshold = settings_obj.free_shipping_threshold
         # Если порог > 0, проверяем сумму
@@ -94,48 +98,23 @@ def format_order_message(order):
     return message
 
 
-def send_telegram_message(chat_id, text, parse_mode="HTML"):
+def send_telegram_message(chat_id, text, parse_mode="HTML", raise_on_retry_later=False):
     """
-    Отправляет сообщение через Telegram Bot API.
+    Отправляет сообщение через Telegram Bot API (общий клиент с пулом соединений,
+    лимитами и повторами — см. telegram_client).
     
     :param chat_id: ID чата получателя
     :param text: Текст сообщения
     :param parse_mode: Режим парсинга (HTML или Markdown)
+    :param raise_on_retry_later: пробросить TelegramRetryLater вместо False (для retry задачи Celery)
     :return: True если успешно, False если ошибка
     """
-    token = getattr(settings, 'TELEGRAM_BOT_TOKEN', None)
-    
-    if not token:
-        logger.warning("TELEGRAM_BOT_TOKEN не настроен. Уведомление не отправлено.")
-        return False
-    
-    url = TELEGRAM_API_URL.format(token=token)
-    payload = {
-        "chat_id": chat_id,
-        "text": text,
-        "parse_mode": parse_mode,
-        "disable_web_page_preview": True
-    }
-    
-    try:
-        response = requests.post(url, json=payload, timeout=REQUEST_TIMEOUT)
-        
-        if response.status_code == 200:
-            logger.info(f"Telegram уведомление успешно отправлено в чат {chat_id}")
-            return True
-        else:
-            logger.error(f"Ошибка Telegram API: {response.status_code} - {response.text}")
-            return False
-            
-    except requests.exceptions.Timeout:
-        logger.error(f"Таймаут при отправке в Telegram (chat_id={chat_id})")
-        return False
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Ошибка при отправке в Telegram: {e}")
-        return False
+    return get_telegram_client().send_message(
+        chat_id, text, parse_mode=parse_mode, raise_on_retry_later=raise_on_retry_later
+    )
 
 
-def send_order_notification(order):
+def send_order_notification(order, shop_settings=_SETTINGS_NOT_LOADED, raise_on_retry_later=False):
     """
     Главная функция: отправляет уведомление о новом заказе менеджеру.
     
@@ -143,10 +122,12 @@ def send_order_notification(order):
     чтобы не влиять на процесс создания заказа.
     
     :param order: Объект Order
+    :param shop_settings: уже загруженные ShopSettings (иначе загрузятся здесь)
     :return: True если отправлено успешно, False если ошибка или не настроено
     """
     try:
-        shop_settings = get_shop_settings()
+        if shop_settings is _SETTINGS_NOT_LOADED:
+            shop_settings = get_shop_settings()
         
         if not shop_settings:
             logger.warning("ShopSettings не найдены. Уведомление не отправлено.")
@@ -158,14 +139,92 @@ def send_order_notification(order):
             logger.warning("manager_telegram_chat_id не указан. Уведомление не отправлено.")
             return False
         
-        message = format_order_message(order)
-        return send_telegram_message(chat_id, message)
+        message = format_order_message(order, shop_settings)
+        return send_telegram_message(chat_id, message, raise_on_retry_later=raise_on_retry_later)
         
+    except TelegramRetryLater:
+        raise
     except Exception as e:
         logger.error(f"Неожиданная ошибка при отправке уведомления о заказе #{order.id}: {e}")
         return False
 
 
+# --- Дайджест заказов под нагрузкой ---
+# Если за окно TELEGRAM_DIGEST_WINDOW заказов больше порога, остальные заказы окна
+# не шлются по одному, а копятся в списке Redis и уходят одним сообщением.
+
+DIGEST_COUNTER_KEY = 'tg:digest:count:{window}'
+DIGEST_QUEUE_KEY = 'tg:digest:orders'
+DIGEST_SCHEDULED_KEY = 'tg:digest:scheduled'
+
+
+def queue_order_for_digest(order_id):
+    """
+    Решает, слать заказ сразу или отложить в дайджест.
+    :return: True — заказ поставлен в дайджест (и flush запланирован, если нужно);
+             False — отправлять отдельным сообщением (в т.ч. если Redis недоступен).
+    """
+    if not settings.TELEGRAM_DIGEST_ENABLED:
+        return False
+
+    from .redis_client import get_redis
+    from .tasks import flush_order_digest_task
+
+    window = settings.TELEGRAM_DIGEST_WINDOW
+    try:
+        r = get_redis()
+        counter_key = DIGEST_COUNTER_KEY.format(window=int(time.time()) // window)
+        pipe = r.pipeline()
+        pipe.incr(counter_key)
+        pipe.expire(counter_key, window * 2)
+        count, _ = pipe.execute()
+        if count <= settings.TELEGRAM_DIGEST_THRESHOLD:
+            return False
+
+        r.rpush(DIGEST_QUEUE_KEY, order_id)
+        # Один flush на окно: кто первым поставил флаг, тот и планирует задачу
+        if r.set(DIGEST_SCHEDULED_KEY, 1, nx=True, ex=window * 2):
+            flush_order_digest_task.apply_async(countdown=window)
+        return True
+    except Exception as e:
+        logger.warning(f"Дайджест недоступен, заказ #{order_id} уйдет отдельно: {e}")
+        return False
+
+
+def pop_digest_order_ids():
+    """Атомарно забирает накопленные id заказов и снимает флаг запланированного flush."""
+    from .redis_client import get_redis
+
+    pipe = get_redis().pipeline()  # transaction=True: MULTI/EXEC
+    pipe.lrange(DIGEST_QUEUE_KEY, 0, -1)
+    pipe.delete(DIGEST_QUEUE_KEY)
+    pipe.delete(DIGEST_SCHEDULED_KEY)
+    raw_ids, _, _ = pipe.execute()
+    return [int(order_id) for order_id in raw_ids]
+
+
+def format_orders_digest_message(orders):
+    """Короткая сводка по нескольким заказам одним сообщением (позиции — через prefetch)."""
+    lines = []
+    total = 0
+    site_url = getattr(settings, 'SITE_URL', '')
+    admin_path = getattr(settings, 'ADMIN_URL', 'admin/')
+    for order in orders:
+        total += order.final_total
+        label = f"#{order.id}"
+        if site_url:
+            label = f"<a href=\"{site_url}/{admin_path}shop/order/{order.id}/change/\">#{order.id}</a>"
+        positions = len(order.items.all())
+        lines.append(f"• {label} — {order.get_full_name()}, {positions} поз., {order.final_total:,.0f} ₽")
+
+    items = "\n".join(lines)
+    return f"""🛒 <b>НОВЫЕ ЗАКАЗЫ: {len(orders)}</b>
+
+{items}
+
+💵 <b>Итого:</b> {total:,.0f} ₽"""
+
+
 def format_security_alert_message(ip, telegram_id, count, reason, duration_hours, blacklist_id=None):
     """
     Форматирует сообщение о блокировке злоумышленника.
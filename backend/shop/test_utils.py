@@ -0,0 +1,130 @@
+"""Общее для тестов shop: переопределения настроек и поддельный Redis."""
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+# DRF без троттлинга (иначе тесты упираются в лимиты), обработчик ошибок — как в проде
+NO_THROTTLE_REST_FRAMEWORK = {
+    'DEFAULT_THROTTLE_CLASSES': [],
+    'EXCEPTION_HANDLER': 'shop.exceptions.custom_exception_handler',
+}
+
+
+class FakeRedis:
+    """
+    Команды Redis, которые используют сервисы shop (без TTL), в одном словаре data:
+    строки — bytes, списки — list, хеши — dict, HyperLogLog — точное множество, ZSET — dict.
+    Подставляется через mock.patch('shop.redis_client.get_redis', return_value=FakeRedis()).
+    """
+
+    def __init__(self):
+        self.data = {}
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    # --- Строки и ключи ---
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def mget(self, keys):
+        return [self.data.get(key) for key in keys]
+
+    def set(self, key, value, ex=None, nx=False):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value if isinstance(value, bytes) else str(value).encode()
+        return True
+
+    def mset(self, mapping):
+        for key, value in mapping.items():
+            self.set(key, value)
+
+    def incr(self, key, amount=1):
+        value = int(self.data.get(key, 0)) + amount
+        self.data[key] = str(value).encode()
+        return value
+
+    def exists(self, key):
+        return int(key in self.data)
+
+    def expire(self, key, seconds):
+        return True
+
+    def delete(self, *keys):
+        return sum(self.data.pop(key, None) is not None for key in keys)
+
+    def scan_iter(self, match):
+        prefix = match.rstrip('*')
+        return [key.encode() for key in self.data if key.startswith(prefix)]
+
+    # --- Списки ---
+
+    def rpush(self, key, value):
+        self.data.setdefault(key, []).append(value.encode())
+        return len(self.data[key])
+
+    def ltrim(self, key, start, end):
+        items = self.data.get(key, [])
+        end = len(items) if end == -1 else end + 1
+        self.data[key] = items[start:end] if start >= 0 else items[max(0, len(items) + start):end]
+        return True
+
+    def lrange(self, key, start, end):
+        return list(self.data.get(key, [])[start:end + 1])
+
+    # --- Хеши ---
+
+    def hincrby(self, key, field, amount):
+        bucket = self.data.setdefault(key, {})
+        field = str(field).encode()
+        bucket[field] = int(bucket.get(field, 0)) + amount
+        return bucket[field]
+
+    def hset(self, key, mapping):
+        self.data.setdefault(key, {}).update({str(k).encode(): str(v).encode() for k, v in mapping.items()})
+        return len(mapping)
+
+    def hgetall(self, key):
+        return dict(self.data.get(key, {}))
+
+    # --- HyperLogLog ---
+
+    def pfadd(self, key, value):
+        self.data.setdefault(key, set()).add(value)
+        return 1
+
+    def pfcount(self, key):
+        return len(self.data.get(key, ()))
+
+    # --- Упорядоченные множества ---
+
+    def zadd(self, key, mapping):
+        self.data.setdefault(key, {}).update(mapping)
+        return len(mapping)
+
+    def zrem(self, key, member):
+        return int(self.data.get(key, {}).pop(member, None) is not None)
+
+    def zremrangebyscore(self, key, low, high):
+        return 0
+
+    def zcard(self, key):
+        return len(self.data.get(key, {}))
+
+
+class FakePipeline:
+    """Копит команды и выполняет их по execute(), как MULTI/EXEC."""
+
+    def __init__(self, redis):
+        self.redis = redis
+        self.calls = []
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.calls.append((name, args, kwargs))
+            return self
+        return queue
+
+    def execute(self):
+        return [getattr(self.redis, name)(*args, **kwargs) for name, args, kwargs in self.calls]
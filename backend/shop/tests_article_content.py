@@ -0,0 +1,145 @@
+import shutil
+import tempfile
+from io import BytesIO
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from shop.models import Article
+from shop.services.article_content import ArticleContentProcessor
+from shop.tasks import process_article_content_task
+from shop.test_utils import LOCMEM_CACHES, NO_THROTTLE_REST_FRAMEWORK
+
+
+@override_settings(
+    CACHES=LOCMEM_CACHES, MEDIA_URL='/media/', ARTICLE_IMAGE_WIDTHS=[480, 800], ARTICLE_EXCERPT_LENGTH=40,
+    REST_FRAMEWORK=NO_THROTTLE_REST_FRAMEWORK,
+)
+class ArticleContentTestCase(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        patcher = override_settings(MEDIA_ROOT=media_root)
+        patcher.enable()
+        self.addCleanup(patcher.disable)
+
+        output = BytesIO()
+        Image.new('RGB', (1200, 600), 'white').save(output, format='WEBP')
+        self.image_name = default_storage.save('articles/content/photo.webp', ContentFile(output.getvalue()))
+
+    def content(self):
+        return (
+            '<p>Зеленый чай &amp; улун: как заваривать</p>'
+            '<h2>Вода</h2><p>Температура воды важна.</p>'
+            f'<p><img src="https://shop.example/media/{self.image_name}" alt="Чайник"></p>'
+            '<h3>Посуда</h3><script>var ignored = "слова";</script>'
+            '<h2>Вода</h2><img src="https://cdn.example/other.jpg">'
+        )
+
+    def test_pipeline_output(self):
+        article = Article(title='Чай', content=self.content())
+        result = ArticleContentProcessor().process(article)
+
+        self.assertEqual(result.toc, [
+            {'level': 2, 'id': 'voda', 'title': 'Вода'},
+            {'level': 3, 'id': 'posuda', 'title': 'Посуда'},
+            {'level': 2, 'id': 'voda-2', 'title': 'Вода'},
+        ])
+        self.assertIn('<h2 id="voda-2">Вода</h2>', result.html)
+        # script не считается, сущности — текст
+        self.assertEqual(result.word_count, 12)
+        self.assertEqual(result.reading_time, 1)
+        self.assertEqual(result.excerpt, 'Зеленый чай & улун: как заваривать Вода…')
+
+        local = (
+            f'<img src="https://shop.example/media/{self.image_name}" alt="Чайник" width="1200" height="600" '
+            'srcset="https://shop.example/media/articles/content/photo_480w.webp 480w, '
+            'https://shop.example/media/articles/content/photo_800w.webp 800w, '
+            f'https://shop.example/media/{self.image_name} 1200w" '
+            'sizes="(max-width: 1200px) 100vw, 1200px" loading="eager" decoding="async">'
+        )
+        self.assertIn(local, result.html)
+        self.assertTrue(default_storage.exists('articles/content/photo_800w.webp'))
+        # Чужие картинки не трогаем, кроме ленивой загрузки
+        self.assertIn('<img src="https://cdn.example/other.jpg" loading="lazy" decoding="async">', result.html)
+
+    def test_small_article_is_processed_on_save_and_read_without_parsing(self):
+        article = Article.objects.create(title='Чай', slug='tea', status=Article.Status.PUBLISHED, content=self.content())
+
+        article.refresh_from_db()
+        self.assertEqual(article.reading_time, 1)
+        self.assertEqual(len(article.toc), 3)
+
+        with mock.patch('shop.services.article_content.ArticleContentProcessor.process') as process:
+            response = self.client.get(reverse('article-detail', kwargs={'slug': 'tea'}))
+            article.save()  # содержимое не менялось — повторно не обрабатываем
+        process.assert_not_called()
+        self.assertEqual(response.data['content'], article.rendered_content)
+        self.assertEqual(response.data['toc'][0]['id'], 'voda')
+
+        response = self.client.get(reverse('article-list'))
+        self.assertEqual(response.data['articles']['results'][0]['excerpt'], article.excerpt)
+
+    @override_settings(ARTICLE_INLINE_PROCESSING_LIMIT=10)
+    def test_big_article_is_processed_in_celery(self):
+        with mock.patch('shop.tasks.process_article_content_task.delay') as delay, \
+                self.captureOnCommitCallbacks(execute=True):
+            article = Article.objects.create(title='Чай', slug='tea', status=Article.Status.PUBLISHED, content=self.content())
+
+        delay.assert_called_once_with(article.pk)
+        article.refresh_from_db()
+        self.assertEqual(article.rendered_content, '')
+        # Пока обработка не прошла, API отдает исходный HTML
+        response = self.client.get(reverse('article-detail', kwargs={'slug': 'tea'}))
+        self.assertEqual(response.data['content'], article.content)
+
+        self.assertTrue(process_article_content_task(article.pk))
+        article.refresh_from_db()
+        self.assertEqual(article.word_count, 12)
+        self.assertFalse(process_article_content_task(article.pk))
+
+    def test_edited_big_article_does_not_serve_previous_version(self):
+        article = Article.objects.create(title='Чай', slug='tea', status=Article.Status.PUBLISHED, content=self.content())
+        article.refresh_from_db()
+        self.assertEqual(len(article.toc), 3)
+
+        article.content = '<h2>Новый текст</h2><p>Другая статья.</p>'
+        with override_settings(ARTICLE_INLINE_PROCESSING_LIMIT=10), \
+                mock.patch('shop.tasks.process_article_content_task.delay') as delay, \
+                self.captureOnCommitCallbacks(execute=True):
+            article.save()
+
+        delay.assert_called_once_with(article.pk)
+        response = self.client.get(reverse('article-detail', kwargs={'slug': 'tea'}))
+        self.assertEqual(response.data['content'], article.content)
+        self.assertEqual(response.data['toc'], [])
+
+        self.assertTrue(process_article_content_task(article.pk))
+        response = self.client.get(reverse('article-detail', kwargs={'slug': 'tea'}))
+        self.assertEqual(response.data['toc'], [{'level': 2, 'id': 'novyij-tekst', 'title': 'Новый текст'}])
+
+    def test_migration_fills_text_fields_of_existing_articles(self):
+        from importlib import import_module
+        from django.apps import apps
+
+        article = Article.objects.create(title='Чай', slug='tea', content=self.content())
+        Article.objects.filter(pk=article.pk).update(word_count=0, reading_time=0, excerpt='')
+
+        with mock.patch('shop.services.article_content.ContentImageResizer.describe') as describe:
+            import_module('shop.migrations.0046_article_text_summary_backfill').fill_text_summary(apps, None)
+        describe.assert_not_called()
+
+        article.refresh_from_db()
+        self.assertEqual((article.word_count, article.reading_time), (12, 1))
+        self.assertEqual(article.excerpt, 'Зеленый чай & улун: как заваривать Вода…')
+
+    def test_external_article_has_no_reading_time(self):
+        article = Article.objects.create(
+            title='Ссылка', content_type=Article.ContentType.EXTERNAL, external_url='https://example.com', content='<p>Текст</p>'
+        )
+        article.refresh_from_db()
+        self.assertEqual((article.reading_time, article.rendered_content), (0, ''))
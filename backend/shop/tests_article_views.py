@@ -0,0 +1,88 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from shop.models import Article
+from shop.services.article_views import PENDING_KEY, article_view_counter
+from shop.tasks import flush_article_views_task
+from shop.test_utils import FakeRedis, LOCMEM_CACHES, NO_THROTTLE_REST_FRAMEWORK
+
+
+@override_settings(
+    CACHES=LOCMEM_CACHES,
+    REST_FRAMEWORK=NO_THROTTLE_REST_FRAMEWORK,
+)
+class ArticleViewCounterTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.article = Article.objects.create(title='Как выбрать чай', slug='tea', status=Article.Status.PUBLISHED)
+        cls.other = Article.objects.create(title='Про кофе', slug='coffee', status=Article.Status.PUBLISHED, views_count=10)
+        cls.draft = Article.objects.create(title='Черновик', slug='draft')
+
+    def setUp(self):
+        cache.clear()
+        self.redis = FakeRedis()
+        patcher = mock.patch('shop.redis_client.get_redis', return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def view(self, slug, **extra):
+        return self.client.post(reverse('article-increment-view', kwargs={'slug': slug}), **extra)
+
+    def test_views_do_not_touch_database(self):
+        self.view('tea')  # карта slug -> id загружается один раз
+        with self.assertNumQueries(0):
+            self.assertEqual(self.view('tea', REMOTE_ADDR='198.51.100.1').status_code, 200)
+            self.assertEqual(self.view('tea', HTTP_X_SESSION_ID='s1').status_code, 200)
+
+        self.article.refresh_from_db()
+        self.assertEqual(self.article.views_count, 0)
+        self.assertEqual(self.redis.data[PENDING_KEY], {str(self.article.id).encode(): 3})
+
+    def test_flush_applies_deltas_in_one_statement(self):
+        for ip in ('198.51.100.1', '198.51.100.1', '198.51.100.2'):
+            self.view('tea', REMOTE_ADDR=ip)
+        self.view('coffee')
+
+        with self.assertNumQueries(3):  # SAVEPOINT + один UPDATE на все статьи + RELEASE
+            self.assertEqual(flush_article_views_task(), 2)
+
+        self.article.refresh_from_db()
+        self.other.refresh_from_db()
+        self.assertEqual((self.article.views_count, self.article.unique_views_count), (3, 2))
+        self.assertEqual(self.other.views_count, 11)
+        self.assertNotIn(PENDING_KEY, self.redis.data)
+        self.assertEqual(flush_article_views_task(), 0)
+
+        # Сортировка по просмотрам видит сброшенные значения
+        response = self.client.get(reverse('article-list'), {'ordering': '-views_count'})
+        self.assertEqual([a['slug'] for a in response.data['articles']['results']], ['coffee', 'tea'])
+
+    def test_unpublished_and_unknown_articles_are_not_counted(self):
+        self.assertEqual(self.view('draft').status_code, 404)
+        self.assertEqual(self.view('missing').status_code, 404)
+        self.assertNotIn(PENDING_KEY, self.redis.data)
+
+    def test_publishing_invalidates_slug_map(self):
+        self.assertEqual(self.view('draft').status_code, 404)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.draft.status = Article.Status.PUBLISHED
+            self.draft.save()
+        self.assertEqual(self.view('draft').status_code, 200)
+
+    def test_failed_flush_returns_views_to_buffer(self):
+        self.view('tea')
+        with mock.patch.object(article_view_counter, '_write', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                flush_article_views_task()
+
+        self.assertEqual(self.redis.data[PENDING_KEY], {str(self.article.id).encode(): 1})
+
+    def test_without_redis_view_is_written_directly(self):
+        with mock.patch('shop.redis_client.get_redis', side_effect=ConnectionError):
+            self.assertEqual(self.view('tea').status_code, 200)
+
+        self.article.refresh_from_db()
+        self.assertEqual(self.article.views_count, 1)
@@ -0,0 +1,83 @@
+import ipaddress
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from shop.models import BlacklistedItem
+from shop.services.blacklist import BlacklistSnapshot, PrefixTrie, blacklist_service
+from shop.test_utils import LOCMEM_CACHES
+
+
+class BlacklistSnapshotTestCase(TestCase):
+    def test_exact_ips_cidr_ranges_and_telegram_ids(self):
+        snapshot = BlacklistSnapshot([
+            {'item_type': 'IP', 'value': '198.51.100.7'},
+            {'item_type': 'IP', 'value': '203.0.113.0/24'},
+            {'item_type': 'IP', 'value': '2001:db8::/32'},
+            {'item_type': 'IP', 'value': 'not-an-ip'},
+            {'item_type': 'TG', 'value': '777'},
+        ])
+
+        self.assertTrue(snapshot.is_ip_blocked('198.51.100.7'))
+        self.assertFalse(snapshot.is_ip_blocked('198.51.100.8'))
+        self.assertTrue(snapshot.is_ip_blocked('203.0.113.250'))
+        self.assertFalse(snapshot.is_ip_blocked('203.0.114.1'))
+        self.assertTrue(snapshot.is_ip_blocked('2001:db8:1::1'))
+        self.assertTrue(snapshot.is_ip_blocked('::ffff:203.0.113.5'))
+        self.assertFalse(snapshot.is_ip_blocked('garbage'))
+        self.assertTrue(snapshot.is_telegram_id_blocked('777'))
+        self.assertFalse(snapshot.is_telegram_id_blocked(None))
+
+    def test_trie_matches_shortest_covering_prefix(self):
+        trie = PrefixTrie(32)
+        trie.add(ipaddress.ip_network('10.0.0.0/8'))
+        trie.add(ipaddress.ip_network('10.1.2.0/24'))
+
+        self.assertTrue(trie.contains(ipaddress.ip_address('10.200.0.1')))
+        self.assertFalse(trie.contains(ipaddress.ip_address('11.0.0.1')))
+
+    def test_model_validates_ip_values(self):
+        BlacklistedItem(item_type='IP', value=' 203.0.113.0/24 ').full_clean()
+        BlacklistedItem(item_type='TG', value='12345').full_clean()
+        with self.assertRaises(ValidationError):
+            BlacklistedItem(item_type='IP', value='203.0.113.0/33').full_clean()
+
+
+@override_settings(CACHES=LOCMEM_CACHES, BLACKLIST_VERSION_CHECK_INTERVAL=0)
+class BlacklistMiddlewareTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        blacklist_service.reset()
+
+    def _get(self, ip):
+        return self.client.get(reverse('category-list'), REMOTE_ADDR=ip)
+
+    def test_new_ban_applies_without_waiting_for_timeout(self):
+        self.assertEqual(self._get('203.0.113.9').status_code, 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            BlacklistedItem.objects.create(item_type='IP', value='203.0.113.0/24')
+
+        self.assertEqual(self._get('203.0.113.9').status_code, 403)
+        self.assertEqual(self._get('198.51.100.1').status_code, 200)
+
+    def test_snapshot_is_not_reloaded_while_version_is_unchanged(self):
+        self._get('198.51.100.1')
+
+        with mock.patch.object(blacklist_service, '_load', wraps=blacklist_service._load) as load:
+            for _ in range(3):
+                self._get('198.51.100.1')
+        load.assert_not_called()
+
+    def test_unban_is_picked_up(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            item = BlacklistedItem.objects.create(item_type='IP', value='198.51.100.1')
+        self.assertEqual(self._get('198.51.100.1').status_code, 403)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            item.is_active = False
+            item.save()
+        self.assertEqual(self._get('198.51.100.1').status_code, 200)
@@ -0,0 +1,88 @@
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from shop.models import Category, FaqItem, Product, ShopSettings
+from shop.services.bootstrap import bootstrap_service
+from shop.test_utils import LOCMEM_CACHES, NO_THROTTLE_REST_FRAMEWORK
+
+
+@override_settings(
+    CACHES=LOCMEM_CACHES, BOOTSTRAP_CACHE_TTL=300,
+    REST_FRAMEWORK=NO_THROTTLE_REST_FRAMEWORK,
+)
+class BootstrapTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        ShopSettings.objects.create(site_name='Чайная')
+        cls.category = Category.objects.create(name='Чай')
+        Category.objects.create(name='Улун', parent=cls.category)
+        FaqItem.objects.create(question='Сколько идет доставка?', answer='<p>Один день</p>')
+        cls.deal = Product.objects.create(
+            name='Пуэр', category=cls.category, regular_price=Decimal('1000'),
+            deal_price=Decimal('800'), deal_ends_at=timezone.now() + timedelta(minutes=2),
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def get(self, **headers):
+        return self.client.get(reverse('bootstrap'), **headers)
+
+    def test_all_sections_in_one_response(self):
+        response = self.get()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+        data = response.json()
+        self.assertEqual(data['settings']['site_name'], 'Чайная')
+        self.assertEqual([c['name'] for c in data['categories']], ['Чай'])
+        self.assertEqual(data['categories'][0]['subcategories'][0]['name'], 'Улун')
+        self.assertEqual(data['banners'], [])
+        self.assertEqual(data['faq'][0]['question'], 'Сколько идет доставка?')
+        self.assertEqual(data['deal_of_the_day']['id'], self.deal.id)
+
+    def test_cached_response_makes_no_queries(self):
+        first = self.get()
+
+        with self.assertNumQueries(0):
+            second = self.get()
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second['ETag'], first['ETag'])
+
+    def test_not_modified(self):
+        etag = self.get()['ETag']
+
+        response = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['ETag'], etag)
+
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH='"stale"').status_code, 200)
+
+    def test_model_change_changes_etag(self):
+        etag = self.get()['ETag']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            FaqItem.objects.create(question='Можно ли вернуть товар?', answer='<p>Да</p>')
+
+        response = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(len(response.json()['faq']), 2)
+
+    def test_ttl_is_bounded_by_deal_end(self):
+        request = mock.Mock(scheme='http', get_host=mock.Mock(return_value='testserver'))
+        _, ttl = bootstrap_service.build(request)
+        self.assertLessEqual(ttl, 120)
+        self.assertGreater(ttl, 0)
+
+        Product.objects.filter(pk=self.deal.pk).update(deal_ends_at=None)
+        _, ttl = bootstrap_service.build(request)
+        self.assertEqual(ttl, 300)
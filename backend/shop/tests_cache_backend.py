@@ -0,0 +1,80 @@
+import os
+import pickle
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import SimpleTestCase, override_settings
+
+from shop.cache_backend import CompressedSerializer, InstrumentedRedisCache, cache_metrics
+from shop.test_utils import FakeRedis
+
+
+@override_settings(
+    CACHE_COMPRESS_MIN_BYTES=100, CACHE_COMPRESS_LEVEL=6,
+    CACHE_METRICS_ENABLED=True, CACHE_METRICS_FLUSH_INTERVAL=3600,
+)
+class CacheBackendTestCase(SimpleTestCase):
+    def setUp(self):
+        self.redis = FakeRedis()
+        for target in ('shop.redis_client.get_redis', 'shop.cache_backend.InstrumentedRedisCacheClient.get_client'):
+            patcher = mock.patch(target, return_value=self.redis)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        cache_metrics.reset_stats()
+        self.cache = InstrumentedRedisCache('redis://localhost:6379/0', {'KEY_PREFIX': 'shop'})
+
+    def test_small_values_and_ints_are_stored_as_before(self):
+        self.cache.set('tiered:version', 5)
+        self.cache.set('articles:ids', {'tea': 1})
+
+        self.assertEqual(self.redis.data['shop:1:tiered:version'], b'5')
+        self.assertEqual(self.redis.data['shop:1:articles:ids'], pickle.dumps({'tea': 1}, pickle.HIGHEST_PROTOCOL))
+        self.assertEqual(self.cache.incr('tiered:version'), 6)
+
+    def test_large_values_are_compressed(self):
+        value = {'categories': [{'name': 'Зеленый чай', 'slug': f'green-{i}'} for i in range(50)]}
+        self.cache.set('bootstrap:payload', value)
+
+        stored = self.redis.data['shop:1:bootstrap:payload']
+        self.assertTrue(stored.startswith(b'Z'))
+        self.assertLess(len(stored), len(pickle.dumps(value, pickle.HIGHEST_PROTOCOL)) / 3)
+        self.assertEqual(self.cache.get('bootstrap:payload'), value)
+        self.assertEqual(self.cache.get_many(['bootstrap:payload']), {'bootstrap:payload': value})
+
+    def test_incompressible_value_stays_plain(self):
+        value = os.urandom(512)
+        data = CompressedSerializer().dumps(value)
+
+        self.assertEqual(data[:1], b'\x80')
+        self.assertEqual(CompressedSerializer().loads(data), value)
+
+    def test_metrics_by_key_prefix(self):
+        self.cache.set('bootstrap:payload:1', 'x' * 50)
+        self.cache.get('bootstrap:payload:1')
+        self.cache.get('bootstrap:payload:2')
+        self.cache.get_many(['tiered:a:1', 'bootstrap:payload:1'])
+        self.cache.get('0123abcd')
+        cache_metrics.flush()
+
+        stats = cache_metrics.stats()
+        size = len(self.redis.data['shop:1:bootstrap:payload:1'])
+        self.assertEqual(stats['bootstrap'], {'hit': 2, 'miss': 1, 'set': 1, 'bytes_in': 2 * size, 'bytes_out': size})
+        self.assertEqual(stats['tiered']['miss'], 1)
+        self.assertEqual(stats['-']['miss'], 1)
+
+    def test_metrics_are_flushed_in_batches(self):
+        self.cache.get('tiered:a')
+        self.assertEqual(cache_metrics.stats(), {})
+
+        with override_settings(CACHE_METRICS_FLUSH_INTERVAL=0):
+            self.cache.get('tiered:a')
+        self.assertEqual(cache_metrics.stats()['tiered']['miss'], 2)
+
+    def test_stats_command(self):
+        self.cache.get('tiered:a')
+        out = StringIO()
+        call_command('cache_stats', '--reset', stdout=out)
+
+        self.assertIn('tiered: попаданий 0, промахов 1', out.getvalue())
+        self.assertEqual(cache_metrics.stats(), {})
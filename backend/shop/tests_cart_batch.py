@@ -0,0 +1,60 @@
+from decimal import Decimal
+
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from shop.models import Cart, CartItem, Category, Product
+from shop.test_utils import LOCMEM_CACHES
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class CartBatchAPITestCase(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Аксессуары')
+        cls.case = Product.objects.create(name='Чехол', category=category, regular_price=Decimal('500.00'))
+        cls.cable = Product.objects.create(name='Кабель', category=category, regular_price=Decimal('300.00'))
+        cls.charger = Product.objects.create(name='Зарядка', category=category, regular_price=Decimal('1000.00'))
+        cls.url = reverse('cart-detail')
+
+    def setUp(self):
+        self.client.credentials(HTTP_X_SESSION_ID='session-batch-test')
+
+    def _quantities(self):
+        return dict(CartItem.objects.filter(cart__session_key='session-batch-test').values_list('product_id', 'quantity'))
+
+    def test_operations_are_applied_in_one_request(self):
+        self.client.post(self.url, {'product_id': self.case.id, 'quantity': 1}, format='json')
+        self.client.post(self.url, {'product_id': self.cable.id, 'quantity': 3}, format='json')
+
+        response = self.client.patch(self.url, {'operations': [
+            {'op': 'increment', 'product_id': self.case.id, 'quantity': 2},
+            {'op': 'remove', 'product_id': self.cable.id},
+            {'op': 'set', 'product_id': self.charger.id, 'quantity': 1},
+        ]}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self._quantities(), {self.case.id: 3, self.charger.id: 1})
+        self.assertEqual(response.data['subtotal'], Decimal('2500.00'))
+        self.assertEqual(len(response.data['items']), 2)
+
+    def test_unknown_product_rejects_whole_batch(self):
+        response = self.client.patch(self.url, {'operations': [
+            {'op': 'set', 'product_id': self.case.id, 'quantity': 1},
+            {'op': 'set', 'product_id': 999999, 'quantity': 1},
+        ]}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(response.data['product_ids'], [999999])
+        self.assertEqual(self._quantities(), {})
+
+    def test_repeated_requests_reuse_single_cart(self):
+        for _ in range(2):
+            self.client.patch(self.url, {'operations': [
+                {'op': 'increment', 'product_id': self.case.id, 'quantity': 1},
+            ]}, format='json')
+
+        self.assertEqual(Cart.objects.filter(session_key='session-batch-test').count(), 1)
+        self.assertEqual(self._quantities(), {self.case.id: 2})
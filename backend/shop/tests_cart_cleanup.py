@@ -0,0 +1,54 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.test import TestCase
+from django.utils import timezone
+
+from shop.models import Cart, CartItem, Category, Product
+from shop.services.cart_cleanup import CartCleanupService
+
+
+class CartCleanupServiceTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Чехлы')
+        cls.product = Product.objects.create(name='Чехол', category=category, regular_price=Decimal('500.00'))
+
+    def _make_cart(self, age, with_items=False, **identity):
+        cart = Cart.objects.create(**identity)
+        if with_items:
+            CartItem.objects.create(cart=cart, product=self.product, quantity=2)
+        Cart.objects.filter(pk=cart.pk).update(updated_at=timezone.now() - age)
+        return cart
+
+    def test_removes_empty_and_stale_carts_only(self):
+        fresh_empty = self._make_cart(timedelta(hours=1), session_key='fresh-empty')
+        old_empty = self._make_cart(timedelta(days=2), session_key='old-empty')
+        active = self._make_cart(timedelta(days=2), with_items=True, telegram_id=1)
+        abandoned = self._make_cart(timedelta(days=40), with_items=True, telegram_id=2)
+
+        stats = CartCleanupService(retention_days=30, empty_retention_hours=24, batch_size=1, pause=0).run()
+
+        remaining = set(Cart.objects.values_list('pk', flat=True))
+        self.assertEqual(remaining, {fresh_empty.pk, active.pk})
+        self.assertNotIn(old_empty.pk, remaining)
+        self.assertNotIn(abandoned.pk, remaining)
+        self.assertEqual(stats.empty_carts_deleted, 1)
+        self.assertEqual(stats.stale_carts_deleted, 1)
+        self.assertEqual(stats.items_deleted, 1)
+
+    def test_dry_run_deletes_nothing(self):
+        self._make_cart(timedelta(days=2), session_key='old-empty')
+
+        stats = CartCleanupService(retention_days=30, empty_retention_hours=24, pause=0).run(dry_run=True)
+
+        self.assertEqual(stats.empty_carts_deleted, 1)
+        self.assertEqual(Cart.objects.count(), 1)
+
+    def test_touch_protects_cart_from_cleanup(self):
+        cart = self._make_cart(timedelta(days=40), with_items=True, session_key='returning')
+        cart.touch()
+
+        CartCleanupService(retention_days=30, empty_retention_hours=24, pause=0).run()
+
+        self.assertTrue(Cart.objects.filter(pk=cart.pk).exists())
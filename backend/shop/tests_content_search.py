@@ -0,0 +1,73 @@
+from unittest import skipUnless
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from shop.models import Article, FaqItem
+from shop.test_utils import LOCMEM_CACHES, NO_THROTTLE_REST_FRAMEWORK
+
+
+@override_settings(
+    CACHES=LOCMEM_CACHES, CONTENT_SEARCH_LIMIT=5,
+    REST_FRAMEWORK=NO_THROTTLE_REST_FRAMEWORK,
+)
+class ContentSearchTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Article.objects.create(
+            title='Как заваривать зеленый чай', slug='green-tea', status=Article.Status.PUBLISHED,
+            content='<p>Зеленый чай заваривают водой 80&nbsp;градусов, а не кипятком.</p>',
+        )
+        Article.objects.create(
+            title='Доставка и хранение', slug='storage', status=Article.Status.PUBLISHED,
+            content='<p>Храните чай в сухом месте. Кофе — отдельно.</p>',
+        )
+        Article.objects.create(title='Черновик про чай', slug='draft', content='<p>чай</p>')
+        FaqItem.objects.create(question='Сколько идет доставка?', answer='<p>Доставка по городу — один день.</p>')
+        FaqItem.objects.create(question='Скрытый вопрос про доставку', answer='<p>Нет</p>', is_active=False)
+
+    def search(self, q, **params):
+        return self.client.get(reverse('content-search'), {'q': q, **params})
+
+    def test_empty_query(self):
+        response = self.search('  ')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {'articles': [], 'faq': []})
+
+    def test_only_published_articles_and_active_faq(self):
+        response = self.search('Доставка')  # LIKE в SQLite не различает регистр только у латиницы
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([a['slug'] for a in response.data['articles']], ['storage'])
+        self.assertEqual([f['question'] for f in response.data['faq']], ['Сколько идет доставка?'])
+
+    def test_limit_is_capped(self):
+        with override_settings(CONTENT_SEARCH_MAX_LIMIT=1):
+            response = self.search('чай', limit=50)
+        self.assertEqual(len(response.data['articles']), 1)
+
+    @skipUnless(connection.vendor == 'postgresql', 'tsvector и ts_headline есть только в PostgreSQL')
+    def test_ranked_full_text_search_with_snippets(self):
+        response = self.search('заварить чай')
+
+        articles = response.data['articles']
+        # Словоформы (заварить / заваривать) совпадают, заголовок весит больше текста
+        self.assertEqual(articles[0]['slug'], 'green-tea')
+        self.assertIn('<mark>', articles[0]['snippet'])
+        self.assertNotIn('<p>', articles[0]['snippet'])
+        self.assertNotIn('nbsp', articles[0]['snippet'])
+
+    @skipUnless(connection.vendor == 'postgresql', 'tsvector есть только в PostgreSQL')
+    def test_vector_is_updated_on_save(self):
+        faq = FaqItem.objects.get(is_active=True)
+        faq.answer = '<p>Самовывоз из магазина</p>'
+        faq.save()
+
+        self.assertEqual(self.search('самовывоз').data['faq'][0]['id'], faq.id)
+
+    def test_article_list_search_still_works(self):
+        response = self.client.get(reverse('article-list'), {'search': 'зеленый'})
+
+        self.assertEqual([a['slug'] for a in response.data['articles']['results']], ['green-tea'])
@@ -0,0 +1,149 @@
+import shutil
+import tempfile
+from io import BytesIO
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from shop.models import Article
+from shop.tasks import process_editor_image_task
+from shop.test_utils import LOCMEM_CACHES
+
+
+def upload(name='photo.jpg', size=(1600, 1200), fmt='JPEG'):
+    output = BytesIO()
+    Image.effect_noise(size, 64).convert('RGB').save(output, format=fmt)
+    return SimpleUploadedFile(name, output.getvalue(), content_type='image/jpeg')
+
+
+@override_settings(
+    CACHES=LOCMEM_CACHES, MEDIA_URL='/media/', TINYMCE_IMAGE_MAX_WIDTH=1200, TINYMCE_PREVIEW_QUALITY=30,
+    TINYMCE_INLINE_MAX_BYTES=1024, ARTICLE_IMAGE_WIDTHS=[480, 800],
+)
+class EditorImageUploadTestCase(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        patcher = override_settings(MEDIA_ROOT=media_root)
+        patcher.enable()
+        self.addCleanup(patcher.disable)
+        self.client.force_login(User.objects.create_user('editor', is_staff=True))
+
+    def post(self, file):
+        with mock.patch('shop.tasks.process_editor_image_task.delay') as delay, \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('tinymce-image-upload'), {'file': file})
+        return response, delay
+
+    def test_small_upload_is_processed_inline(self):
+        with override_settings(TINYMCE_INLINE_MAX_BYTES=10 * 1024 * 1024):
+            response, delay = self.post(upload())
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['status'], 'done')
+        delay.assert_not_called()
+        name = data['location'].split('/media/')[1]
+        with default_storage.open(name) as f, Image.open(f) as img:
+            self.assertEqual((img.format, img.size), ('WEBP', (1200, 900)))
+
+    def test_large_upload_is_stored_as_is_then_processed_in_celery(self):
+        with mock.patch('shop.services.editor_images.encode_optimized') as encode:
+            response, delay = self.post(upload())
+        encode.assert_not_called()  # в запросе пиксели не декодируются
+
+        data = response.json()
+        self.assertEqual(data['status'], 'processing')
+        token = delay.call_args.args[0]
+        raw_name = data['location'].split('/media/')[1]
+        self.assertEqual(raw_name, f'articles/content/raw/{token}.jpg')
+        article = Article.objects.create(
+            title='Чай', slug='tea', status=Article.Status.PUBLISHED, content=f'<p><img src="{data["location"]}"></p>',
+        )
+
+        # Статус — по файлам, кеш не нужен
+        cache.clear()
+        self.assertEqual(self.client.get(data['status_url']).json()['status'], 'processing')
+        self.assertTrue(process_editor_image_task(token))
+
+        name = f'articles/content/{token}.webp'
+        with default_storage.open(name) as f, Image.open(f) as img:
+            self.assertEqual((img.format, img.size), ('WEBP', (1200, 900)))
+        self.assertFalse(default_storage.exists(raw_name))
+        article.refresh_from_db()
+        self.assertNotIn(raw_name, article.content)
+        self.assertIn(f'/media/{name}', article.content)
+        self.assertIn('width="1200" height="900"', article.rendered_content)
+        status = self.client.get(data['status_url']).json()
+        self.assertEqual(status, {'status': 'done', 'location': f'http://testserver/media/{name}'})
+        self.assertFalse(process_editor_image_task(token))
+
+    def test_article_saved_after_processing_gets_final_image(self):
+        response, delay = self.post(upload())
+        location = response.json()['location']
+        process_editor_image_task(delay.call_args.args[0])
+
+        # Статья сохранена из редактора, открытого до обработки: ссылка на уже удаленный файл
+        article = Article.objects.create(
+            title='Чай', slug='tea', status=Article.Status.PUBLISHED, content=f'<p><img src="{location}"></p>',
+        )
+
+        token = delay.call_args.args[0]
+        self.assertIn(f'src="http://testserver/media/articles/content/{token}.webp"', article.rendered_content)
+        self.assertIn('width="1200" height="900"', article.rendered_content)
+
+    def test_heic_upload_gets_preview_under_final_name(self):
+        response, delay = self.post(upload(name='photo.heic', size=(1400, 1050), fmt='HEIF'))
+
+        data = response.json()
+        token = delay.call_args.args[0]
+        name = f'articles/content/{token}.webp'
+        self.assertEqual(data['location'], f'http://testserver/media/{name}')
+        with default_storage.open(name) as f, Image.open(f) as img:
+            self.assertEqual(img.size, (1200, 900))
+        self.assertTrue(default_storage.exists(f'articles/content/raw/{token}.heic'))
+
+        self.assertTrue(process_editor_image_task(token))
+        self.assertFalse(default_storage.exists(f'articles/content/raw/{token}.heic'))
+        self.assertEqual(self.client.get(data['status_url']).json()['status'], 'done')
+
+    def test_failed_processing_keeps_uploaded_file(self):
+        response, delay = self.post(upload())
+        token = delay.call_args.args[0]
+        raw_name = f'articles/content/raw/{token}.jpg'
+        with open(default_storage.path(raw_name), 'wb') as f:
+            f.write(b'truncated')
+
+        with self.assertLogs('shop', 'ERROR'):
+            self.assertFalse(process_editor_image_task(token))
+        self.assertFalse(process_editor_image_task(token))
+        status = self.client.get(response.json()['status_url']).json()
+        self.assertEqual(status, {'status': 'failed', 'location': response.json()['location']})
+        self.assertTrue(default_storage.exists(raw_name))
+
+    def test_broken_file_is_rejected(self):
+        with self.assertLogs('shop', 'ERROR'):
+            response, delay = self.post(SimpleUploadedFile('photo.jpg', b'not an image' * 200))
+
+        self.assertEqual(response.status_code, 400)
+        delay.assert_not_called()
+
+    def test_too_large_image_is_rejected(self):
+        with override_settings(TINYMCE_MAX_DECODED_PIXELS=1000):
+            response, delay = self.post(upload(name='scan.png', size=(100, 100), fmt='PNG'))
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('100x100', response.json()['error'])
+        delay.assert_not_called()
+
+    def test_status_requires_staff(self):
+        self.client.force_login(User.objects.create_user('customer'))
+        response = self.client.get(reverse('tinymce-image-upload-status', kwargs={'token': '0' * 32}))
+
+        self.assertEqual(response.status_code, 403)
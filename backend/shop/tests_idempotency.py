@@ -0,0 +1,70 @@
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from shop.idempotency import cache_keys
+from shop.models import Cart, CartItem, Category, Order, Product
+from shop.test_utils import LOCMEM_CACHES
+
+
+ORDER_PAYLOAD = {
+    'first_name': 'Иван', 'last_name': 'Иванов', 'phone': '+79990000000',
+    'delivery_method': 'СДЭК', 'cdek_office_address': 'ул. Ленина, 1',
+}
+
+
+@override_settings(CACHES=LOCMEM_CACHES, IDEMPOTENCY_WAIT_TIMEOUT=0.1)
+class IdempotencyKeyAPITestCase(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Наушники')
+        cls.product = Product.objects.create(name='Наушники', category=category, regular_price=Decimal('1000.00'), stock_quantity=10)
+
+    def setUp(self):
+        cache.clear()
+        self.client.credentials(HTTP_X_SESSION_ID='idem-session')
+        cart = Cart.objects.create(session_key='idem-session')
+        CartItem.objects.create(cart=cart, product=self.product, quantity=1)
+        self.payload = {**ORDER_PAYLOAD, 'items': [{'product_id': self.product.id, 'quantity': 1}]}
+
+    def _create_order(self, key, payload=None):
+        return self.client.post(reverse('order-create'), payload or self.payload, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retry_replays_first_order(self):
+        first = self._create_order('tap-1')
+        second = self._create_order('tap-1')
+
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(second.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(second.data['order_id'], first.data['order_id'])
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_same_key_with_different_body_is_rejected(self):
+        self._create_order('tap-2')
+        response = self._create_order('tap-2', {**self.payload, 'first_name': 'Петр'})
+
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_concurrent_duplicate_does_not_run_twice(self):
+        # Первый запрос "еще выполняется": блокировка захвачена, ответа пока нет
+        _, lock_key = cache_keys('orders', 'POST', 'sess_idem-session', 'tap-3')
+        cache.add(lock_key, 'in-progress', 30)
+
+        response = self._create_order('tap-3')
+
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertFalse(Order.objects.exists())
+
+    def test_cart_mutation_replay_does_not_increment_twice(self):
+        url = reverse('cart-detail')
+        body = {'operations': [{'op': 'increment', 'product_id': self.product.id, 'quantity': 1}]}
+        for _ in range(2):
+            self.client.patch(url, body, format='json', HTTP_IDEMPOTENCY_KEY='inc-1')
+
+        self.assertEqual(CartItem.objects.get(cart__session_key='idem-session').quantity, 2)
@@ -0,0 +1,49 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from shop import utils
+from shop.models import BlacklistedItem
+from shop.services.blacklist import blacklist_service
+from shop.tests_init_data import BOT_TOKEN, mint_init_data
+from shop.test_utils import LOCMEM_CACHES
+
+
+@override_settings(CACHES=LOCMEM_CACHES, TELEGRAM_BOT_TOKEN=BOT_TOKEN, DEBUG=False)
+class IdentityMiddlewareTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        utils._validated_init_data.clear()
+        blacklist_service.reset()
+        self.auth = {'HTTP_AUTHORIZATION': f"tma {mint_init_data({'id': 777, 'first_name': 'Ivan'})}"}
+
+    def test_banned_telegram_id_is_rejected_before_view(self):
+        BlacklistedItem.objects.create(item_type=BlacklistedItem.ItemType.TELEGRAM_ID, value='777')
+
+        with mock.patch('shop.views.CartView.get') as view:
+            response = self.client.get(reverse('cart-detail'), **self.auth)
+
+        self.assertEqual(response.status_code, 403)
+        view.assert_not_called()
+        # Публичные view тоже закрыты, а не только те, что с SessionAuthMixin
+        self.assertEqual(self.client.get(reverse('category-list'), **self.auth).status_code, 403)
+
+    def test_other_users_pass(self):
+        BlacklistedItem.objects.create(item_type=BlacklistedItem.ItemType.TELEGRAM_ID, value='778')
+
+        self.assertEqual(self.client.get(reverse('cart-detail'), **self.auth).status_code, 200)
+
+    def test_init_data_is_validated_once_per_request(self):
+        with mock.patch('shop.identity.validate_init_data', wraps=utils.validate_init_data) as validate:
+            response = self.client.get(reverse('cart-detail'), **self.auth)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(validate.call_count, 1)
+
+    def test_invalid_init_data_is_forbidden(self):
+        response = self.client.get(
+            reverse('cart-detail'), HTTP_AUTHORIZATION='tma auth_date=1&hash=bad', HTTP_X_SESSION_ID='s1'
+        )
+        self.assertEqual(response.status_code, 403)
@@ -0,0 +1,111 @@
+import os
+import shutil
+import tempfile
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from PIL import ExifTags, Image
+
+from shop.image_processing import encode_optimized, optimize_image_file, optimize_stored_images
+from shop.models import Category, Product, ProductImage
+
+
+def jpeg(size, orientation=None):
+    exif = Image.Exif()
+    exif[ExifTags.Base.Model] = 'Phone'
+    if orientation:
+        exif[ExifTags.Base.Orientation] = orientation
+    output = BytesIO()
+    Image.new('RGB', size, 'red').save(output, format='JPEG', exif=exif)
+    output.seek(0)
+    output.name = 'photo.jpg'
+    return output
+
+
+@override_settings(
+    IMAGE_MAX_WIDTH=400, IMAGE_QUALITY=80, IMAGE_WEBP_METHOD=0,
+    IMAGE_MAX_DECODED_PIXELS=10_000_000, IMAGE_BATCH_WORKERS=2, IMAGE_WORKER_MEMORY_LIMIT_MB=0,
+)
+class ImageProcessingTestCase(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        patcher = override_settings(MEDIA_ROOT=media_root)
+        patcher.enable()
+        self.addCleanup(patcher.disable)
+
+    def test_jpeg_is_decoded_downscaled_rotated_and_stripped(self):
+        with mock.patch.object(Image.Image, 'resize', autospec=True, side_effect=Image.Image.resize) as resize:
+            name, content = optimize_image_file(jpeg((3200, 2400), orientation=6))
+        self.addCleanup(content.close)
+
+        # draft() декодирует в 1/4: до LANCZOS доходит 800x600, а не 3200x2400
+        self.assertEqual(resize.call_args.args[0].size, (800, 600))
+        self.assertEqual(name, 'photo.webp')
+        with Image.open(content) as result:
+            self.assertEqual(result.format, 'WEBP')
+            self.assertEqual(result.size, (400, 533))  # портрет, как на экране телефона
+            self.assertEqual(dict(result.getexif()), {})
+
+    def test_small_png_keeps_alpha_and_size(self):
+        source = BytesIO()
+        Image.new('RGBA', (100, 50), (0, 0, 0, 0)).save(source, format='PNG')
+        source.seek(0)
+
+        with encode_optimized(source) as output, Image.open(output) as result:
+            self.assertEqual((result.size, result.mode), ((100, 50), 'RGBA'))
+
+    def test_too_large_after_draft_is_skipped(self):
+        with override_settings(IMAGE_MAX_DECODED_PIXELS=100_000), self.assertLogs('shop.image_processing', 'ERROR'):
+            self.assertIsNone(optimize_image_file(jpeg((3200, 2400))))
+
+    def test_batch_command_uses_pool_and_replaces_files(self):
+        category = Category.objects.create(name='Чай')
+        product = Product.objects.create(name='Пуэр', category=category, regular_price=Decimal('100'))
+        image = ProductImage.objects.create(product=product, image=ContentFile(jpeg((800, 600)).read(), name='a.jpg'))
+        ProductImage.objects.create(product=product, image=ContentFile(b'not an image', name='broken.jpg'))
+
+        out = StringIO()
+        # Ошибка логируется в процессе пула: глушим логгер до fork
+        with mock.patch('shop.image_processing.logger'):
+            call_command('optimize_images', stdout=out)
+
+        self.assertIn('Оптимизировано файлов: 1, с ошибкой: 1', out.getvalue())
+        image.refresh_from_db()
+        self.assertTrue(image.image.name.endswith('.webp'))
+        with default_storage.open(image.image.name) as f, Image.open(f) as result:
+            self.assertEqual(result.size, (400, 300))
+
+    def test_single_worker_runs_inline(self):
+        name = default_storage.save('products/x.jpg', ContentFile(jpeg((100, 100)).read()))
+
+        with mock.patch('shop.image_processing.ProcessPoolExecutor') as pool:
+            results = list(optimize_stored_images([name], workers=1))
+        pool.assert_not_called()
+        self.assertEqual(results, [(name, 'products/x.webp')])
+
+    def test_crashed_worker_fails_only_its_image(self):
+        names = [
+            default_storage.save(f'products/{stem}.jpg', ContentFile(jpeg((100, 100)).read()))
+            for stem in ('a', 'b', 'crash', 'c', 'd')
+        ]
+
+        def encode(source, *args, **kwargs):
+            if 'crash' in source.name:
+                os._exit(1)  # процесс пула убит (OOM killer): пул сломан целиком
+            return encode_optimized(source, *args, **kwargs)
+
+        with mock.patch('shop.image_processing.encode_optimized', side_effect=encode), \
+                mock.patch('shop.image_processing.logger') as logger:
+            results = dict(optimize_stored_images(names, workers=2))
+
+        self.assertEqual(results, {
+            name: None if 'crash' in name else name.replace('.jpg', '.webp') for name in names
+        })
+        logger.error.assert_called_once()
+        self.assertIn('products/crash.jpg', logger.error.call_args.args[0])
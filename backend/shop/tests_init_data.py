@@ -0,0 +1,81 @@
+import hashlib
+import hmac
+import json
+import time
+from unittest import mock
+from urllib.parse import urlencode
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+
+from shop import utils
+from shop.utils import validate_init_data
+from shop.views import parse_init_data
+from shop.test_utils import LOCMEM_CACHES
+
+BOT_TOKEN = '123:test'
+
+
+def mint_init_data(user, auth_date=None, bot_token=BOT_TOKEN):
+    fields = {
+        'auth_date': str(int(auth_date if auth_date is not None else time.time())),
+        'query_id': 'AAH',
+        'user': json.dumps(user, separators=(',', ':')),
+    }
+    data_check_string = '\n'.join(f'{k}={v}' for k, v in sorted(fields.items()))
+    secret = hmac.new(b'WebAppData', bot_token.encode(), hashlib.sha256).digest()
+    fields['hash'] = hmac.new(secret, data_check_string.encode(), hashlib.sha256).hexdigest()
+    return urlencode(fields)
+
+
+@override_settings(CACHES=LOCMEM_CACHES, INIT_DATA_CACHE_SIZE=2, INIT_DATA_CACHE_SHARED=True)
+class ValidateInitDataTestCase(SimpleTestCase):
+    def setUp(self):
+        utils._validated_init_data.clear()
+        cache.clear()
+
+    def test_repeat_requests_skip_signature_check(self):
+        init_data = mint_init_data({'id': 42, 'first_name': 'Ivan'})
+
+        with mock.patch('shop.utils._verify_init_data', wraps=utils._verify_init_data) as verify:
+            first = validate_init_data(init_data, BOT_TOKEN)
+            second = validate_init_data(init_data, BOT_TOKEN)
+            via_view = parse_init_data(init_data, BOT_TOKEN)
+
+        self.assertEqual(first, {'id': 42, 'first_name': 'Ivan'})
+        self.assertEqual(second, first)
+        self.assertEqual(via_view, first)
+        self.assertEqual(verify.call_count, 1)
+
+    def test_returned_dict_is_a_copy(self):
+        init_data = mint_init_data({'id': 42})
+        validate_init_data(init_data, BOT_TOKEN)['id'] = 0
+
+        self.assertEqual(validate_init_data(init_data, BOT_TOKEN)['id'], 42)
+
+    def test_invalid_and_stale_data_are_rejected(self):
+        tampered = mint_init_data({'id': 42}).replace('42', '43')
+        stale = mint_init_data({'id': 42}, auth_date=time.time() - 86401)
+
+        self.assertIsNone(validate_init_data(tampered, BOT_TOKEN))
+        self.assertIsNone(validate_init_data(stale, BOT_TOKEN))
+        self.assertIsNone(validate_init_data(mint_init_data({'id': 42}), '999:other'))
+
+    def test_cached_entry_expires_with_auth_date(self):
+        auth_date = time.time() - 86000
+        init_data = mint_init_data({'id': 42}, auth_date=auth_date)
+        self.assertIsNotNone(validate_init_data(init_data, BOT_TOKEN))
+
+        with mock.patch('shop.utils.time.time', return_value=auth_date + 86401):
+            self.assertIsNone(validate_init_data(init_data, BOT_TOKEN))
+
+    def test_lru_is_bounded_and_shared_cache_refills_it(self):
+        payloads = [mint_init_data({'id': i}) for i in range(3)]
+        for init_data in payloads:
+            validate_init_data(init_data, BOT_TOKEN)
+        self.assertEqual(len(utils._validated_init_data._data), 2)
+
+        # Вытесненная из LRU запись берется из общего кеша без пересчета подписи
+        with mock.patch('shop.utils._verify_init_data') as verify:
+            self.assertEqual(validate_init_data(payloads[0], BOT_TOKEN), {'id': 0})
+        verify.assert_not_called()
@@ -0,0 +1,100 @@
+import time
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from shop.models import Category, Product
+from shop.services.blacklist import blacklist_service
+from shop.services.load_shedding import INFLIGHT_KEY, load_monitor
+from shop.test_utils import FakeRedis, LOCMEM_CACHES, NO_THROTTLE_REST_FRAMEWORK
+
+
+class BusyRedis(FakeRedis):
+    """В ZSET запросов в работе учитываются еще busy запросов у "других воркеров"."""
+
+    def __init__(self, busy=0):
+        super().__init__()
+        self.busy = busy
+
+    def zcard(self, key):
+        return super().zcard(key) + self.busy
+
+
+@override_settings(
+    CACHES=LOCMEM_CACHES, LOAD_SHEDDING_ENABLED=True, LOAD_SHEDDING_CAPACITY=3, LOAD_SHEDDING_EWMA_ALPHA=1.0,
+    LOAD_SHEDDING_DELAY_THRESHOLDS={'low': 0.5, 'normal': 1.0, 'high': 2.0}, LOAD_SHEDDING_RETRY_AFTER=7,
+    REST_FRAMEWORK=NO_THROTTLE_REST_FRAMEWORK,
+)
+class LoadSheddingTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Чай')
+        cls.product = Product.objects.create(name='Пуэр', category=category, regular_price=Decimal('100.00'))
+
+    def setUp(self):
+        cache.clear()
+        blacklist_service.reset()
+        load_monitor.reset()
+        self.redis = BusyRedis(busy=2)  # вместе с текущим запросом все 3 воркера заняты
+        patcher = mock.patch('shop.redis_client.get_redis', return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get(self, url, queued_for=0.0, **extra):
+        return self.client.get(url, HTTP_X_REQUEST_START=f"t={time.time() - queued_for:.3f}", **extra)
+
+    def test_low_priority_is_shed_first(self):
+        response = self.get(reverse('article-list'), queued_for=0.8)
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '7')
+        # Каталог при той же очереди еще обслуживается
+        self.assertEqual(self.get(reverse('category-list'), queued_for=0.8).status_code, 200)
+
+    def test_priorities_under_heavy_queue(self):
+        url = reverse('product-detail', kwargs={'slug': self.product.slug})
+
+        self.assertEqual(self.get(reverse('product-list'), queued_for=1.5).status_code, 503)
+        self.assertEqual(self.get(reverse('category-list') + '?search=x', queued_for=1.5).status_code, 503)
+        self.assertEqual(self.get(url, queued_for=1.5).status_code, 200)
+        self.assertEqual(self.get(reverse('cart-detail'), queued_for=5, HTTP_X_SESSION_ID='s1').status_code, 200)
+
+    def test_search_is_low_priority(self):
+        self.assertEqual(self.get(reverse('product-list'), queued_for=0.8).status_code, 200)
+        with mock.patch('shop.views.ProductListView.get') as view:
+            response = self.client.get(
+                reverse('product-list'), {'search': 'пуэр'}, HTTP_X_REQUEST_START=f"t={time.time() - 0.8:.3f}"
+            )
+        self.assertEqual(response.status_code, 503)
+        view.assert_not_called()
+
+    def test_free_workers_mean_no_shedding(self):
+        self.redis.busy = 0
+
+        self.assertEqual(self.get(reverse('article-list'), queued_for=3).status_code, 200)
+
+    def test_recovers_when_queue_drains(self):
+        self.assertEqual(self.get(reverse('article-list'), queued_for=0.8).status_code, 503)
+        self.assertEqual(self.get(reverse('article-list'), queued_for=0).status_code, 200)
+
+    def test_inflight_entry_is_released_and_counters_kept(self):
+        self.get(reverse('article-list'), queued_for=0.8)
+        self.get(reverse('category-list'))
+
+        self.assertEqual(self.redis.data[INFLIGHT_KEY], {})
+        self.assertEqual(load_monitor.counters['shed:low'], 1)
+        self.assertEqual(load_monitor.counters['served:normal'], 1)
+
+        out = StringIO()
+        call_command('load_shedding_stats', stdout=out)
+        self.assertIn('low: обслужено 0, отброшено 1 (100.0%)', out.getvalue())
+
+    def test_works_without_redis(self):
+        with mock.patch('shop.redis_client.get_redis', side_effect=ConnectionError):
+            self.assertEqual(self.get(reverse('article-list'), queued_for=0.8).status_code, 503)
+            self.assertEqual(self.get(reverse('article-list')).status_code, 200)
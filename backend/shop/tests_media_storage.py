@@ -0,0 +1,126 @@
+import os
+import shutil
+import tempfile
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from shop.models import Category, Product, ProductImage
+from shop.storage import ContentAddressedStorage, media_storage
+from shop.test_utils import LOCMEM_CACHES
+
+
+@override_settings(CACHES=LOCMEM_CACHES, MEDIA_URL='/media/')
+class ContentAddressedStorageTestCase(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        patcher = override_settings(MEDIA_ROOT=media_root)
+        patcher.enable()
+        self.addCleanup(patcher.disable)
+        self.category = Category.objects.create(name='Чай')
+
+    def test_same_content_is_stored_once(self):
+        first = media_storage.save('products/main/original/a.jpg', ContentFile(b'photo'))
+        second = media_storage.save('products/additional/original/b.JPG', ContentFile(b'photo'))
+
+        self.assertEqual(first, second)
+        self.assertRegex(first, r'^cas/[0-9a-f]{2}/[0-9a-f]{32}\.jpg$')
+        self.assertEqual(media_storage.url(first), f'/media/{first}')
+        self.assertEqual(media_storage.references(first), 2)
+        self.assertNotEqual(media_storage.save('a.jpg', ContentFile(b'other')), first)
+
+        media_storage.delete(first)
+        self.assertTrue(media_storage.exists(first))  # у второй записи файл на месте
+        media_storage.delete(first)
+        self.assertFalse(media_storage.exists(first))
+        self.assertEqual(media_storage.references(first), 0)
+
+    def test_duplicate_product_copies_no_bytes(self):
+        product = Product.objects.create(
+            name='Пуэр', category=self.category, regular_price=Decimal('100'),
+            main_image=ContentFile(b'main', name='main.jpg'), audio_sample=ContentFile(b'audio', name='a.mp3'),
+        )
+        ProductImage.objects.create(product=product, image=ContentFile(b'extra', name='extra.webp'))
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+
+        with mock.patch.object(ContentAddressedStorage, '_save') as save:
+            self.client.post(reverse('admin:shop_product_changelist'), {
+                'action': 'duplicate_product', '_selected_action': [product.pk],
+            })
+        save.assert_not_called()
+
+        copy = Product.objects.exclude(pk=product.pk).get()
+        self.assertEqual(copy.main_image.name, product.main_image.name)
+        self.assertEqual(copy.audio_sample.name, product.audio_sample.name)
+        self.assertEqual(copy.images.get().image.name, product.images.get().image.name)
+        self.assertEqual(media_storage.references(product.main_image.name), 2)
+
+        # django-cleanup снимает ссылки исходника, файлы копии остаются
+        with self.captureOnCommitCallbacks(execute=True):
+            product.delete()
+        for name in (copy.main_image.name, copy.audio_sample.name, copy.images.get().image.name):
+            self.assertTrue(media_storage.exists(name))
+            self.assertEqual(media_storage.references(name), 1)
+
+    def test_identical_reupload_does_not_leak_a_reference(self):
+        product = Product.objects.create(
+            name='Пуэр', category=self.category, regular_price=Decimal('100'),
+            main_image=ContentFile(b'main', name='main.jpg'),
+        )
+        name = product.main_image.name
+
+        product = Product.objects.get(pk=product.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            product.main_image = ContentFile(b'main', name='again.jpg')
+            product.save()
+        self.assertEqual(product.main_image.name, name)
+        self.assertEqual(media_storage.references(name), 1)
+
+        # Другие байты: прежнюю ссылку снимает django-cleanup, как и раньше
+        product = Product.objects.get(pk=product.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            product.main_image = ContentFile(b'new', name='new.jpg')
+            product.save()
+        self.assertFalse(media_storage.exists(name))
+        self.assertEqual(media_storage.references(product.main_image.name), 1)
+
+    def test_legacy_file_is_hard_linked(self):
+        legacy = default_storage.save('products/main/original/old.jpg', ContentFile(b'old photo'))
+
+        blob = media_storage.clone(legacy)
+
+        self.assertTrue(media_storage.is_blob(blob))
+        self.assertEqual(os.stat(media_storage.path(blob)).st_ino, os.stat(default_storage.path(legacy)).st_ino)
+        self.assertEqual(media_storage.references(blob), 1)
+
+    def test_dedupe_command_adopts_legacy_files_and_reconciles_counters(self):
+        product = Product.objects.create(
+            name='Пуэр', category=self.category, regular_price=Decimal('100'),
+            main_image=ContentFile(b'main', name='main.jpg'),
+        )
+        media_storage.clone(product.main_image.name)  # ссылка, которую никто не снял
+        orphan = media_storage.save('orphan.jpg', ContentFile(b'orphan'))
+        legacy = default_storage.save('products/additional/original/old.jpg', ContentFile(b'old photo'))
+        images = [ProductImage.objects.create(product=product, image=legacy) for _ in range(2)]
+
+        out = StringIO()
+        call_command('dedupe_media', '--grace', '0', stdout=out)
+
+        self.assertIn('Перенесено в cas/: 1 (не найдено: 0), исправлено счетчиков: 1, удалено блобов без ссылок: 1',
+                      out.getvalue())
+        self.assertFalse(default_storage.exists(legacy))
+        blob = ProductImage.objects.get(pk=images[0].pk).image.name
+        self.assertEqual(ProductImage.objects.get(pk=images[1].pk).image.name, blob)
+        self.assertEqual(media_storage.references(blob), 2)
+        with media_storage.open(blob) as f:
+            self.assertEqual(f.read(), b'old photo')
+        self.assertEqual(media_storage.references(product.main_image.name), 1)
+        self.assertFalse(media_storage.exists(orphan))
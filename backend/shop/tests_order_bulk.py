@@ -0,0 +1,55 @@
+from decimal import Decimal
+
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from shop.models import Cart, CartItem, Category, Order, Product
+from shop.test_utils import LOCMEM_CACHES
+
+
+ORDER_PAYLOAD = {
+    'first_name': 'Иван', 'last_name': 'Иванов', 'phone': '+79990000000',
+    'delivery_method': 'СДЭК', 'cdek_office_address': 'ул. Ленина, 1',
+}
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class OrderBulkWriteAPITestCase(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Опт')
+        cls.products = Product.objects.bulk_create([
+            Product(name=f'Товар {i}', slug=f'bulk-{i}', category=category, regular_price=Decimal('100.00'), stock_quantity=100)
+            for i in range(30)
+        ])
+
+    def setUp(self):
+        # Прогреваем кеши уровня процесса (черный список и т.п.), чтобы они не искажали подсчет запросов
+        self.client.get(reverse('cart-detail'), HTTP_X_SESSION_ID='bulk-warmup')
+
+    def _place_order(self, session_key, products):
+        self.client.credentials(HTTP_X_SESSION_ID=session_key)
+        cart = Cart.objects.create(session_key=session_key)
+        CartItem.objects.bulk_create([CartItem(cart=cart, product=product, quantity=2) for product in products])
+        payload = {**ORDER_PAYLOAD, 'items': [{'product_id': product.id, 'quantity': 2} for product in products]}
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('order-create'), payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+        return Order.objects.get(id=response.data['order_id']), len(queries)
+
+    def test_query_count_does_not_grow_with_order_size(self):
+        small_order, small_queries = self._place_order('bulk-small', self.products[:2])
+        large_order, large_queries = self._place_order('bulk-large', self.products[2:30])
+
+        self.assertEqual(small_queries, large_queries)
+        self.assertEqual(large_order.items.count(), 28)
+        self.assertFalse(CartItem.objects.filter(cart__session_key='bulk-large').exists())
+        self.assertEqual(
+            sorted(large_order.items.values_list('price_at_purchase', flat=True).distinct()),
+            [Decimal('100.00')]
+        )
@@ -0,0 +1,93 @@
+import csv
+import gzip
+import io
+import tempfile
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from shop.models import Category, Order, OrderExport, OrderItem, Product
+from shop.tasks import export_orders_task
+from shop.test_utils import LOCMEM_CACHES
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class OrderExportTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Аксессуары')
+        cls.case = Product.objects.create(name='Чехол', sku='CASE-1', category=category, regular_price=Decimal('500.00'))
+        cls.cable = Product.objects.create(name='Кабель', sku='CABLE-1', category=category, regular_price=Decimal('300.00'))
+        cls.orders = []
+        for i in range(3):
+            order = Order.objects.create(
+                last_name='Иванов', first_name=f'Клиент {i}', phone='1', delivery_method='СДЭК',
+                subtotal=Decimal('1100'), final_total=Decimal('1100')
+            )
+            OrderItem.objects.create(order=order, product=cls.case, quantity=1, price_at_purchase=Decimal('500'))
+            OrderItem.objects.create(order=order, product=cls.cable, quantity=2, price_at_purchase=Decimal('300'))
+            cls.orders.append(order)
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def _run_action(self, action):
+        return self.client.post(reverse('admin:shop_order_changelist'), {
+            'action': action,
+            '_selected_action': [order.id for order in self.orders],
+        })
+
+    def test_small_selection_is_streamed_with_order_lines(self):
+        response = self._run_action('export_as_csv')
+
+        self.assertTrue(response.streaming)
+        rows = list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode('utf-8-sig'))))
+        self.assertEqual(rows[0][-5:], ['item_product', 'item_sku', 'item_quantity', 'item_price', 'item_total'])
+        self.assertEqual(len(rows), 1 + 3 * 2)
+        self.assertIn(['Кабель', 'CABLE-1', '2', '300.00', '600.00'], [row[-5:] for row in rows[1:]])
+
+    @override_settings(ORDER_EXPORT_STREAMING_LIMIT=2)
+    def test_large_selection_goes_to_background(self):
+        with mock.patch('shop.tasks.export_orders_task.delay') as delay, self.captureOnCommitCallbacks(execute=True):
+            response = self._run_action('export_as_csv')
+
+        self.assertEqual(response.status_code, 302)
+        export = OrderExport.objects.get()
+        delay.assert_called_once_with(export.id)
+        self.assertEqual(export.criteria['ids'], sorted(order.id for order in self.orders))
+        self.assertEqual(export.orders_count, 3)
+
+    def test_select_all_exports_by_changelist_filters(self):
+        Order.objects.filter(pk=self.orders[0].pk).update(status=Order.OrderStatus.CANCELED)
+        with mock.patch('shop.tasks.export_orders_task.delay'), self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('admin:shop_order_changelist') + '?status__exact=new', {
+                'action': 'export_in_background', 'select_across': '1', '_selected_action': [self.orders[1].id],
+            })
+
+        export = OrderExport.objects.get()
+        self.assertEqual(export.criteria, {'query': 'status__exact=new'})
+        self.assertEqual(export.orders_count, 2)
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            export_orders_task(export.id)
+            export.refresh_from_db()
+            with export.file.open('rb') as f:
+                rows = list(csv.reader(io.StringIO(gzip.decompress(f.read()).decode('utf-8-sig'))))
+
+        self.assertEqual((export.status, export.orders_count), ('success', 2))
+        self.assertEqual({row[0] for row in rows[1:]}, {str(order.id) for order in self.orders[1:]})
+
+    def test_background_task_writes_gzip_csv(self):
+        export = OrderExport.objects.create(created_by=self.admin, criteria={'ids': [order.id for order in self.orders]})
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            export_orders_task(export.id)
+            export.refresh_from_db()
+            with export.file.open('rb') as f:
+                content = gzip.decompress(f.read()).decode('utf-8-sig')
+
+        self.assertEqual(export.status, 'success')
+        self.assertEqual(export.rows_count, 6)
+        self.assertEqual(len(list(csv.reader(io.StringIO(content)))), 7)
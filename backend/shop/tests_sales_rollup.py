@@ -0,0 +1,104 @@
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.db import DatabaseError
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from shop.models import (
+    Category, Order, OrderItem, Product,
+    SalesDailyStatus, SalesDailyProduct, SalesDailyCategory, SalesDailyDiscount,
+)
+from shop.services.sales_rollup import SalesRollupService
+from shop.test_utils import LOCMEM_CACHES
+
+
+def snapshot():
+    """Содержимое всех роллапов без нулевых строк — для сравнения инкрементального состояния с пересборкой."""
+    return {
+        'status': {(r.day, r.status): (r.orders_count, r.revenue) for r in SalesDailyStatus.objects.all() if r.orders_count},
+        'product': {(r.day, r.product_id): (r.quantity, r.revenue) for r in SalesDailyProduct.objects.all() if r.quantity},
+        'category': {(r.day, r.category_id): (r.quantity, r.revenue) for r in SalesDailyCategory.objects.all() if r.quantity},
+        'discount': {(r.day, r.rule_name): (r.orders_count, r.discount_amount) for r in SalesDailyDiscount.objects.all() if r.orders_count},
+    }
+
+
+class SalesRollupTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Наушники')
+        cls.headphones = Product.objects.create(name='AirPods', category=cls.category, regular_price=Decimal('10000.00'))
+        cls.case = Product.objects.create(name='Чехол', category=cls.category, regular_price=Decimal('1000.00'))
+
+    def _create_order(self, lines, discount=Decimal('0'), rule=None):
+        subtotal = sum(price * quantity for _, quantity, price in lines)
+        with self.captureOnCommitCallbacks(execute=True):
+            order = Order.objects.create(
+                last_name='И', first_name='И', phone='1', delivery_method='СДЭК',
+                subtotal=subtotal, discount_amount=discount, final_total=subtotal - discount, applied_rule=rule
+            )
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, product=product, quantity=quantity, price_at_purchase=price)
+                for product, quantity, price in lines
+            ])
+        return order
+
+    def test_incremental_updates_match_rebuild(self):
+        today = timezone.localdate()
+        first = self._create_order([(self.headphones, 1, Decimal('10000')), (self.case, 2, Decimal('1000'))],
+                                   discount=Decimal('500'), rule='Комплект')
+        second = self._create_order([(self.case, 1, Decimal('1000'))])
+
+        self.assertEqual(
+            SalesDailyStatus.objects.get(day=today, status=Order.OrderStatus.NEW).revenue, Decimal('12500')
+        )
+        self.assertEqual(SalesDailyProduct.objects.get(day=today, product=self.case).quantity, 3)
+        self.assertEqual(SalesDailyDiscount.objects.get(day=today, rule_name='Комплект').discount_amount, Decimal('500'))
+
+        first.status = Order.OrderStatus.CANCELED
+        first.save()
+        second.status = Order.OrderStatus.COMPLETED
+        second.save()
+
+        self.assertEqual(SalesDailyProduct.objects.get(day=today, product=self.case).quantity, 1)
+        self.assertEqual(SalesDailyStatus.objects.get(day=today, status=Order.OrderStatus.CANCELED).orders_count, 1)
+        self.assertEqual(SalesDailyStatus.objects.get(day=today, status=Order.OrderStatus.NEW).orders_count, 0)
+
+        incremental = snapshot()
+        SalesRollupService().rebuild()
+        self.assertEqual(snapshot(), incremental)
+
+    def test_rollup_failure_does_not_break_order_creation(self):
+        with mock.patch.object(SalesRollupService, 'record_order', side_effect=DatabaseError('lock timeout')), \
+                self.assertLogs('shop', 'ERROR'):
+            order = self._create_order([(self.case, 1, Decimal('1000'))])
+
+        self.assertTrue(Order.objects.filter(pk=order.pk).exists())
+        self.assertEqual(snapshot()['product'], {})
+
+    def test_deleted_order_is_subtracted(self):
+        order = self._create_order([(self.case, 2, Decimal('1000'))])
+        order.delete()
+
+        self.assertEqual(snapshot()['product'], {})
+        self.assertEqual(snapshot()['status'], {})
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class SalesDashboardTestCase(TestCase):
+    def test_dashboard_reads_rollups(self):
+        category = Category.objects.create(name='Кабели')
+        product = Product.objects.create(name='Кабель USB-C', category=category, regular_price=Decimal('500.00'))
+        today = timezone.localdate()
+        SalesDailyStatus.objects.create(day=today, status=Order.OrderStatus.NEW, orders_count=2, revenue=Decimal('1000'))
+        SalesDailyProduct.objects.create(day=today, product=product, quantity=2, revenue=Decimal('1000'))
+
+        admin_user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.force_login(admin_user)
+        response = self.client.get(reverse('admin:index'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Кабель USB-C')
+        self.assertContains(response, '1 000 ₽')
@@ -0,0 +1,61 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import skipUnless
+
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase
+from django.utils import timezone
+
+from shop.models import SecurityBlockLog
+from shop.services.security_log_retention import SecurityLogRetentionService
+
+
+def _log(days_ago, ip='198.51.100.1'):
+    return SecurityBlockLog.objects.create(
+        ip_address=ip, request_path='/api/cart/', limit_type='RateLimitExceeded',
+        created_at=timezone.now() - timedelta(days=days_ago),
+    )
+
+
+class SecurityLogRetentionTestCase(TestCase):
+    def test_old_rows_are_deleted_in_batches(self):
+        for days_ago in (200, 120, 100, 95):
+            _log(days_ago)
+        recent = _log(1)
+
+        stats = SecurityLogRetentionService(retention_days=90, batch_size=3).run()
+
+        self.assertFalse(stats.partitioned)
+        self.assertEqual(stats.rows_deleted, 4)
+        self.assertEqual(list(SecurityBlockLog.objects.all()), [recent])
+
+    def test_convert_requires_postgres(self):
+        if connection.vendor == 'postgresql':
+            self.skipTest("SQLite/MySQL only")
+        with self.assertRaises(CommandError):
+            call_command('security_log_partitions', '--convert', stdout=StringIO())
+
+
+@skipUnless(connection.vendor == 'postgresql', "Секционирование есть только в PostgreSQL")
+class SecurityLogPartitioningTestCase(TestCase):
+    def test_convert_and_drop_old_partitions(self):
+        _log(100)
+        _log(10)
+        recent = _log(0)
+        service = SecurityLogRetentionService(retention_days=30, days_ahead=2)
+
+        service.convert_to_partitioned()
+        self.assertTrue(service.is_partitioned())
+        # Строки старше срока хранения при конвертации не копируются
+        self.assertEqual(SecurityBlockLog.objects.count(), 2)
+
+        stats = service.run()
+        self.assertEqual(stats.partitions_dropped, 0)
+        self.assertIn(recent, SecurityBlockLog.objects.all())
+
+        # Секции дней с -30 по -6 (в т.ч. с записью 10-дневной давности) уходят целиком
+        stats = SecurityLogRetentionService(retention_days=5, days_ahead=2).run()
+        self.assertEqual(stats.partitions_dropped, 25)
+        self.assertEqual(stats.rows_deleted, 0)
+        self.assertEqual(list(SecurityBlockLog.objects.all()), [recent])
@@ -0,0 +1,133 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from unittest import skipUnless
+
+from django.db import connection, connections, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from shop.models import Cart, CartItem, Category, Order, OrderItem, Product
+from shop.services.stock import StockReservationService
+from shop.test_utils import LOCMEM_CACHES
+
+
+ORDER_PAYLOAD = {
+    'first_name': 'Иван', 'last_name': 'Иванов', 'phone': '+79990000000',
+    'delivery_method': 'СДЭК', 'cdek_office_address': 'ул. Ленина, 1',
+}
+
+
+class StockReservationServiceTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Наушники')
+        cls.deal = Product.objects.create(name='Товар дня', category=category, regular_price=Decimal('1000.00'), stock_quantity=10)
+        cls.backorder = Product.objects.create(
+            name='Под заказ', category=category, regular_price=Decimal('500.00'), stock_quantity=0, allow_backorder=True
+        )
+
+    def test_reserve_decrements_stock(self):
+        result = StockReservationService().reserve({self.deal.id: 4})
+
+        self.assertTrue(result.ok)
+        self.assertEqual(result.reserved, {self.deal.id: 4})
+        self.deal.refresh_from_db()
+        self.assertEqual(self.deal.stock_quantity, 6)
+
+    def test_reserve_reports_failed_lines_and_keeps_stock(self):
+        result = StockReservationService().reserve({self.deal.id: 11, self.backorder.id: 2})
+
+        self.assertFalse(result.ok)
+        self.assertEqual(result.failed, [{'product_id': self.deal.id, 'requested': 11, 'available': 10}])
+        self.assertEqual(result.reserved, {self.backorder.id: 0})
+        self.deal.refresh_from_db()
+        self.assertEqual(self.deal.stock_quantity, 10)
+
+    def test_cancel_releases_reserved_stock_once(self):
+        StockReservationService().reserve({self.deal.id: 3})
+        order = Order.objects.create(
+            last_name='И', first_name='И', phone='1', delivery_method='СДЭК',
+            subtotal=Decimal('3000'), final_total=Decimal('3000')
+        )
+        OrderItem.objects.create(order=order, product=self.deal, quantity=3, price_at_purchase=Decimal('1000'), reserved_quantity=3)
+
+        order.status = Order.OrderStatus.CANCELED
+        order.save()
+        order.save()  # Повторное сохранение отмененного заказа не должно вернуть остатки дважды
+
+        self.deal.refresh_from_db()
+        self.assertEqual(self.deal.stock_quantity, 10)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class OrderCreateStockAPITestCase(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Наушники')
+        cls.deal = Product.objects.create(name='Товар дня', category=category, regular_price=Decimal('1000.00'), stock_quantity=1)
+
+    def test_oversold_order_is_rejected_with_failed_lines(self):
+        self.client.credentials(HTTP_X_SESSION_ID='stock-session')
+        cart = Cart.objects.create(session_key='stock-session')
+        CartItem.objects.create(cart=cart, product=self.deal, quantity=2)
+
+        response = self.client.post(
+            reverse('order-create'),
+            {**ORDER_PAYLOAD, 'items': [{'product_id': self.deal.id, 'quantity': 2}]},
+            format='json'
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data['failed_items'][0]['product_id'], self.deal.id)
+        self.assertFalse(Order.objects.exists())
+        self.assertTrue(CartItem.objects.filter(cart=cart).exists())
+
+
+@skipUnless(connection.vendor == 'postgresql', "Конкурентный тест требует PostgreSQL (SQLite сериализует запись)")
+class StockReservationConcurrencyTestCase(TransactionTestCase):
+    """
+    Сотни одновременных "оформлений" одного товара дня: ни одной лишней продажи,
+    и ни одна транзакция не стоит в очереди за блокировкой дольше, чем длится чужая короткая транзакция.
+    """
+    STOCK = 10
+    CHECKOUTS = 300
+    WORKERS = 40  # Не больше max_connections PostgreSQL
+
+    def test_no_oversell_under_concurrent_checkouts(self):
+        category = Category.objects.create(name='Flash sale')
+        deal = Product.objects.create(name='Товар дня', category=category, regular_price=Decimal('100.00'), stock_quantity=self.STOCK)
+        other = Product.objects.create(name='Кабель', category=category, regular_price=Decimal('10.00'), stock_quantity=10_000)
+        barrier = threading.Barrier(self.WORKERS)
+
+        def checkout(n):
+            if n < self.WORKERS:
+                barrier.wait()
+            started = time.monotonic()
+            try:
+                with transaction.atomic():
+                    # Чередуем порядок строк, чтобы проверить отсутствие взаимоблокировок
+                    lines = {deal.id: 1, other.id: 1} if n % 2 else {other.id: 1, deal.id: 1}
+                    result = StockReservationService().reserve(lines)
+                    if not result.ok:
+                        transaction.set_rollback(True)
+                return result.ok, time.monotonic() - started
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(max_workers=self.WORKERS) as pool:
+            outcomes = list(pool.map(checkout, range(self.CHECKOUTS)))
+
+        successes = sum(1 for ok, _ in outcomes if ok)
+        latencies = sorted(duration for _, duration in outcomes)
+        deal.refresh_from_db()
+        other.refresh_from_db()
+
+        self.assertEqual(successes, self.STOCK)
+        self.assertEqual(deal.stock_quantity, 0)
+        self.assertEqual(other.stock_quantity, 10_000 - self.STOCK)
+        # Нет "конвоя": даже худшая транзакция ждет считанные доли секунды, а не суммарное время всех остальных
+        self.assertLess(latencies[int(len(latencies) * 0.99) - 1], 2.0)
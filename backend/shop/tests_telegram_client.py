@@ -0,0 +1,126 @@
+from decimal import Decimal
+from unittest import mock
+
+from django.test import TestCase, override_settings
+
+from shop.models import Category, Order, OrderItem, Product, ShopSettings
+from shop.tasks import flush_order_digest_task, send_order_notification_task
+from shop.telegram_client import LocalTokenBucket, TelegramClient, TelegramRetryLater
+
+
+def _response(status_code, payload=None):
+    response = mock.Mock(status_code=status_code, text='')
+    response.json.return_value = payload or {}
+    return response
+
+
+@override_settings(TELEGRAM_MAX_RETRIES=3, TELEGRAM_MAX_INLINE_WAIT=15)
+class TelegramClientTestCase(TestCase):
+    def setUp(self):
+        self.client_tg = TelegramClient(token='123:test')
+        # Лимитер проверяется отдельно
+        self.client_tg._acquire = mock.Mock()
+        self.session_post = mock.patch.object(self.client_tg.session, 'post').start()
+        self.sleep = mock.patch('shop.telegram_client.time.sleep').start()
+        self.addCleanup(mock.patch.stopall)
+
+    def test_retries_429_with_retry_after(self):
+        self.session_post.side_effect = [
+            _response(429, {'ok': False, 'parameters': {'retry_after': 3}}),
+            _response(200),
+        ]
+
+        self.assertTrue(self.client_tg.send_message(1, 'hi'))
+        self.sleep.assert_called_once_with(3.0)
+        self.assertEqual(self.session_post.call_count, 2)
+
+    def test_retries_server_errors_and_gives_up(self):
+        self.session_post.return_value = _response(502)
+
+        self.assertFalse(self.client_tg.send_message(1, 'hi'))
+        self.assertEqual(self.session_post.call_count, 4)
+        self.assertEqual(self.sleep.call_count, 3)
+
+    def test_client_errors_are_not_retried(self):
+        self.session_post.return_value = _response(403)
+
+        self.assertFalse(self.client_tg.send_message(1, 'hi'))
+        self.assertEqual(self.session_post.call_count, 1)
+        self.sleep.assert_not_called()
+
+    def test_long_retry_after_is_deferred_to_caller(self):
+        self.session_post.return_value = _response(429, {'parameters': {'retry_after': 120}})
+
+        with self.assertRaises(TelegramRetryLater) as ctx:
+            self.client_tg.send_message(1, 'hi', raise_on_retry_later=True)
+        self.assertEqual(ctx.exception.retry_after, 120)
+        self.assertFalse(self.client_tg.send_message(1, 'hi'))
+
+    def test_local_bucket_limits_burst(self):
+        bucket = LocalTokenBucket()
+
+        self.assertEqual(bucket.take('chat', rate=1, capacity=2), 0)
+        self.assertEqual(bucket.take('chat', rate=1, capacity=2), 0)
+        self.assertGreater(bucket.take('chat', rate=1, capacity=2), 0)
+        self.assertEqual(bucket.take('other', rate=1, capacity=2), 0)
+
+
+class OrderNotificationTaskTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        ShopSettings.objects.create(manager_telegram_chat_id='-100500', free_shipping_threshold=Decimal('5000'))
+        category = Category.objects.create(name='Аксессуары')
+        product = Product.objects.create(name='Чехол', sku='CASE-1', category=category, regular_price=Decimal('500.00'))
+        cls.order = Order.objects.create(
+            last_name='Иванов', first_name='Иван', phone='1', delivery_method='СДЭК',
+            subtotal=Decimal('1000'), final_total=Decimal('1000')
+        )
+        for _ in range(3):
+            OrderItem.objects.create(order=cls.order, product=product, quantity=1, price_at_purchase=Decimal('500'))
+
+    @override_settings(TELEGRAM_DIGEST_ENABLED=False)
+    def test_notification_uses_constant_queries(self):
+        with mock.patch('shop.telegram_notifications.send_telegram_message', return_value=True) as send, \
+                self.assertNumQueries(4):  # заказ, позиции, товары, настройки — не зависит от числа позиций
+            self.assertTrue(send_order_notification_task(self.order.id))
+
+        chat_id, text = send.call_args.args
+        self.assertEqual(chat_id, -100500)
+        self.assertIn('Чехол', text)
+        self.assertIn('(Платная)', text)
+
+    @override_settings(TELEGRAM_DIGEST_ENABLED=False)
+    def test_rate_limited_notification_is_retried(self):
+        with mock.patch('shop.telegram_notifications.send_telegram_message', side_effect=TelegramRetryLater(90)), \
+                mock.patch.object(send_order_notification_task, 'retry', side_effect=RuntimeError('retry')) as retry:
+            with self.assertRaisesMessage(RuntimeError, 'retry'):
+                send_order_notification_task(self.order.id)
+        retry.assert_called_once_with(countdown=90)
+
+    def test_orders_over_threshold_go_to_digest(self):
+        redis = mock.Mock()
+        redis.pipeline.return_value.execute.return_value = [6, True]
+        redis.set.return_value = True
+        with override_settings(TELEGRAM_DIGEST_THRESHOLD=5), \
+                mock.patch('shop.redis_client.get_redis', return_value=redis), \
+                mock.patch('shop.tasks.flush_order_digest_task.apply_async') as schedule, \
+                mock.patch('shop.telegram_notifications.send_telegram_message') as send:
+            self.assertTrue(send_order_notification_task(self.order.id))
+
+        send.assert_not_called()
+        redis.rpush.assert_called_once_with('tg:digest:orders', self.order.id)
+        schedule.assert_called_once()
+
+    def test_digest_falls_back_to_single_message_without_redis(self):
+        with mock.patch('shop.redis_client.get_redis', side_effect=ConnectionError), \
+                mock.patch('shop.telegram_notifications.send_telegram_message', return_value=True) as send:
+            self.assertTrue(send_order_notification_task(self.order.id))
+        send.assert_called_once()
+
+    def test_flush_sends_one_message(self):
+        with mock.patch('shop.tasks.send_telegram_message', return_value=True) as send:
+            self.assertEqual(flush_order_digest_task(order_ids=[self.order.id]), 1)
+
+        text = send.call_args.args[1]
+        self.assertIn('НОВЫЕ ЗАКАЗЫ: 1', text)
+        self.assertIn('3 поз.', text)
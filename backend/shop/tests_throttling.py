@@ -0,0 +1,76 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from rest_framework.request import Request
+
+from shop import throttling
+from shop.throttling import GCRAScopedRateThrottle, SmartAnonRateThrottle
+from shop.test_utils import LOCMEM_CACHES
+
+
+class _View:
+    throttle_cost = 1
+
+
+class _SearchView:
+    def get_throttle_cost(self, request):
+        return 5 if request.query_params.get('search') else 1
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class GCRAThrottleTestCase(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.script = mock.Mock(return_value=[1, '0'])
+        patcher = mock.patch.object(throttling, '_gcra_script', self.script)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _request(self, path='/api/products/', **params):
+        request = RequestFactory().get(path, params, REMOTE_ADDR='198.51.100.1')
+        request.identity = mock.Mock(telegram_user=None)
+        drf_request = Request(request)
+        drf_request.session_key = None
+        drf_request.user = mock.Mock(is_authenticated=False)
+        return drf_request
+
+    def test_one_atomic_call_per_request_with_rate_parameters(self):
+        throttle = SmartAnonRateThrottle()
+
+        self.assertTrue(throttle.allow_request(self._request(), _View()))
+        self.script.assert_called_once_with(keys=['gcra:throttle_anon_198.51.100.1'], args=[1.0, 60, 1])
+
+    def test_endpoint_cost_weights(self):
+        SmartAnonRateThrottle().allow_request(self._request(search='чехол'), _SearchView())
+        self.assertEqual(self.script.call_args.kwargs['args'][2], 5)
+
+        # Стоимость не может превышать весь лимит
+        view = _View()
+        view.throttle_cost = 1000
+        SmartAnonRateThrottle().allow_request(self._request(), view)
+        self.assertEqual(self.script.call_args.kwargs['args'][2], 60)
+
+    def test_denied_request_reports_wait(self):
+        self.script.return_value = [0, '2.3']
+        throttle = SmartAnonRateThrottle()
+
+        self.assertFalse(throttle.allow_request(self._request(), _View()))
+        self.assertEqual(throttle.wait(), 3)
+
+    def test_scoped_throttle_uses_view_scope(self):
+        view = _View()
+        view.throttle_scope = 'orders'
+
+        self.assertTrue(GCRAScopedRateThrottle().allow_request(self._request(), view))
+        key = self.script.call_args.kwargs['keys'][0]
+        self.assertTrue(key.startswith('gcra:throttle_orders_'))
+        self.assertEqual(self.script.call_args.kwargs['args'][1], 60)
+
+    def test_falls_back_to_cache_throttle_without_redis(self):
+        self.script.side_effect = ConnectionError
+
+        with mock.patch.object(SmartAnonRateThrottle, 'THROTTLE_RATES', {'anon': '2/min'}):
+            results = [SmartAnonRateThrottle().allow_request(self._request(), _View()) for _ in range(3)]
+
+        self.assertEqual(results, [True, True, False])
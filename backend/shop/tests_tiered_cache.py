@@ -0,0 +1,121 @@
+from decimal import Decimal
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from shop.models import DiscountRule, ShopImage, ShopSettings
+from shop.services.cached_models import active_discount_rules, shop_settings, shop_settings_with_images
+from shop.services.tiered_cache import TieredCache
+from shop.test_utils import LOCMEM_CACHES, NO_THROTTLE_REST_FRAMEWORK
+
+
+@override_settings(
+    CACHES=LOCMEM_CACHES, TIERED_CACHE_ENABLED=True, TIERED_CACHE_L1_TTL=60, TIERED_CACHE_L2_TTL=3600,
+    TIERED_CACHE_L1_MAX_ENTRIES=2, TIERED_CACHE_VERSION_CHECK_INTERVAL=60,
+)
+class TieredCacheTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.cache = TieredCache('test')
+        self.loader = mock.Mock(side_effect=lambda: {'value': self.loader.call_count})
+
+    def test_l1_then_l2_then_loader(self):
+        self.assertEqual(self.cache.get('a', self.loader), {'value': 1})
+        self.assertEqual(self.cache.get('a', self.loader), {'value': 1})
+        self.assertEqual(self.loader.call_count, 1)
+
+        # Другой процесс: пустой L1, значение берется из Redis
+        other = TieredCache('test')
+        self.assertEqual(other.get('a', self.loader), {'value': 1})
+        self.assertEqual(self.loader.call_count, 1)
+
+    def test_none_is_cached(self):
+        loader = mock.Mock(return_value=None)
+        self.cache.get('a', loader)
+        TieredCache('test').get('a', loader)
+
+        loader.assert_called_once()
+
+    def test_invalidate_reaches_other_processes_after_version_check(self):
+        other = TieredCache('test')
+        other.get('a', self.loader)
+
+        self.cache.invalidate()
+        # До очередной проверки версии другой процесс живет на своем L1
+        self.assertEqual(other.get('a', self.loader), {'value': 1})
+
+        with override_settings(TIERED_CACHE_VERSION_CHECK_INTERVAL=0):
+            self.assertEqual(other.get('a', self.loader), {'value': 2})
+
+    def test_l1_is_bounded_lru(self):
+        for key in 'abc':
+            self.cache.get(key, self.loader)
+
+        with mock.patch('shop.services.tiered_cache.cache.get', return_value=None):
+            self.cache.get('a', self.loader)
+        self.assertEqual(self.loader.call_count, 4)
+
+    def test_works_without_redis(self):
+        with mock.patch('shop.services.tiered_cache.cache.get', side_effect=ConnectionError), \
+                mock.patch('shop.services.tiered_cache.cache.set', side_effect=ConnectionError), \
+                self.assertLogs('shop', 'WARNING'):
+            self.assertEqual(self.cache.get('a', self.loader), {'value': 1})
+            self.assertEqual(self.cache.get('a', self.loader), {'value': 1})
+
+    @override_settings(TIERED_CACHE_ENABLED=False)
+    def test_disabled(self):
+        self.cache.get('a', self.loader)
+        self.cache.get('a', self.loader)
+
+        self.assertEqual(self.loader.call_count, 2)
+
+
+@override_settings(
+    CACHES=LOCMEM_CACHES, TIERED_CACHE_ENABLED=True, TIERED_CACHE_VERSION_CHECK_INTERVAL=60,
+    REST_FRAMEWORK=NO_THROTTLE_REST_FRAMEWORK,
+)
+class CachedModelsTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        ShopSettings.objects.create(site_name='Чайная')
+
+    def setUp(self):
+        cache.clear()
+        shop_settings.cache.clear_local()
+        shop_settings_with_images.cache.clear_local()
+        active_discount_rules.cache.clear_local()
+
+    def test_settings_endpoint_makes_no_queries_when_warm(self):
+        self.client.get(reverse('shop-settings'))
+
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('shop-settings'))
+        self.assertEqual(response.data['site_name'], 'Чайная')
+
+    def test_model_change_invalidates_after_commit(self):
+        self.assertEqual(shop_settings().site_name, 'Чайная')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            obj = ShopSettings.objects.get()
+            obj.site_name = 'Кофейня'
+            obj.save()
+        self.assertEqual(shop_settings().site_name, 'Кофейня')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ShopImage.objects.create(settings=obj, image='shop/photo.webp')
+        self.assertEqual(len(shop_settings_with_images().images.all()), 1)
+
+    def test_discount_rules(self):
+        rule = DiscountRule.objects.create(
+            name='3+ товара', discount_type=DiscountRule.DiscountType.TOTAL_QUANTITY,
+            min_quantity=3, discount_percentage=Decimal('10'),
+        )
+        self.assertEqual(active_discount_rules(), [rule])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            DiscountRule.objects.filter(pk=rule.pk).update(is_active=False)
+            rule.save(update_fields=['name'])
+        with self.assertNumQueries(1):
+            self.assertEqual(active_discount_rules(), [])
@@ -0,0 +1,85 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from shop.models import BlacklistedItem, SecurityBlockLog, ShopSettings
+from shop.services.blacklist import blacklist_service
+from shop.services.violations import violation_tracker
+from shop.tasks import flush_security_logs_task
+from shop.test_utils import FakeRedis, LOCMEM_CACHES, NO_THROTTLE_REST_FRAMEWORK
+
+
+@override_settings(
+    CACHES=LOCMEM_CACHES, SECURITY_LOG_FLUSH_BATCH=100, BLACKLIST_VERSION_CHECK_INTERVAL=0, TIERED_CACHE_ENABLED=True,
+    REST_FRAMEWORK=NO_THROTTLE_REST_FRAMEWORK,
+)
+class ViolationTrackerTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        ShopSettings.objects.create(auto_ban_enabled=True, auto_ban_threshold=3, auto_ban_hours=1)
+
+    def setUp(self):
+        cache.clear()
+        blacklist_service.reset()
+        violation_tracker.reset()
+        self.redis = FakeRedis()
+        patcher = mock.patch('shop.redis_client.get_redis', return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_violations_are_buffered_not_written(self):
+        with self.assertNumQueries(1):  # только настройки авто-бана (потом кешируются в процессе)
+            violation_tracker.record('198.51.100.1', None, '/api/cart/', 'RateLimitExceeded')
+        with self.assertNumQueries(0):
+            violation_tracker.record('198.51.100.1', None, '/api/cart/', 'RateLimitExceeded')
+
+        self.assertFalse(SecurityBlockLog.objects.exists())
+        self.assertEqual(flush_security_logs_task(), 2)
+        self.assertEqual(SecurityBlockLog.objects.filter(ip_address='198.51.100.1').count(), 2)
+        self.assertEqual(flush_security_logs_task(), 0)
+
+    @override_settings(SECURITY_LOG_BUFFER_MAX=150)
+    def test_full_buffer_keeps_triggering_one_flush_at_a_time(self):
+        with mock.patch('shop.tasks.flush_security_logs_task.delay') as delay, \
+                mock.patch.object(violation_tracker, '_check_autoban'):
+            for _ in range(200):
+                violation_tracker.record('198.51.100.5', None, '/api/cart/', 'RateLimitExceeded')
+            delay.assert_called_once_with()
+
+            # Флаг истек, а буфер по-прежнему полон (длина после RPUSH — MAX + 1): сброс ставится снова
+            self.redis.data.pop('security:log_flush_queued')
+            violation_tracker.record('198.51.100.5', None, '/api/cart/', 'RateLimitExceeded')
+            self.assertEqual(delay.call_count, 2)
+
+        self.assertEqual(flush_security_logs_task(), 150)
+        self.assertNotIn('security:log_flush_queued', self.redis.data)
+
+    def test_autoban_happens_inline_at_threshold(self):
+        with mock.patch('shop.tasks.notify_security_ban_task.delay') as notify, \
+                self.captureOnCommitCallbacks(execute=True):
+            for _ in range(4):
+                violation_tracker.record('198.51.100.2', '555', '/api/cart/', 'RateLimitExceeded')
+
+        item = BlacklistedItem.objects.get()
+        self.assertEqual((item.item_type, item.value), ('TG', '555'))
+        notify.assert_called_once_with(item.id, 3, 1)
+
+    def test_throttled_request_reaches_tracker(self):
+        from rest_framework.exceptions import Throttled
+
+        with mock.patch('shop.views.CategoryListView.get', side_effect=Throttled(wait=10)), \
+                mock.patch.object(violation_tracker, 'record') as record:
+            response = self.client.get(reverse('category-list'), REMOTE_ADDR='198.51.100.3')
+
+        self.assertEqual(response.status_code, 429)
+        record.assert_called_once_with(
+            ip='198.51.100.3', telegram_id=None, path='/api/categories/', limit_type='RateLimitExceeded'
+        )
+
+    def test_falls_back_to_direct_write_without_redis(self):
+        with mock.patch('shop.redis_client.get_redis', side_effect=ConnectionError):
+            violation_tracker.record('198.51.100.4', None, '/api/cart/', 'RateLimitExceeded')
+
+        self.assertTrue(SecurityBlockLog.objects.filter(ip_address='198.51.100.4').exists())
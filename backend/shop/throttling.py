@@ -1,6 +1,98 @@
-from rest_framework.throttling import SimpleRateThrottle
+import logging
+import math
 
-class SmartUserRateThrottle(SimpleRateThrottle):
+from rest_framework.throttling import ScopedRateThrottle, SimpleRateThrottle
+
+from .identity import get_identity
+
+logger = logging.getLogger('shop')
+
+# GCRA (Generic Cell Rate Algorithm): на ключ хранится одно число — TAT, "теоретическое время
+# прибытия" следующего запроса. Запрос стоимостью cost сдвигает TAT на cost * interval;
+# он разрешен, если новый TAT опережает текущее время не больше, чем на период лимита
+# (т.е. допускается всплеск до num_requests, дальше — равномерно).
+# Возвращает {1, 0} если разрешено, иначе {0, "сколько секунд ждать"}.
+GCRA_LUA = """
+local interval = tonumber(ARGV[1])
+local period = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local tat = tonumber(redis.call('GET', KEYS[1])) or now
+if tat < now then
+    tat = now
+end
+local new_tat = tat + interval * cost
+local allow_at = new_tat - period
+if allow_at > now then
+    return {0, tostring(allow_at - now)}
+end
+redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.ceil((new_tat - now) * 1000))
+return {1, '0'}
+"""
+
+_gcra_script = None
+
+
+def _telegram_user(request):
+    """Пользователь Telegram из SessionAuthMixin или, для остальных view, из IdentityMiddleware."""
+    return getattr(request, 'telegram_user', None) or get_identity(request).telegram_user
+
+
+class GCRARateThrottle(SimpleRateThrottle):
+    """
+    Замена SimpleRateThrottle: вместо списка меток времени в кеше (до num_requests элементов
+    на ключ и неатомарные get -> trim -> set) — одно число на ключ и атомарный Lua-скрипт в Redis.
+
+    Стоимость запроса задает view: атрибут throttle_cost (по умолчанию 1) или метод
+    get_throttle_cost(request) — дорогой поиск может списывать больше, чем чтение FAQ.
+
+    Если Redis недоступен — работает как обычный SimpleRateThrottle (через Django-кеш).
+    """
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        cost = self.get_cost(request, view)
+        try:
+            allowed, wait = self._run_script(cost)
+        except Exception as e:
+            logger.debug(f"GCRA throttle unavailable, falling back to cache throttle: {e}")
+            return super().allow_request(request, view)
+
+        self._wait = float(wait)
+        return bool(int(allowed))
+
+    def get_cost(self, request, view):
+        if hasattr(view, 'get_throttle_cost'):
+            cost = view.get_throttle_cost(request)
+        else:
+            cost = getattr(view, 'throttle_cost', 1)
+        # Дороже всего лимита запрос быть не может, иначе он не пройдет никогда
+        return max(1, min(int(cost), self.num_requests))
+
+    def _run_script(self, cost):
+        global _gcra_script
+        if _gcra_script is None:
+            from .redis_client import get_redis
+            _gcra_script = get_redis().register_script(GCRA_LUA)
+        return _gcra_script(
+            keys=[f"gcra:{self.key}"],
+            args=[self.duration / self.num_requests, self.duration, cost],
+        )
+
+    def wait(self):
+        if hasattr(self, '_wait'):
+            return math.ceil(self._wait) if self._wait > 0 else None
+        return super().wait()
+
+
+class SmartUserRateThrottle(GCRARateThrottle):
     """
     Лимиты для 'доверенных' пользователей (Telegram или Session).
     Rate: 'user' (1000/day).
@@ -9,11 +101,14 @@ class SmartUserRateThrottle(SimpleRateThrottle):
 
     def get_cache_key(self, request, view):
         # 1. Проверяем Telegram User
-        if hasattr(request, 'telegram_user') and request.telegram_user:
-            ident = f"tg_{request.telegram_user['id']}"
+        telegram_user = _telegram_user(request)
+        if telegram_user:
+            ident = f"tg_{telegram_user['id']}"
             return self.cache_format % {'scope': self.scope, 'ident': ident}
 
         # 2. Проверяем Session Key
+        # (только из SessionAuthMixin: X-Session-ID придумывает сам клиент, и на публичных view
+        # он не должен уводить запрос из anon-лимита по IP)
         if hasattr(request, 'session_key') and request.session_key:
             ident = f"sess_{request.session_key}"
             return self.cache_format % {'scope': self.scope, 'ident': ident}
@@ -28,7 +123,7 @@ class SmartUserRateThrottle(SimpleRateThrottle):
         return None
 
 
-class SmartAnonRateThrottle(SimpleRateThrottle):
+class SmartAnonRateThrottle(GCRARateThrottle):
     """
     Лимиты для неизвестных (Анонимы по IP).
     Rate: 'anon' (60/min).
@@ -41,7 +136,7 @@ class SmartAnonRateThrottle(SimpleRateThrottle):
         # (чтобы не списывать и user quota, и anon quota одновременно)
         
         is_identified = (
-            (hasattr(request, 'telegram_user') and request.telegram_user) or
+            _telegram_user(request) or
             (hasattr(request, 'session_key') and request.session_key) or
             (request.user and request.user.is_authenticated)
         )
@@ -52,3 +147,7 @@ class SmartAnonRateThrottle(SimpleRateThrottle):
         # Если не опознан - баним по IP
         ident = self.get_ident(request)
         return self.cache_format % {'scope': self.scope, 'ident': ident}
+
+
+class GCRAScopedRateThrottle(ScopedRateThrottle, GCRARateThrottle):
+    """ScopedRateThrottle (throttle_scope у view, например 'orders') на GCRA."""
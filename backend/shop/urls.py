@@ -4,11 +4,12 @@ from .views import (
     ProductListView, ProductDetailView, CategoryListView, PromoBannerListView,
     ShopSettingsView, FaqListView, DealOfTheDayView, CartView, CalculateSelectionView,
     OrderCreateView, OrderDetailView, ArticleListView, ArticleDetailView, ArticleIncrementViewCountView,
-    TinyMCEImageUploadView
+    TinyMCEImageUploadView, TinyMCEImageUploadStatusView, ContentSearchView, BootstrapView
 )
 from .views_security import HoneyPotView
 
 urlpatterns = [
+    path('bootstrap/', BootstrapView.as_view(), name='bootstrap'),
     path('categories/', CategoryListView.as_view(), name='category-list'),
     path('banners/', PromoBannerListView.as_view(), name='banner-list'),
     path('products/', ProductListView.as_view(), name='product-list'),
@@ -23,8 +24,10 @@ urlpatterns = [
     path('articles/', ArticleListView.as_view(), name='article-list'),
     path('articles/<slug:slug>/', ArticleDetailView.as_view(), name='article-detail'),
     path('articles/<slug:slug>/increment-view/', ArticleIncrementViewCountView.as_view(), name='article-increment-view'),
+    path('search/content/', ContentSearchView.as_view(), name='content-search'),
     # TinyMCE image upload endpoint
     path('tinymce/upload-image/', TinyMCEImageUploadView.as_view(), name='tinymce-image-upload'),
+    path('tinymce/upload-image/<str:token>/', TinyMCEImageUploadStatusView.as_view(), name='tinymce-image-upload-status'),
     
     # --- HoneyPot Trap ---
     path('admin-secret-debug/', HoneyPotView.as_view(), name='honeypot-trap'),
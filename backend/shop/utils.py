@@ -3,60 +3,153 @@
 import hmac
 import hashlib
 import json
+import logging
+import threading
 import time  # <--- 1. Добавлен импорт времени
+from collections import OrderedDict
+from functools import lru_cache
 from urllib.parse import parse_qsl
 
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger('shop')
+
+# Срок жизни initData: старше 24 часов (86400 секунд) не принимаем.
+# Это предотвращает использование перехваченных старых данных.
+INIT_DATA_MAX_AGE = 86400
+
+
+@lru_cache(maxsize=8)
+def _webapp_secret(bot_token: str) -> bytes:
+    """HMAC("WebAppData", bot_token) — зависит только от токена, считаем один раз на процесс."""
+    return hmac.new(key=b"WebAppData", msg=bot_token.encode(), digestmod=hashlib.sha256).digest()
+
+
+class _ValidatedInitDataLRU:
+    """
+    Ограниченный LRU в памяти процесса: ключ initData -> (user_data, expires_at).
+    Mini-app шлет одну и ту же строку initData весь сеанс, поэтому повторные запросы
+    не парсят строку и не считают HMAC.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return entry
+
+    def set(self, key, user_data, expires_at):
+        with self._lock:
+            self._data[key] = (user_data, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > settings.INIT_DATA_CACHE_SIZE:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+_validated_init_data = _ValidatedInitDataLRU()
+
+
+def _cache_key(init_data_str: str, secret_key: bytes) -> str:
+    # Ключ зависит и от токена: при смене токена старые записи просто не найдутся
+    digest = hashlib.sha256(secret_key + init_data_str.encode()).hexdigest()
+    return f"tma:{digest}"
+
+
+def _verify_init_data(init_data_str: str, secret_key: bytes):
+    """Полная проверка подписи. Возвращает (user_data, auth_date) или None."""
+    # Разбираем строку на параметры
+    parsed_data = dict(parse_qsl(init_data_str))
+    hash_from_telegram = parsed_data.pop("hash", None)
+
+    if not hash_from_telegram:
+        return None
+
+    # --- 2. НОВАЯ ПРОВЕРКА БЕЗОПАСНОСТИ ---
+    # Получаем время авторизации (в секундах Unix)
+    auth_date = int(parsed_data.get("auth_date", 0))
+    if time.time() - auth_date > INIT_DATA_MAX_AGE:
+        return None
+    # --------------------------------------
+
+    # Формируем строку для проверки хеша в алфавитном порядке
+    data_check_string = "\n".join(
+        f"{key}={value}" for key, value in sorted(parsed_data.items())
+    )
+
+    # Генерируем наш хеш
+    calculated_hash = hmac.new(
+        key=secret_key, msg=data_check_string.encode(), digestmod=hashlib.sha256
+    ).hexdigest()
+
+    # Сравниваем хеши
+    if hmac.compare_digest(calculated_hash, hash_from_telegram):
+        # Данные валидны, возвращаем информацию о пользователе
+        return json.loads(parsed_data.get("user", "{}")), auth_date
+    return None
+
+
 def validate_init_data(init_data_str: str, bot_token: str):
     """
     Проверяет и парсит строку initData из Telegram Web App.
 
+    Успешные проверки кешируются до auth_date + 24ч: в LRU процесса и, если включено
+    INIT_DATA_CACHE_SHARED, в общем кеше (Redis) — чтобы сеанс, попавший на другой воркер,
+    тоже не пересчитывал подпись. Невалидные строки не кешируются.
+
     :param init_data_str: Полная строка initData из window.Telegram.WebApp.initData
     :param bot_token: Секретный токен вашего бота.
     :return: Словарь с данными пользователя, если валидация прошла успешно, иначе None.
     """
+    if not init_data_str or not bot_token:
+        return None
+
+    secret_key = _webapp_secret(bot_token)
+    key = _cache_key(init_data_str, secret_key)
+
+    entry = _validated_init_data.get(key)
+    if entry is None and settings.INIT_DATA_CACHE_SHARED:
+        try:
+            entry = cache.get(key)
+        except Exception as e:
+            logger.warning(f"initData cache unavailable: {e}")
+        if entry is not None:
+            if entry[1] <= time.time():
+                entry = None
+            else:
+                _validated_init_data.set(key, *entry)
+
+    if entry is not None:
+        # Копия: вызывающий код не должен портить закешированный словарь
+        return dict(entry[0])
+
     try:
-        # Разбираем строку на параметры
-        parsed_data = dict(parse_qsl(init_data_str))
-        hash_from_telegram = parsed_data.pop("hash", None)
-
-        if not hash_from_telegram:
-            return None
-
-        # --- 2. НОВАЯ ПРОВЕРКА БЕЗОПАСНОСТИ ---
-        # Получаем время авторизации (в секундах Unix)
-        auth_date = int(parsed_data.get("auth_date", 0))
-
-        # Получаем текущее время
-        current_time = time.time()
-
-        # Проверяем: если данные старше 24 часов (86400 секунд), отклоняем их.
-        # Это предотвращает использование перехваченных старых данных.
-        if current_time - auth_date > 86400:
-            return None
-        # --------------------------------------
-
-        # Формируем строку для проверки хеша в алфавитном порядке
-        data_check_string = "\n".join(
-            f"{key}={value}" for key, value in sorted(parsed_data.items())
-        )
-
-        # Генерируем секретный ключ из токена бота
-        secret_key = hmac.new(
-            key=b"WebAppData", msg=bot_token.encode(), digestmod=hashlib.sha256
-        ).digest()
-
-        # Генерируем наш хеш
-        calculated_hash = hmac.new(
-            key=secret_key, msg=data_check_string.encode(), digestmod=hashlib.sha256
-        ).hexdigest()
-
-        # Сравниваем хеши
-        if calculated_hash == hash_from_telegram:
-            # Данные валидны, возвращаем информацию о пользователе
-            user_data = json.loads(parsed_data.get("user", "{}"))
-            return user_data
+        result = _verify_init_data(init_data_str, secret_key)
     except Exception:
         # В случае любой ошибки (например, битый JSON или auth_date не число)
         return None
+    if result is None:
+        return None
 
-    return None
\ No newline at end of file
+    user_data, auth_date = result
+    expires_at = auth_date + INIT_DATA_MAX_AGE
+    _validated_init_data.set(key, user_data, expires_at)
+    if settings.INIT_DATA_CACHE_SHARED:
+        try:
+            cache.set(key, (user_data, expires_at), timeout=max(1, int(expires_at - time.time())))
+        except Exception as e:
+            logger.warning(f"initData cache unavailable: {e}")
+    return dict(user_data)
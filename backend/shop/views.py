@@ -2,14 +2,12 @@
 import logging
 from django.conf import settings
 from django.utils import timezone
-from django.db.models import Prefetch, Q, Case, When, F
+from django.db.models import Prefetch, Q, Case, When
 from django.db import transaction, models
+from django.http import HttpResponse, HttpResponseNotModified, JsonResponse
+from django.utils.http import parse_etags
 from django.utils.decorators import method_decorator # Добавлено
 from django.views.decorators.cache import cache_page # Добавлено
-from urllib.parse import parse_qsl  # Добавлено, так как используется в parse_init_data
-import hmac # Добавлено
-import hashlib # Добавлено
-import json # Добавлено
 
 from decimal import Decimal
 
@@ -21,15 +19,20 @@ from django_filters.rest_framework import DjangoFilterBackend
 
 from .models import (
     Product, Category, PromoBanner, DiscountRule,
-    ShopSettings, FaqItem, Cart, CartItem, Order, Article, ArticleCategory
+    FaqItem, Cart, CartItem, Order, Article, ArticleCategory
 )
 from .serializers import (
     ProductListSerializer, ProductDetailSerializer, CategorySerializer,
     PromoBannerSerializer, ShopSettingsSerializer, FaqItemSerializer,
-    DealOfTheDaySerializer, CartSerializer, DetailedCartItemSerializer, OrderCreateSerializer,
+    DealOfTheDaySerializer, CartSerializer, DetailedCartItemSerializer, CartBatchSerializer, OrderCreateSerializer,
     ArticleListSerializer, ArticleDetailSerializer, ArticleCategorySerializer, OrderDetailSerializer
 )
+from .identity import get_identity
 from .utils import validate_init_data
+from .idempotency import idempotent
+from .services.article_views import article_view_counter
+from .services import cached_models, content_search
+from .services.bootstrap import bootstrap_service, current_deal
 
 logger = logging.getLogger('shop')
 
@@ -57,27 +60,26 @@ class SessionAuthMixin(APIView):
             request.session_key = None
             return super().dispatch(request, *args, **kwargs)
 
-        # 1. Попытка авторизации через Telegram
-        if auth_header and auth_header.startswith('tma '):
-            init_data_str = auth_header.split(' ')[1]
-            user_data = validate_init_data(init_data_str, settings.TELEGRAM_BOT_TOKEN)
+        # IP / Telegram / X-Session-ID уже определены IdentityMiddleware (initData проверен через кеш)
+        identity = get_identity(request)
 
-            if user_data:
-                request.telegram_user = user_data
-                request.session_key = None # Приоритет у Telegram
-                return super().dispatch(request, *args, **kwargs)
-            else:
-                return Response({"error": "Invalid Telegram data"}, status=status.HTTP_403_FORBIDDEN)
+        # 1. Попытка авторизации через Telegram
+        if identity.telegram_user:
+            request.telegram_user = identity.telegram_user
+            request.session_key = None # Приоритет у Telegram
+            return super().dispatch(request, *args, **kwargs)
+        if identity.init_data_invalid:
+            # JsonResponse, а не DRF Response: до super().dispatch() рендерер еще не выбран
+            return JsonResponse({"error": "Invalid Telegram data"}, status=status.HTTP_403_FORBIDDEN)
 
         # 2. Если Telegram нет -> ищем X-Session-ID
-        session_key = request.headers.get('X-Session-ID')
-        if session_key:
+        if identity.session_key:
             request.telegram_user = None
-            request.session_key = session_key
+            request.session_key = identity.session_key
             return super().dispatch(request, *args, **kwargs)
 
         # 3. Если ничего нет -> Ошибка
-        return Response({"error": "No authentication provided (Telegram or Session ID)"}, status=status.HTTP_401_UNAUTHORIZED)
+        return JsonResponse({"error": "No authentication provided (Telegram or Session ID)"}, status=status.HTTP_401_UNAUTHORIZED)
 
     def get_cart(self):
         """Вспомогательный метод для получения (или создания) корзины текущего пользователя."""
@@ -93,43 +95,25 @@ class SessionAuthMixin(APIView):
             return None
         return cart
 
+    def get_cart_for_update(self):
+        """
+        Корзина для операций записи: создается через INSERT ... ON CONFLICT (без гонок get_or_create)
+        и сразу помечается активной (updated_at).
+        """
+        if getattr(self.request, 'telegram_user', None):
+            return Cart.upsert_for(telegram_id=self.request.telegram_user['id'])
+        if getattr(self.request, 'session_key', None):
+            return Cart.upsert_for(session_key=self.request.session_key)
+        return None
+
 
 def parse_init_data(init_data: str, bot_token: str):
     """
     Validates and parses the initData string from a Telegram Web App.
     Returns user data dictionary if valid, otherwise None.
+    Оставлено для совместимости: та же проверка и тот же кеш, что в validate_init_data.
     """
-    try:
-        # Разбираем строку на параметры
-        parsed_data = dict(parse_qsl(init_data))
-        hash_from_telegram = parsed_data.pop("hash", None)
-
-        if not hash_from_telegram:
-            return None
-
-        # Формируем строку для проверки хеша
-        data_check_string = "\n".join(
-            f"{key}={value}" for key, value in sorted(parsed_data.items())
-        )
-
-        # Генерируем секретный ключ из токена бота
-        secret_key = hmac.new(
-            key=b"WebAppData", msg=bot_token.encode(), digestmod=hashlib.sha256
-        ).digest()
-
-        # Генерируем наш хеш
-        calculated_hash = hmac.new(
-            key=secret_key, msg=data_check_string.encode(), digestmod=hashlib.sha256
-        ).hexdigest()
-
-        # Сравниваем хеши
-        if calculated_hash == hash_from_telegram:
-            # Данные валидны, возвращаем информацию о пользователе
-            user_data = json.loads(parsed_data.get("user", "{}"))
-            return user_data
-    except Exception:
-        return None
-    return None
+    return validate_init_data(init_data, bot_token)
 
 
 class CategoryListView(generics.ListAPIView):
@@ -161,6 +145,10 @@ class ProductListView(generics.ListAPIView):
     # Фронтенд уже отправляет 'price', так что теперь все будет совпадать.
     ordering_fields = ['created_at', 'price']
 
+    def get_throttle_cost(self, request):
+        # Полнотекстовый + триграммный поиск намного дороже обычного листинга
+        return settings.THROTTLE_COST_SEARCH if request.query_params.get('search', '').strip() else 1
+
     def get_queryset(self):
         # 2. СОЗДАЕМ БАЗОВЫЙ QUERYSET
         # Здесь мы выбираем только активные товары и подгружаем связанные данные.
@@ -302,7 +290,7 @@ class ProductDetailView(generics.RetrieveAPIView):
 
 class ShopSettingsView(APIView):
     def get(self, request, *args, **kwargs):
-        settings = ShopSettings.load()
+        settings = cached_models.shop_settings_with_images()
         serializer = ShopSettingsSerializer(settings, context={'request': request})
         return Response(serializer.data)
 
@@ -315,20 +303,34 @@ class DealOfTheDayView(generics.RetrieveAPIView):
     serializer_class = DealOfTheDaySerializer
 
     def get_object(self):
-        now = timezone.now()
-        # ИЗМЕНЕНИЕ: Запрос теперь напрямую проверяет цену и дату,
-        # а не удаленное поле is_deal_of_the_day.
-        deal_product = Product.objects.filter(
-            is_active=True,
-            deal_price__isnull=False,  # Проверяем, что акционная цена задана
-            deal_ends_at__gt=now       # Проверяем, что срок акции не истек
-        ).order_by('deal_ends_at').first()
-        return deal_product
+        # Активная акция (deal_price задана, срок не истек) с ближайшим окончанием
+        return current_deal()
+
+
+class BootstrapView(APIView):
+    """
+    Стартовые данные мини-приложения одним запросом: настройки, категории, баннеры, FAQ и товар дня.
+    Тело собирается заранее и кешируется (BootstrapService); клиент перепроверяет его по ETag.
+    """
+    def get(self, request, *args, **kwargs):
+        payload = bootstrap_service.get(request)
+
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match and (payload.etag in parse_etags(if_none_match) or if_none_match.strip() == '*'):
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(payload.body, content_type='application/json')
+        response['ETag'] = payload.etag
+        # Можно хранить, но перед использованием спросить сервер (ответ 304 почти бесплатен)
+        response['Cache-Control'] = 'no-cache'
+        return response
 
 
 
 # --- СЕРВИС РАСЧЕТА ЦЕН (Refactored) ---
 from .services.pricing import CartPricingService
+from .services.cart_mutations import CartMutationService, CartOperation, UnknownProductsError
+from .services.stock import InsufficientStockError
 
 
 # --- 2. ОБНОВЛЕННЫЙ VIEW ДЛЯ ДИНАМИЧЕСКОГО РАСЧЕТА ---
@@ -362,12 +364,9 @@ class CartView(SessionAuthMixin):
         if not cart:
             return Response({"error": "Cart not found or session invalid"}, status=status.HTTP_404_NOT_FOUND)
 
-        detailed_data = CartPricingService().calculate(cart.items.all())
-        # Сериализуем "раскрашенные" товары
-        detailed_data['items'] = DetailedCartItemSerializer(detailed_data['items'], many=True, context={'request': request}).data
-
-        return Response(detailed_data)
+        return self._cart_response(cart.items.all())
 
+    @idempotent('cart')
     def post(self, request, *args, **kwargs):
         """Добавить/обновить/удалить товар и вернуть обновленную корзину с расчетами."""
         product_id = request.data.get('product_id')
@@ -375,34 +374,34 @@ class CartView(SessionAuthMixin):
 
         if not product_id:
             return Response({"error": "Product ID required"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            product_id = int(product_id)
+        except (TypeError, ValueError):
+            return Response({"error": "Invalid product ID"}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Одиночное изменение — частный случай пакетного: set (или remove, если количество 0 или меньше)
+        operation = CartOperation(
+            op=CartOperation.SET if quantity > 0 else CartOperation.REMOVE,
+            product_id=product_id,
+            quantity=quantity,
+        )
+        return self._apply_operations([operation], not_found_error="Product not found")
 
-        # Получаем/создаем корзину
-        cart = self.get_cart()
-        if not cart:
-             return Response({"error": "Unable to create cart"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    @idempotent('cart')
+    def patch(self, request, *args, **kwargs):
+        """
+        Пакетное изменение корзины: список операций set / increment / remove.
+        Все операции применяются в одной транзакции, корзина пересчитывается один раз.
 
-        try:
-            product = Product.objects.get(id=product_id)
-        except Product.DoesNotExist:
-            return Response({"error": "Product not found"}, status=status.HTTP_404_NOT_FOUND)
-
-        if quantity > 0:
-            # Используем update_or_create для более чистого кода
-            cart_item, created = CartItem.objects.update_or_create(
-                cart=cart,
-                product=product,
-                defaults={'quantity': quantity}
-            )
-        else:
-            # Если количество 0 или меньше, удаляем товар из корзины
-            CartItem.objects.filter(cart=cart, product=product).delete()
+        Формат: {"operations": [{"op": "set", "product_id": 1, "quantity": 2}, ...]}
+        """
+        serializer = CartBatchSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-        # Возвращаем обновленное состояние всей корзины с расчетами
-        cart.refresh_from_db()
-        detailed_data = CartPricingService().calculate(cart.items.all())
-        detailed_data['items'] = DetailedCartItemSerializer(detailed_data['items'], many=True, context={'request': request}).data
-        return Response(detailed_data, status=status.HTTP_200_OK)
+        return self._apply_operations(serializer.to_operations())
 
+    @idempotent('cart')
     def delete(self, request, *args, **kwargs):
         """Удалить несколько товаров из корзины по их ID."""
         # Ожидаем список ID товаров для удаления
@@ -410,23 +409,49 @@ class CartView(SessionAuthMixin):
         if not isinstance(product_ids, list):
             return Response({"error": "Expected list of product_ids"}, status=status.HTTP_400_BAD_REQUEST)
 
-        cart = self.get_cart()
+        cart = self.get_cart_for_update()
         if cart:
             # Удаляем все CartItem, связанные с этой корзиной и переданными ID товаров
             CartItem.objects.filter(cart=cart, product_id__in=product_ids).delete()
 
             # Возвращаем обновленное состояние
-            cart.refresh_from_db()
-            detailed_data = CartPricingService().calculate(cart.items.all())
-            detailed_data['items'] = DetailedCartItemSerializer(detailed_data['items'], many=True, context={'request': request}).data
-            return Response(detailed_data, status=status.HTTP_200_OK)
+            return self._cart_response(self._load_items(cart))
 
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    def _apply_operations(self, operations, not_found_error=None):
+        """Применяет операции к корзине текущего пользователя и возвращает пересчитанную корзину."""
+        cart = self.get_cart_for_update()
+        if not cart:
+            return Response({"error": "Unable to create cart"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        try:
+            CartMutationService().apply(cart, operations)
+        except UnknownProductsError as e:
+            return Response(
+                {"error": not_found_error or "Products not found", "product_ids": e.product_ids},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        return self._cart_response(self._load_items(cart))
+
+    @staticmethod
+    def _load_items(cart):
+        """Все позиции корзины со связанными данными, нужными для расчета и сериализации, за фиксированное число запросов."""
+        return cart.items.select_related('product__category').prefetch_related('product__info_panels')
+
+    def _cart_response(self, items):
+        """Единственный пересчет корзины на запрос: расчет цен + сериализация "раскрашенных" товаров."""
+        detailed_data = CartPricingService().calculate(list(items))
+        detailed_data['items'] = DetailedCartItemSerializer(detailed_data['items'], many=True, context={'request': self.request}).data
+        return Response(detailed_data, status=status.HTTP_200_OK)
+
 
 # --- 4. ОБНОВЛЕННЫЙ OrderCreateView ---
 class OrderCreateView(SessionAuthMixin):
     throttle_scope = 'orders'
+
+    @idempotent('orders')
     def post(self, request, *args, **kwargs):
         cart = self.get_cart()
         if not cart:
@@ -436,16 +461,18 @@ class OrderCreateView(SessionAuthMixin):
         if not selected_product_ids:
              return Response({"error": "No items in order"}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Фильтруем товары, которые реально есть в корзине
-        items_to_order = cart.items.filter(product_id__in=selected_product_ids)
+        # Фильтруем товары, которые реально есть в корзине.
+        # Позиции (с товарами и категориями) уже загружены prefetch'ем в get_cart —
+        # отбираем в памяти, без отдельных запросов на exists() и на сам список.
+        items_to_order = [item for item in cart.items.all() if item.product_id in selected_product_ids]
 
-        if not items_to_order.exists():
+        if not items_to_order:
             return Response({"error": "Selected items not found in cart"}, status=status.HTTP_400_BAD_REQUEST)
 
         # Рассчитываем итоговые суммы
         # ИСПОЛЬЗУЕМ НОВЫЙ СЕРВИС
         pricing_service = CartPricingService()
-        calculation_results = pricing_service.calculate(list(items_to_order))
+        calculation_results = pricing_service.calculate(items_to_order)
 
         # Формируем контекст для сериализатора
         context = {
@@ -468,8 +495,8 @@ class OrderCreateView(SessionAuthMixin):
                     # Шаг 1: Сохраняем заказ в базе данных
                     order = serializer.save()
 
-                    # Шаг 2: Очищаем корзину от заказанных товаров
-                    items_to_order.delete()
+                    # Шаг 2: Очищаем корзину от заказанных товаров (один DELETE по уже известным id)
+                    CartItem.objects.filter(id__in=[item.id for item in items_to_order]).delete()
                 # --- КОНЕЦ БЛОКА ТРАНЗАКЦИИ ---
 
                 user_type = "Telegram User" if context['telegram_id'] else "Web Guest"
@@ -487,6 +514,13 @@ class OrderCreateView(SessionAuthMixin):
 
                 return Response({'success': True, 'order_id': order.id}, status=status.HTTP_201_CREATED)
 
+            except InsufficientStockError as e:
+                # Транзакция уже откачена: ни заказ, ни списания не сохранились
+                logger.info(f"Order rejected, insufficient stock: {e.failed_lines}")
+                return Response(
+                    {"error": "Insufficient stock", "failed_items": e.failed_lines},
+                    status=status.HTTP_409_CONFLICT
+                )
             except Exception as e:
                 logger.error(f"Order creation failed: {e}", exc_info=True)
                 return Response(
@@ -536,6 +570,19 @@ class OrderDetailView(SessionAuthMixin, generics.RetrieveAPIView):
 
 
 
+class ArticleSearchFilter(filters.SearchFilter):
+    """На PostgreSQL ищет по хранимому tsvector (GIN-индекс), а не ILIKE по HTML; иначе — обычный SearchFilter."""
+
+    def filter_queryset(self, request, queryset, view):
+        text = request.query_params.get(self.search_param, '').strip()
+        if not text or not content_search.is_supported():
+            return super().filter_queryset(request, queryset, view)
+        from django.contrib.postgres.search import SearchQuery
+        return queryset.filter(
+            search_vector=SearchQuery(text, search_type='websearch', config=content_search.SEARCH_CONFIG)
+        )
+
+
 class ArticleListView(generics.ListAPIView):
     """
     Возвращает комплексные данные для страницы блога:
@@ -546,17 +593,21 @@ class ArticleListView(generics.ListAPIView):
     pagination_class = StandardResultsSetPagination
 
     # 1. ИЗМЕНЕНИЕ: Добавляем OrderingFilter и разрешаем сортировку по просмотрам
-    filter_backends = [filters.OrderingFilter, filters.SearchFilter]
+    filter_backends = [filters.OrderingFilter, ArticleSearchFilter]
     search_fields = ['title', 'content']
     ordering_fields = ['published_at', 'views_count', 'is_featured']
     ordering = ['-is_featured', '-published_at'] # Сначала закрепленные, потом новые
 
+    def get_throttle_cost(self, request):
+        # SearchFilter по content — ILIKE по всему тексту статей
+        return settings.THROTTLE_COST_SEARCH if request.query_params.get('search', '').strip() else 1
+
     def get_queryset(self):
         """Формирует основной queryset статей на основе параметров запроса."""
         queryset = Article.objects.filter(
             status=Article.Status.PUBLISHED,
             published_at__lte=timezone.now() # Учитываем отложенную публикацию
-        ).select_related('category')
+        ).select_related('category').defer('content', 'rendered_content', 'toc')  # Тела статей списку не нужны
 
         # Фильтрация по категории
         category_slug = self.request.query_params.get('category')
@@ -602,24 +653,48 @@ class ArticleDetailView(generics.RetrieveAPIView):
 class ArticleIncrementViewCountView(APIView):
     """
     Увеличивает счётчик просмотров для статьи на 1.
-    Безопасен с точки зрения race conditions.
+    Просмотры копятся в Redis и пачкой переносятся в БД (см. ArticleViewCounter).
     """
     def post(self, request, slug, *args, **kwargs):
-        try:
-            article = Article.objects.get(slug=slug, status=Article.Status.PUBLISHED)
-            # Используем F() для атомарного увеличения значения в базе данных
-            article.views_count = F('views_count') + 1
-            article.save(update_fields=['views_count'])
-            return Response(status=status.HTTP_200_OK)
-        except Article.DoesNotExist:
+        article_id = article_view_counter.published_article_id(slug)
+        if article_id is None:
             return Response(status=status.HTTP_404_NOT_FOUND)
 
+        # Для подсчета уникальных читателей: Telegram ID, затем X-Session-ID, затем IP
+        identity = get_identity(request)
+        viewer = (
+            f"tg:{identity.telegram_id}" if identity.telegram_id
+            else f"sess:{identity.session_key}" if identity.session_key
+            else f"ip:{identity.ip}" if identity.ip
+            else None
+        )
+        article_view_counter.record(article_id, viewer)
+        return Response(status=status.HTTP_200_OK)
+
+
+class ContentSearchView(APIView):
+    """
+    Поиск по статьям и FAQ для справочного центра: GET ?q=<запрос>&limit=<N>.
+    Возвращает лучшие N статей и ответов FAQ по рангу со сниппетами (<mark> вокруг совпадений).
+    """
+    def get_throttle_cost(self, request):
+        return settings.THROTTLE_COST_SEARCH
+
+    def get(self, request, *args, **kwargs):
+        try:
+            limit = int(request.query_params.get('limit', 0))
+        except ValueError:
+            limit = 0
+        service = content_search.ContentSearchService(limit=limit or None)
+        return Response(service.search(request.query_params.get('q', '')))
+
 
 # --- ЗАГРУЗКА ИЗОБРАЖЕНИЙ ДЛЯ TINYMCE ---
-import os
-import uuid
+import re
 from PIL import Image as PILImage
+from django.core.files.storage import default_storage
 from django.http import JsonResponse
+from django.urls import reverse
 from django.views import View
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
@@ -631,6 +706,9 @@ try:
 except ImportError:
     pass  # pillow-heif не установлен, HEIF не будет поддерживаться
 
+from .image_processing import ImageTooLarge
+from .services.editor_images import editor_image_service
+
 
 @method_decorator(csrf_exempt, name='dispatch')
 class TinyMCEImageUploadView(View):
@@ -639,7 +717,8 @@ class TinyMCEImageUploadView(View):
     - Валидирует тип файла (JPEG, PNG, WEBP, GIF, HEIF/HEIC)
     - Ограничивает размер до 15MB
     - Конвертирует в WebP для оптимизации
-    - Изменяет размер до максимум 1200px по ширине
+    - Изменяет размер до максимум TINYMCE_IMAGE_MAX_WIDTH по ширине
+    - Большие файлы сохраняет как есть (HEIC/HEIF — с превью), обработку ставит в Celery (EditorImageService)
     - Доступно только для администраторов
     """
     MAX_FILE_SIZE = 15 * 1024 * 1024  # 15MB
@@ -684,44 +763,24 @@ class TinyMCEImageUploadView(View):
                 'error': f"Файл слишком большой ({size_mb:.1f} МБ). Максимальный размер: 15 МБ"
             }, status=400)
 
-        # Генерируем уникальное имя файла
-        filename = f"{uuid.uuid4().hex}.webp"
-        save_path = os.path.join('articles', 'content', filename)
-        full_path = os.path.join(settings.MEDIA_ROOT, save_path)
-
-        # Создаём директорию, если не существует
-        os.makedirs(os.path.dirname(full_path), exist_ok=True)
-
         try:
-            # Открываем и обрабатываем изображение
-            with PILImage.open(uploaded_file) as img:
-                logger.info(f"TinyMCE upload: Image opened, size {img.width}x{img.height}, mode {img.mode}")
-                
-                # Изменяем размер, если ширина больше 1200px
-                if img.width > 1200:
-                    ratio = 1200 / img.width
-                    new_height = int(img.height * ratio)
-                    img = img.resize((1200, new_height), PILImage.LANCZOS)
-                    logger.info(f"TinyMCE upload: Resized to {img.width}x{img.height}")
-
-                # Конвертируем в RGB (необходимо для WebP)
-                if img.mode in ('RGBA', 'P', 'LA'):
-                    background = PILImage.new('RGB', img.size, (255, 255, 255))
-                    if img.mode == 'P':
-                        img = img.convert('RGBA')
-                    background.paste(img, mask=img.split()[-1] if img.mode == 'RGBA' else None)
-                    img = background
-                elif img.mode != 'RGB':
-                    img = img.convert('RGB')
-
-                # Сохраняем в WebP
-                img.save(full_path, 'WEBP', quality=85)
-                logger.info(f"TinyMCE upload: Saved as {filename}")
-
-            # Формируем абсолютный URL
-            image_url = request.build_absolute_uri(f'{settings.MEDIA_URL}{save_path}')
-
-            return JsonResponse({'location': image_url})
+            image = editor_image_service.accept(uploaded_file, ext)
+            logger.info(f"TinyMCE upload: Saved as {image.name} ({image.status})")
+
+            # location — для TinyMCE; после обработки в Celery ссылки в статьях ведут на итоговый файл
+            return JsonResponse({
+                'location': request.build_absolute_uri(default_storage.url(image.name)),
+                'status': image.status,
+                'status_url': request.build_absolute_uri(
+                    reverse('tinymce-image-upload-status', kwargs={'token': image.token})
+                ),
+            })
+
+        except ImageTooLarge as e:
+            logger.warning(f"TinyMCE upload: Image '{original_filename}' too large to decode ({e})")
+            return JsonResponse({
+                'error': f"Изображение слишком большое ({e} пикселей). Уменьшите его и загрузите снова."
+            }, status=400)
 
         except PILImage.UnidentifiedImageError as e:
             logger.error(f"TinyMCE upload: Cannot identify image file '{original_filename}': {e}")
@@ -739,4 +798,25 @@ class TinyMCEImageUploadView(View):
             logger.error(f"TinyMCE upload: Unexpected error processing '{original_filename}': {e}", exc_info=True)
             return JsonResponse({
                 'error': 'Произошла непредвиденная ошибка. Попробуйте загрузить другое изображение.'
-            }, status=500)
\ No newline at end of file
+            }, status=500)
+
+
+class TinyMCEImageUploadStatusView(View):
+    """
+    Статус обработки картинки, загруженной через TinyMCE: processing (по URL пока загруженный файл
+    или превью), done или failed (остается загруженный файл или превью). Только для администраторов.
+    """
+
+    def get(self, request, token, *args, **kwargs):
+        if not request.user.is_authenticated or not request.user.is_staff:
+            return JsonResponse({'error': 'Доступ запрещён. Требуются права администратора.'}, status=403)
+        if not re.fullmatch(r'[0-9a-f]{32}', token):
+            return JsonResponse({'error': 'Загрузка не найдена'}, status=404)
+
+        image = editor_image_service.status(token)
+        if image is None:
+            return JsonResponse({'error': 'Загрузка не найдена'}, status=404)
+        return JsonResponse({
+            'status': image.status,
+            'location': request.build_absolute_uri(default_storage.url(image.name)),
+        })
\ No newline at end of file